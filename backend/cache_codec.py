@@ -0,0 +1,209 @@
+"""
+Кодеки значений кэша: сериализация, сжатие и версионированный заголовок
+
+Формат записи: MAGIC (2 байта) + версия формата + id сериализатора +
+id сжатия + полезная нагрузка. Первый байт MAGIC (0xff) не встречается в
+UTF-8, поэтому старые значения (голый JSON от json.dumps) отличаются от новых
+и читаются без сброса кэша. datetime и ObjectId сохраняют свои типы:
+в JSON-форматах как {"$date": ...} / {"$oid": ...} (как в курсорах
+пагинации), в msgpack - как ext-типы.
+
+orjson, msgpack и zstandard необязательны: при их отсутствии используется
+стандартный json и zlib.
+"""
+import json
+import os
+import zlib
+from datetime import datetime
+from typing import Any, Callable, Dict, Tuple
+from bson import ObjectId
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+MAGIC = b"\xffC"
+FORMAT_VERSION = 1
+HEADER_SIZE = len(MAGIC) + 3
+
+# Идентификаторы в заголовке менять нельзя: по ним читаются уже записанные значения
+SERIALIZER_IDS = {"json": 1, "orjson": 2, "msgpack": 3}
+COMPRESSION_IDS = {"none": 0, "zlib": 1, "zstd": 2}
+
+CACHE_CODEC = os.getenv("CACHE_CODEC", "orjson" if ORJSON_AVAILABLE else "json")
+CACHE_COMPRESSION = os.getenv("CACHE_COMPRESSION", "zstd" if ZSTD_AVAILABLE else "zlib")
+# Значения меньше порога не сжимаются (байты после сериализации)
+CACHE_COMPRESS_MIN_BYTES = int(os.getenv("CACHE_COMPRESS_MIN_BYTES", "1024"))
+
+_MSGPACK_EXT_OBJECTID = 1
+_MSGPACK_EXT_DATETIME = 2
+
+
+class CacheCodecError(ValueError):
+    """Значение в кэше записано неизвестным или недоступным форматом"""
+
+
+# === ТИПИЗИРОВАННЫЕ ЗНАЧЕНИЯ ===
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return {"$oid": str(value)}
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    return str(value)
+
+
+def _json_object_hook(obj: Dict[str, Any]) -> Any:
+    if len(obj) == 1:
+        if "$oid" in obj:
+            return ObjectId(obj["$oid"])
+        if "$date" in obj:
+            return datetime.fromisoformat(obj["$date"])
+    return obj
+
+
+def _restore_types(value: Any) -> Any:
+    """Аналог object_hook для orjson, у которого его нет"""
+    if isinstance(value, dict):
+        restored = _json_object_hook(value)
+        if restored is not value:
+            return restored
+        return {k: _restore_types(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_restore_types(v) for v in value]
+    return value
+
+
+def _msgpack_default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return msgpack.ExtType(_MSGPACK_EXT_OBJECTID, value.binary)
+    if isinstance(value, datetime):
+        return msgpack.ExtType(_MSGPACK_EXT_DATETIME, value.isoformat().encode("ascii"))
+    return str(value)
+
+
+def _msgpack_ext_hook(code: int, data: bytes) -> Any:
+    if code == _MSGPACK_EXT_OBJECTID:
+        return ObjectId(data)
+    if code == _MSGPACK_EXT_DATETIME:
+        return datetime.fromisoformat(data.decode("ascii"))
+    return msgpack.ExtType(code, data)
+
+
+# === СЕРИАЛИЗАТОРЫ ===
+
+def _json_dumps(value: Any) -> bytes:
+    return json.dumps(value, default=_json_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _json_loads(data: bytes) -> Any:
+    return json.loads(data, object_hook=_json_object_hook)
+
+
+def _orjson_dumps(value: Any) -> bytes:
+    return orjson.dumps(value, default=_json_default,
+                        option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+
+
+def _orjson_loads(data: bytes) -> Any:
+    return _restore_types(orjson.loads(data))
+
+
+def _msgpack_dumps(value: Any) -> bytes:
+    return msgpack.packb(value, default=_msgpack_default, use_bin_type=True)
+
+
+def _msgpack_loads(data: bytes) -> Any:
+    return msgpack.unpackb(data, ext_hook=_msgpack_ext_hook, raw=False, strict_map_key=False)
+
+
+def _serializers() -> Dict[str, Tuple[Callable[[Any], bytes], Callable[[bytes], Any]]]:
+    available = {"json": (_json_dumps, _json_loads)}
+    if ORJSON_AVAILABLE:
+        available["orjson"] = (_orjson_dumps, _orjson_loads)
+    if MSGPACK_AVAILABLE:
+        available["msgpack"] = (_msgpack_dumps, _msgpack_loads)
+    return available
+
+
+def _compressors() -> Dict[str, Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]]:
+    available = {
+        "none": (lambda data: data, lambda data: data),
+        "zlib": (lambda data: zlib.compress(data, 6), zlib.decompress),
+    }
+    if ZSTD_AVAILABLE:
+        available["zstd"] = (zstandard.ZstdCompressor(level=3).compress,
+                             lambda data: zstandard.ZstdDecompressor().decompress(data))
+    return available
+
+
+class CacheCodec:
+    """Сериализация + сжатие значений кэша с заголовком формата"""
+
+    def __init__(self, serializer: str = CACHE_CODEC, compression: str = CACHE_COMPRESSION,
+                 compress_min_bytes: int = CACHE_COMPRESS_MIN_BYTES):
+        self._serializers = _serializers()
+        self._compressors = _compressors()
+        if serializer not in self._serializers:
+            print(f"⚠️ Кодек кэша {serializer} недоступен, используется json")
+            serializer = "json"
+        if compression not in self._compressors:
+            print(f"⚠️ Сжатие кэша {compression} недоступно, используется zlib")
+            compression = "zlib"
+        self.serializer = serializer
+        self.compression = compression
+        self.compress_min_bytes = compress_min_bytes
+        self._serializer_by_id = {SERIALIZER_IDS[name]: fns for name, fns in self._serializers.items()}
+        self._compressor_by_id = {COMPRESSION_IDS[name]: fns for name, fns in self._compressors.items()}
+
+    def encode(self, value: Any) -> bytes:
+        """Значение -> байты с заголовком"""
+        payload = self._serializers[self.serializer][0](value)
+        compression = "none"
+        if self.compression != "none" and len(payload) >= self.compress_min_bytes:
+            payload = self._compressors[self.compression][0](payload)
+            compression = self.compression
+        header = MAGIC + bytes((FORMAT_VERSION, SERIALIZER_IDS[self.serializer], COMPRESSION_IDS[compression]))
+        return header + payload
+
+    def decode(self, data: Any) -> Any:
+        """Байты из Redis -> значение (понимает и старый формат без заголовка)"""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if not data.startswith(MAGIC):
+            # Значение, записанное до появления кодеков (json.dumps)
+            return json.loads(data)
+        version, serializer_id, compression_id = data[len(MAGIC):HEADER_SIZE]
+        if version != FORMAT_VERSION:
+            raise CacheCodecError(f"Неизвестная версия формата кэша: {version}")
+        if serializer_id not in self._serializer_by_id or compression_id not in self._compressor_by_id:
+            raise CacheCodecError(f"Формат кэша недоступен: serializer={serializer_id}, compression={compression_id}")
+        try:
+            payload = self._compressor_by_id[compression_id][1](data[HEADER_SIZE:])
+            return self._serializer_by_id[serializer_id][1](payload)
+        except Exception as e:
+            # zlib.error, ZstdError, ошибки msgpack - не ValueError; для кэша это одно и то же
+            raise CacheCodecError(f"Поврежденное значение кэша: {e}") from e
+
+    def describe(self) -> Dict[str, Any]:
+        """Текущие настройки (для метрик)"""
+        return {
+            "serializer": self.serializer,
+            "compression": self.compression,
+            "compress_min_bytes": self.compress_min_bytes,
+            "format_version": FORMAT_VERSION
+        }
@@ -0,0 +1,168 @@
+"""
+Прогрев кэша популярных квизов, каталога и списков по категориям
+
+После деплоя и на каждом холодном старте (Vercel) кэш пуст, и все промахи
+достаются первой волне студентов. Прогрев выбирает квизы с наибольшим
+числом попыток за последние CACHE_WARM_WINDOW_DAYS дней (quiz_attempts,
+а если попыток нет - quiz_results) и заранее заполняет quiz:{id}, каталог
+и первые страницы списка по каждой категории. Одновременно выполняется не
+больше CACHE_WARM_CONCURRENCY загрузок, чтобы не забрать весь пул MongoDB
+у живых запросов.
+
+Сами загрузчики регистрирует роутер квизов (configure): прогрев идет через
+те же функции, что и эндпоинты, поэтому ключи и формат записей совпадают.
+Уже закэшированные записи не перезагружаются - это попадание.
+"""
+import asyncio
+import contextvars
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from .database import get_database
+
+# Прогрев при старте приложения (в фоне, не задерживает запуск)
+CACHE_WARM_ON_STARTUP = os.getenv("CACHE_WARM_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+# Период повторного прогрева в секундах (0 - только при старте)
+CACHE_WARM_INTERVAL = int(os.getenv("CACHE_WARM_INTERVAL", "0"))
+CACHE_WARM_TOP_QUIZZES = int(os.getenv("CACHE_WARM_TOP_QUIZZES", "50"))
+CACHE_WARM_CONCURRENCY = int(os.getenv("CACHE_WARM_CONCURRENCY", "8"))
+CACHE_WARM_WINDOW_DAYS = int(os.getenv("CACHE_WARM_WINDOW_DAYS", "30"))
+
+# Откуда брать популярность: (коллекция, поле времени)
+POPULARITY_SOURCES = [("quiz_attempts", "start_time"), ("quiz_results", "completed_at")]
+
+WarmFn = Callable[..., Awaitable[bool]]
+
+
+class CacheWarmer:
+    """Прогрев кэша с ограниченной параллельностью и отчетом о длительности"""
+
+    def __init__(self, top_quizzes: int = CACHE_WARM_TOP_QUIZZES, concurrency: int = CACHE_WARM_CONCURRENCY,
+                 window_days: int = CACHE_WARM_WINDOW_DAYS):
+        self.top_quizzes = top_quizzes
+        self.concurrency = max(1, concurrency)
+        self.window_days = window_days
+        self._warm_quiz: Optional[WarmFn] = None
+        self._warm_catalog: Optional[WarmFn] = None
+        self._warm_category: Optional[WarmFn] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running: Optional[asyncio.Task] = None
+        self.last_report: Optional[Dict[str, Any]] = None
+
+    def configure(self, warm_quiz: WarmFn, warm_catalog: WarmFn, warm_category: WarmFn):
+        """Зарегистрировать загрузчики: warm_quiz(id), warm_catalog(), warm_category(name)"""
+        self._warm_quiz = warm_quiz
+        self._warm_catalog = warm_catalog
+        self._warm_category = warm_category
+
+    async def popular_quiz_ids(self, db, limit: int) -> List[str]:
+        """id квизов с наибольшим числом попыток за окно"""
+        since = datetime.utcnow() - timedelta(days=self.window_days)
+        for collection, time_field in POPULARITY_SOURCES:
+            rows = await db[collection].aggregate([
+                {"$match": {time_field: {"$gte": since}}},
+                {"$group": {"_id": "$quiz_id", "attempts": {"$sum": 1}}},
+                {"$sort": {"attempts": -1}},
+                {"$limit": limit}
+            ]).to_list(None)
+            if rows:
+                return [str(row["_id"]) for row in rows if row["_id"]]
+        return []
+
+    async def warm(self) -> Dict[str, Any]:
+        """Один проход прогрева; повторный вызов во время прохода ждет его же"""
+        if self._running is None or self._running.done():
+            # Свежий контекст: команды MongoDB прогрева не засчитываются запросу, который его запустил
+            self._running = contextvars.Context().run(asyncio.ensure_future, self._warm())
+        return await asyncio.shield(self._running)
+
+    async def _warm(self) -> Dict[str, Any]:
+        if self._warm_quiz is None:
+            raise RuntimeError("CacheWarmer не настроен: не вызван configure()")
+
+        started = time.perf_counter()
+        report: Dict[str, Any] = {
+            "started_at": datetime.utcnow().isoformat(),
+            "quizzes": {"warmed": 0, "missing": 0, "failed": 0},
+            "catalog": False,
+            "categories": {"warmed": 0, "failed": 0},
+            "errors": []
+        }
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(kind: str, name: str, warm_fn: WarmFn, *args) -> Optional[bool]:
+            async with semaphore:
+                try:
+                    return await warm_fn(*args)
+                except Exception as e:
+                    report["errors"].append(f"{kind} {name}: {e}")
+                    return None
+
+        try:
+            db = await get_database()
+            quiz_ids = await self.popular_quiz_ids(db, self.top_quizzes)
+            categories = [c for c in await db.quizzes.distinct("category") if c]
+        except Exception as e:
+            report["errors"].append(f"выбор целей: {e}")
+            quiz_ids, categories = [], []
+
+        results = await asyncio.gather(
+            run("catalog", "", self._warm_catalog),
+            *(run("quiz", quiz_id, self._warm_quiz, quiz_id) for quiz_id in quiz_ids),
+            *(run("category", category, self._warm_category, category) for category in categories)
+        )
+        report["catalog"] = bool(results[0])
+        for warmed in results[1:1 + len(quiz_ids)]:
+            key = "failed" if warmed is None else ("warmed" if warmed else "missing")
+            report["quizzes"][key] += 1
+        for warmed in results[1 + len(quiz_ids):]:
+            report["categories"]["failed" if warmed is None else "warmed"] += 1
+
+        report["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        self.last_report = report
+        print(f"🔥 Прогрев кэша за {report['duration_ms']} мс: квизов {report['quizzes']['warmed']}, "
+              f"категорий {report['categories']['warmed']}, ошибок {len(report['errors'])}")
+        return report
+
+    def start(self, on_startup: bool = CACHE_WARM_ON_STARTUP, interval: int = CACHE_WARM_INTERVAL):
+        """Фоновый прогрев при старте и/или по расписанию"""
+        if self._task is None and (on_startup or interval > 0):
+            self._task = contextvars.Context().run(asyncio.ensure_future, self._schedule(on_startup, interval))
+
+    async def _schedule(self, on_startup: bool, interval: int):
+        if on_startup:
+            await self._warm_safely()
+        while interval > 0:
+            await asyncio.sleep(interval)
+            await self._warm_safely()
+
+    async def _warm_safely(self):
+        try:
+            await self.warm()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Ошибка прогрева кэша: {e}")
+
+    async def stop(self):
+        for task in (self._task, self._running):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._task = None
+        self._running = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "top_quizzes": self.top_quizzes,
+            "concurrency": self.concurrency,
+            "last_report": self.last_report
+        }
+
+
+# Глобальный экземпляр
+cache_warmer = CacheWarmer()
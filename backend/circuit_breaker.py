@@ -0,0 +1,69 @@
+"""
+Автоматический выключатель (circuit breaker) для внешних зависимостей
+
+closed    - все операции идут в зависимость, ошибки считаются в скользящем окне;
+open      - после failure_threshold ошибок за window секунд операции сразу
+            пропускаются (без ожидания таймаутов);
+half_open - через reset_timeout секунд разрешается пробный запрос: успех
+            закрывает выключатель, ошибка снова открывает его.
+"""
+import time
+from collections import deque
+from typing import Any, Dict
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Счетчик ошибок со скользящим окном и тремя состояниями"""
+
+    def __init__(self, failure_threshold: int = 5, window: float = 10.0, reset_timeout: float = 5.0):
+        self.failure_threshold = failure_threshold
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._failures: deque = deque()
+
+    @property
+    def is_closed(self) -> bool:
+        return self.state == CLOSED
+
+    def record_failure(self):
+        """Зафиксировать ошибку; при превышении порога - открыть выключатель"""
+        now = time.monotonic()
+        if self.state == HALF_OPEN:
+            self._open(now)
+            return
+        self._failures.append(now)
+        while self._failures and self._failures[0] < now - self.window:
+            self._failures.popleft()
+        if self.state == CLOSED and len(self._failures) >= self.failure_threshold:
+            self._open(now)
+
+    def should_probe(self) -> bool:
+        """Пора ли сделать пробный запрос (переводит open -> half_open)"""
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+        return self.state == HALF_OPEN
+
+    def record_success(self):
+        """Успешная проба: закрыть выключатель и забыть старые ошибки"""
+        self.state = CLOSED
+        self._failures.clear()
+
+    def _open(self, now: float):
+        self.state = OPEN
+        self.opened_at = now
+        self.times_opened += 1
+        self._failures.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "recent_failures": len(self._failures),
+            "times_opened": self.times_opened
+        }
@@ -0,0 +1,189 @@
+"""
+Потоковая выгрузка коллекций в NDJSON и CSV
+
+Документы читаются курсором MongoDB пачками по batch_size и сразу
+превращаются в байты ответа: в памяти одна пачка курсора и один кусок
+вывода (~EXPORT_CHUNK_BYTES), сколько бы документов ни было в коллекции.
+Вывод по желанию сжимается gzip на лету (zlib.compressobj).
+
+Порядок - по _id: сортировка идет по индексу _id, без сортировки в памяти
+сервера MongoDB, которая для больших выборок упирается в лимит.
+"""
+import csv
+import io
+import json
+import zlib
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+from bson import ObjectId
+
+EXPORT_BATCH_SIZE = 1000
+# Куски ответа примерно такого размера (меньше - больше мелких записей в сокет)
+EXPORT_CHUNK_BYTES = 64 * 1024
+EXPORT_FORMATS = ("ndjson", "csv")
+
+
+@dataclass(frozen=True)
+class ExportSpec:
+    """Как выгружать коллекцию: поле даты, поле владельца и колонки CSV"""
+    date_field: str
+    owner_field: str
+    owner_is_object_id: bool
+    columns: Tuple[str, ...]
+
+
+EXPORT_SPECS: Dict[str, ExportSpec] = {
+    "quizzes": ExportSpec(
+        date_field="created_at",
+        owner_field="created_by",
+        owner_is_object_id=False,
+        columns=("_id", "title", "description", "category", "difficulty", "time_limit",
+                 "created_by", "version_id", "created_at", "updated_at", "questions"),
+    ),
+    "quiz_results": ExportSpec(
+        date_field="completed_at",
+        owner_field="user_id",
+        owner_is_object_id=False,
+        columns=("_id", "quiz_id", "quiz_title", "version_id", "user_id", "score", "points",
+                 "category", "completed_at", "incorrect_questions"),
+    ),
+    "quiz_attempts": ExportSpec(
+        date_field="start_time",
+        owner_field="user_id",
+        owner_is_object_id=True,
+        columns=("_id", "quiz_id", "version_id", "user_id", "status", "start_time", "end_time",
+                 "score", "answers", "incorrect_questions"),
+    ),
+}
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+
+class ExportError(ValueError):
+    """Некорректные параметры выгрузки (коллекция, формат, фильтры)"""
+
+
+def _to_json_value(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Тип {type(value).__name__} не сериализуется в JSON")
+
+
+def build_export_query(collection: str, owner: Optional[str] = None,
+                       since: Optional[datetime] = None, until: Optional[datetime] = None) -> Dict[str, Any]:
+    """Фильтр MongoDB: владелец и полуинтервал [since, until) по полю даты коллекции"""
+    spec = EXPORT_SPECS.get(collection)
+    if spec is None:
+        raise ExportError(f"Неизвестная коллекция: {collection}")
+    query: Dict[str, Any] = {}
+    if owner:
+        if spec.owner_is_object_id:
+            if not ObjectId.is_valid(owner):
+                raise ExportError("owner должен быть ObjectId")
+            query[spec.owner_field] = ObjectId(owner)
+        else:
+            query[spec.owner_field] = owner
+    if since and until and since >= until:
+        raise ExportError("since должен быть раньше until")
+    date_range = {}
+    if since:
+        date_range["$gte"] = since
+    if until:
+        date_range["$lt"] = until
+    if date_range:
+        query[spec.date_field] = date_range
+    return query
+
+
+async def iter_documents(db, collection: str, query: Dict[str, Any],
+                         batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[Dict[str, Any]]:
+    """Документы курсором по _id; драйвер держит в памяти одну пачку"""
+    cursor = db[collection].find(query, sort=[("_id", 1)], batch_size=batch_size)
+    try:
+        async for document in cursor:
+            yield document
+    finally:
+        # Клиент оборвал загрузку - курсор на сервере не должен висеть до таймаута
+        await cursor.close()
+
+
+def _csv_cell(value: Any) -> Any:
+    """Вложенные значения (вопросы, ответы) - JSON в ячейке"""
+    if value is None:
+        return ""
+    if isinstance(value, (ObjectId, datetime)):
+        return _to_json_value(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=_to_json_value, ensure_ascii=False)
+    return value
+
+
+async def iter_export_text(documents: AsyncIterator[Dict[str, Any]], fmt: str,
+                           columns: Tuple[str, ...]) -> AsyncIterator[str]:
+    """Строки выгрузки, сгруппированные в куски ~EXPORT_CHUNK_BYTES"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if fmt == "csv":
+        writer.writerow(columns)
+
+    async for document in documents:
+        if fmt == "csv":
+            writer.writerow([_csv_cell(document.get(column)) for column in columns])
+        else:
+            buffer.write(json.dumps(document, default=_to_json_value, ensure_ascii=False))
+            buffer.write("\n")
+        if buffer.tell() >= EXPORT_CHUNK_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+async def iter_export_bytes(chunks: AsyncIterator[str], gzip_output: bool = False) -> AsyncIterator[bytes]:
+    """Куски в UTF-8, при gzip_output - потоково сжатые (wbits=31: формат gzip)"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip_output else None
+    async for chunk in chunks:
+        data = chunk.encode("utf-8")
+        if compressor is None:
+            yield data
+            continue
+        data = compressor.compress(data)
+        if data:
+            yield data
+    if compressor is not None:
+        yield compressor.flush()
+
+
+def export_filename(collection: str, fmt: str, gzip_output: bool = False) -> str:
+    stamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+    return f"{collection}-{stamp}.{fmt}{'.gz' if gzip_output else ''}"
+
+
+def stream_export(db, collection: str, fmt: str = "ndjson", owner: Optional[str] = None,
+                  since: Optional[datetime] = None, until: Optional[datetime] = None,
+                  gzip_output: bool = False, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[bytes]:
+    """
+    Байты выгрузки для StreamingResponse. Параметры проверяются сразу
+    (ExportError до начала ответа), MongoDB читается по мере отправки
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ExportError(f"Неизвестный формат: {fmt}")
+    query = build_export_query(collection, owner, since, until)
+    documents = iter_documents(db, collection, query, batch_size)
+    text = iter_export_text(documents, fmt, EXPORT_SPECS[collection].columns)
+    return iter_export_bytes(text, gzip_output)
+
+
+def export_media_type(fmt: str, gzip_output: bool = False) -> str:
+    """Сжатая выгрузка - файл .gz, а не Content-Encoding (браузер распаковал бы его при сохранении)"""
+    return "application/gzip" if gzip_output else MEDIA_TYPES[fmt]
+
+
+def export_headers(collection: str, fmt: str, gzip_output: bool = False) -> Dict[str, str]:
+    """Заголовки ответа: имя файла для скачивания"""
+    return {"Content-Disposition": f'attachment; filename="{export_filename(collection, fmt, gzip_output)}"'}
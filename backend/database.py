@@ -1,11 +1,15 @@
 """
 Централизованное подключение к MongoDB для всего приложения
-Оптимизировано для Vercel serverless environment
-Убрана проблема с глобальными переменными - создается новое подключение для каждого запроса
+Один долгоживущий клиент с пулом соединений на процесс: создается при старте
+приложения (или лениво при первом обращении) и переиспользуется всеми роутерами.
+В serverless-режиме (Vercel) клиент хранится в глобальной переменной модуля и
+переживает "теплые" вызовы функции.
 """
 import os
+from typing import Optional
 from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
+from .db_metrics import command_listener
 
 # Load .env файл
 env_path = os.path.join(os.path.dirname(__file__), '.env')
@@ -16,59 +20,85 @@ except:
 
 # MongoDB connection
 MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+DB_NAME = os.getenv("MONGODB_DB_NAME", "LearnApp")
 
-async def get_client():
-    """Получить MongoDB клиент (создает новое подключение каждый раз)"""
+# Serverless режим включается явно или автоматически на Vercel
+SERVERLESS = os.getenv("MONGODB_SERVERLESS", "").lower() in ("1", "true", "yes") or bool(os.getenv("VERCEL"))
+
+# Настройки пула (в serverless по умолчанию меньше соединений и короче простой)
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "10" if SERVERLESS else "100"))
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "0" if SERVERLESS else "5"))
+MONGODB_MAX_IDLE_TIME_MS = int(os.getenv("MONGODB_MAX_IDLE_TIME_MS", "60000" if SERVERLESS else "300000"))
+MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS", "10000"))
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "10000"))
+MONGODB_CONNECT_TIMEOUT_MS = int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", "10000"))
+
+# Единственный клиент процесса
+_client: Optional[AsyncIOMotorClient] = None
+
+def _create_client() -> AsyncIOMotorClient:
+    """Создать клиент с настроенным пулом соединений"""
+    return AsyncIOMotorClient(
+        MONGODB_URL,
+        serverSelectionTimeoutMS=MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        connectTimeoutMS=MONGODB_CONNECT_TIMEOUT_MS,
+        maxPoolSize=MONGODB_MAX_POOL_SIZE,
+        minPoolSize=MONGODB_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGODB_MAX_IDLE_TIME_MS,
+        waitQueueTimeoutMS=MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+        retryWrites=True,
+        event_listeners=[command_listener]
+    )
+
+def _get_or_create_client() -> AsyncIOMotorClient:
+    """Вернуть общий клиент, создав его при первом обращении"""
+    global _client
+    if _client is None:
+        _client = _create_client()
+        mode = "serverless" if SERVERLESS else "server"
+        print(f"🔌 MongoDB пул создан ({mode}): maxPoolSize={MONGODB_MAX_POOL_SIZE}, "
+              f"minPoolSize={MONGODB_MIN_POOL_SIZE}, maxIdleTimeMS={MONGODB_MAX_IDLE_TIME_MS}")
+    return _client
+
+async def connect_to_mongo():
+    """Создать пул и один раз проверить подключение (вызывается при старте приложения)"""
+    client = _get_or_create_client()
     try:
-        print(f"🔄 Создаем СВЕЖЕЕ подключение к MongoDB...")
-        print(f"🔗 URL: {MONGODB_URL[:50]}...")
-        
-        # Создаем НОВЫЙ клиент каждый раз для serverless
-        client = AsyncIOMotorClient(
-            MONGODB_URL,
-            serverSelectionTimeoutMS=10000,  # Увеличили таймаут
-            connectTimeoutMS=10000,          # Увеличили таймаут
-            maxPoolSize=1,                   # Минимальный пул для serverless
-            retryWrites=True,
-            maxIdleTimeMS=30000             # Закрывать неактивные соединения через 30 сек
-        )
-        
-        print(f"🔄 Тестируем подключение...")
-        # Проверяем подключение
         await client.admin.command('ping')
-        print(f"✅ MongoDB подключена успешно!")
-        
-        return client
-        
+        print(f"✅ MongoDB подключена успешно")
     except Exception as e:
         print(f"❌ КРИТИЧЕСКАЯ ОШИБКА подключения к MongoDB:")
         print(f"❌ Тип ошибки: {type(e).__name__}")
         print(f"❌ Сообщение: {str(e)}")
         print(f"❌ URL (частично): {MONGODB_URL[:50]}...")
         raise
+    return client
+
+async def close_mongo_connection():
+    """Закрыть пул (вызывается при остановке приложения)"""
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+        print("🔌 MongoDB пул закрыт")
+
+async def get_client():
+    """Получить общий MongoDB клиент (без нового подключения и ping на каждый вызов)"""
+    return _get_or_create_client()
 
 async def get_database():
     """Получить базу данных LearnApp"""
-    client = await get_client()
-    db = client.LearnApp
-    print("📂 База данных LearnApp готова")
-    return db
+    return _get_or_create_client()[DB_NAME]
 
 # Синхронная версия для обратной совместимости (не рекомендуется использовать)
 def get_sync_client():
-    """Синхронная версия получения клиента"""
+    """Синхронная версия получения клиента (возвращает тот же общий клиент)"""
     try:
-        return AsyncIOMotorClient(
-            MONGODB_URL,
-            serverSelectionTimeoutMS=5000,
-            connectTimeoutMS=5000,
-            maxPoolSize=1,
-            retryWrites=True
-        )
+        return _get_or_create_client()
     except Exception as e:
         print(f"❌ Ошибка создания MongoDB клиента: {e}")
         return None
 
 # Экспортируем синхронные версии для обратной совместимости
 client = get_sync_client()
-db = client.LearnApp if client else None 
\ No newline at end of file
+db = client[DB_NAME] if client else None
@@ -0,0 +1,148 @@
+"""
+Мониторинг команд MongoDB в разрезе эндпоинтов
+
+pymongo CommandListener пишет каждую команду в статистику текущего HTTP-запроса
+(через contextvars: Motor копирует контекст в поток исполнителя). После ответа
+статистика агрегируется по маршруту FastAPI и доступна через /api/metrics,
+а при MONGO_SERVER_TIMING=true - еще и в заголовке Server-Timing.
+"""
+import os
+import threading
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+from pymongo import monitoring
+
+SERVER_TIMING_ENABLED = os.getenv("MONGO_SERVER_TIMING", "false").lower() in ("1", "true", "yes")
+
+
+def _count_documents(reply: Dict[str, Any]) -> int:
+    """Количество документов, вернувшихся в ответе на команду"""
+    cursor = reply.get("cursor") if isinstance(reply, dict) else None
+    if isinstance(cursor, dict):
+        batch = cursor.get("firstBatch", cursor.get("nextBatch"))
+        return len(batch) if batch else 0
+    if isinstance(reply, dict) and reply.get("value") is not None:
+        return 1  # findAndModify
+    return 0
+
+
+class RequestQueryStats:
+    """Статистика команд MongoDB одного HTTP-запроса"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.commands = 0
+        self.failed = 0
+        self.duration_ms = 0.0
+        self.docs_returned = 0
+        self.by_command: Dict[str, Dict[str, float]] = {}
+
+    def record(self, command_name: str, duration_ms: float, docs: int, failed: bool = False):
+        with self._lock:
+            self.commands += 1
+            self.failed += int(failed)
+            self.duration_ms += duration_ms
+            self.docs_returned += docs
+            entry = self.by_command.setdefault(command_name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            entry["count"] += 1
+            entry["total_ms"] += duration_ms
+            entry["max_ms"] = max(entry["max_ms"], duration_ms)
+
+    def server_timing(self) -> str:
+        """Значение заголовка Server-Timing"""
+        return f'mongo;desc="{self.commands} cmds, {self.docs_returned} docs";dur={self.duration_ms:.2f}'
+
+
+_current_stats: ContextVar[Optional[RequestQueryStats]] = ContextVar("mongo_request_stats", default=None)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Передает завершенные команды в статистику текущего запроса"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.record(event.command_name, event.duration_micros / 1000, _count_documents(event.reply))
+
+    def failed(self, event):
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.record(event.command_name, event.duration_micros / 1000, 0, failed=True)
+
+
+class RouteMetricsRegistry:
+    """Накопленные метрики MongoDB по маршрутам"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, route: str, stats: RequestQueryStats):
+        with self._lock:
+            entry = self._routes.setdefault(route, {
+                "requests": 0,
+                "commands": 0,
+                "failed": 0,
+                "total_ms": 0.0,
+                "docs_returned": 0,
+                "max_commands_per_request": 0,
+                "by_command": {}
+            })
+            entry["requests"] += 1
+            entry["commands"] += stats.commands
+            entry["failed"] += stats.failed
+            entry["total_ms"] += stats.duration_ms
+            entry["docs_returned"] += stats.docs_returned
+            entry["max_commands_per_request"] = max(entry["max_commands_per_request"], stats.commands)
+            for name, command in stats.by_command.items():
+                agg = entry["by_command"].setdefault(name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+                agg["count"] += command["count"]
+                agg["total_ms"] += command["total_ms"]
+                agg["max_ms"] = max(agg["max_ms"], command["max_ms"])
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Копия метрик со средними значениями на запрос"""
+        with self._lock:
+            result = {}
+            for route, entry in self._routes.items():
+                requests = entry["requests"] or 1
+                result[route] = {
+                    **{k: v for k, v in entry.items() if k != "by_command"},
+                    "avg_commands_per_request": round(entry["commands"] / requests, 2),
+                    "avg_ms_per_request": round(entry["total_ms"] / requests, 2),
+                    "by_command": {
+                        name: {**agg, "avg_ms": round(agg["total_ms"] / (agg["count"] or 1), 3)}
+                        for name, agg in entry["by_command"].items()
+                    }
+                }
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+
+# Глобальные экземпляры: слушатель передается в клиент (database.py)
+command_listener = MongoCommandListener()
+route_metrics = RouteMetricsRegistry()
+
+
+async def mongo_metrics_middleware(request, call_next):
+    """HTTP middleware: собирает команды MongoDB запроса и агрегирует по маршруту"""
+    stats = RequestQueryStats()
+    token = _current_stats.set(stats)
+    try:
+        response = await call_next(request)
+    finally:
+        _current_stats.reset(token)
+        route = request.scope.get("route")
+        # Несовпавшие пути (404) не попадают в метрики по отдельности
+        route_path = getattr(route, "path", None) or "<unmatched>"
+        route_metrics.record(f"{request.method} {route_path}", stats)
+
+    if SERVER_TIMING_ENABLED:
+        response.headers.append("Server-Timing", stats.server_timing())
+    return response
@@ -0,0 +1,55 @@
+"""
+HTTP-кэширование ответов: ETag по содержимому и условные GET
+
+ETag вычисляется один раз при загрузке данных в кэш (хеш канонического JSON)
+и хранится рядом с ними, поэтому проверка If-None-Match не требует ни
+сериализации, ни обращения к MongoDB. Любая запись в квизы сбрасывает кэш
+(bump "quizzes"), и следующий ответ получает новый ETag.
+"""
+import hashlib
+import json
+from typing import Any, Dict, Optional
+from fastapi import Request, Response
+
+ETAG_HEADER = "ETag"
+# Клиент может хранить ответ, но обязан перепроверять его через If-None-Match
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+
+def compute_etag(payload: Any) -> str:
+    """Сильный ETag: хеш канонического JSON-представления"""
+    canonical = json.dumps(payload, sort_keys=True, default=str, ensure_ascii=False, separators=(",", ":"))
+    return compute_body_etag(canonical.encode("utf-8"))
+
+
+def compute_body_etag(body: bytes) -> str:
+    """Сильный ETag готового тела ответа"""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Совпадает ли ETag с заголовком If-None-Match (слабое сравнение по RFC 9110)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+def conditional_response(request: Request, response: Response, etag: str,
+                         headers: Optional[Dict[str, str]] = None) -> Optional[Response]:
+    """
+    Проставить ETag и заголовки кэширования. Если клиент прислал совпадающий
+    If-None-Match - вернуть готовый 304 без тела, иначе None
+    """
+    all_headers = {ETAG_HEADER: etag, "Cache-Control": REVALIDATE_CACHE_CONTROL, **(headers or {})}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=all_headers)
+    response.headers.update(all_headers)
+    return None
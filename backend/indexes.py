@@ -0,0 +1,165 @@
+"""
+Реестр индексов MongoDB и проверка планов запросов
+
+Каждый "горячий" запрос приложения описан в QUERY_SHAPES, а нужные ему индексы -
+в INDEX_REGISTRY. ensure_indexes() идемпотентно создает индексы (при старте или
+из CLI), verify_query_plans() прогоняет explain() и падает, если какой-то запрос
+все еще выполняется через COLLSCAN.
+
+Использование:
+    python -m backend.indexes            # создать индексы
+    python -m backend.indexes --verify   # создать индексы и проверить планы
+"""
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, List
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+# Индексы по коллекциям. Имена заданы явно, чтобы повторный запуск был no-op
+INDEX_REGISTRY: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("login", ASCENDING)], name="login_unique", unique=True),
+        IndexModel([("role", ASCENDING), ("_id", ASCENDING)], name="role_id"),
+        IndexModel([("quiz_points", DESCENDING), ("_id", ASCENDING)], name="quiz_points_desc"),
+    ],
+    "quiz_results": [
+        IndexModel([("user_id", ASCENDING), ("completed_at", DESCENDING)], name="user_completed_at"),
+        IndexModel([("quiz_id", ASCENDING), ("user_id", ASCENDING), ("completed_at", DESCENDING)],
+                   name="quiz_user_completed_at"),
+        # Популярность квизов для прогрева кэша: $match по времени + $group по quiz_id без чтения документов
+        IndexModel([("completed_at", DESCENDING), ("quiz_id", ASCENDING)], name="completed_at_quiz"),
+    ],
+    "learning_recommendations": [
+        IndexModel([("user_id", ASCENDING), ("quiz_id", ASCENDING)], name="user_quiz"),
+    ],
+    "documents": [
+        IndexModel([("uploaded_by", ASCENDING)], name="uploaded_by"),
+    ],
+    "quizzes": [
+        IndexModel([("created_by", ASCENDING)], name="created_by"),
+        IndexModel([("source_document_id", ASCENDING)], name="source_document_id"),
+        IndexModel([("category", ASCENDING), ("_id", ASCENDING)], name="category_id"),
+        IndexModel([("difficulty", ASCENDING), ("_id", ASCENDING)], name="difficulty_id"),
+    ],
+    "quiz_versions": [
+        IndexModel([("quiz_id", ASCENDING), ("created_at", DESCENDING)], name="quiz_created_at"),
+    ],
+    "quiz_attempts": [
+        IndexModel([("quiz_id", ASCENDING)], name="quiz_id"),
+        IndexModel([("user_id", ASCENDING), ("_id", ASCENDING)], name="user_id_id"),
+        IndexModel([("start_time", DESCENDING), ("quiz_id", ASCENDING)], name="start_time_quiz"),
+    ],
+}
+
+# Формы запросов, которые не должны сканировать коллекцию целиком
+QUERY_SHAPES: List[Dict[str, Any]] = [
+    {"collection": "users", "filter": {"login": "probe@example.com"}},
+    {"collection": "quiz_results", "filter": {"user_id": "probe"}, "sort": [("completed_at", DESCENDING)]},
+    {"collection": "quiz_results", "filter": {"quiz_id": "probe", "user_id": "probe"},
+     "sort": [("completed_at", DESCENDING)]},
+    {"collection": "learning_recommendations", "filter": {"user_id": "probe", "quiz_id": "probe"}},
+    {"collection": "documents", "filter": {"uploaded_by": "probe"}},
+    {"collection": "quizzes", "filter": {"created_by": "probe"}},
+    {"collection": "quizzes", "filter": {"source_document_id": "probe"}},
+    {"collection": "quiz_attempts", "filter": {"quiz_id": "probe"}},
+    {"collection": "quiz_attempts", "filter": {"user_id": "probe"}, "sort": [("_id", ASCENDING)]},
+    {"collection": "quiz_attempts", "filter": {"start_time": {"$gte": datetime(2000, 1, 1)}}},
+    {"collection": "quiz_results", "filter": {"completed_at": {"$gte": datetime(2000, 1, 1)}}},
+    {"collection": "users", "filter": {"role": "student"}, "sort": [("_id", ASCENDING)]},
+    {"collection": "users", "filter": {"quiz_points": {"$gt": 0}}, "sort": [("quiz_points", DESCENDING), ("_id", ASCENDING)]},
+    {"collection": "quizzes", "filter": {"category": "probe"}, "sort": [("_id", ASCENDING)]},
+    {"collection": "quizzes", "filter": {"difficulty": "probe"}, "sort": [("_id", ASCENDING)]},
+]
+
+
+class IndexVerificationError(RuntimeError):
+    """Один или несколько запросов выполняются без индекса"""
+
+
+async def ensure_indexes(db) -> Dict[str, Dict[str, Any]]:
+    """
+    Создать все индексы из реестра (повторный вызов ничего не меняет).
+    Ошибка одной коллекции (конфликт опций, дубликаты под unique) не мешает
+    остальным: {"created": {коллекция: [имена]}, "failed": {коллекция: ошибка}}
+    """
+    created: Dict[str, List[str]] = {}
+    failed: Dict[str, str] = {}
+    for collection_name, indexes in INDEX_REGISTRY.items():
+        try:
+            names = await db[collection_name].create_indexes(indexes)
+        except Exception as e:
+            failed[collection_name] = str(e)
+            print(f"❌ Индексы {collection_name} не созданы: {e}")
+            continue
+        created[collection_name] = names
+        print(f"📇 Индексы {collection_name}: {', '.join(names)}")
+    return {"created": created, "failed": failed}
+
+
+def _plan_stages(plan: Dict[str, Any]) -> List[str]:
+    """Собрать все стадии плана выполнения (рекурсивно)"""
+    stages = []
+    if not isinstance(plan, dict):
+        return stages
+    if "stage" in plan:
+        stages.append(plan["stage"])
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            stages.extend(_plan_stages(plan[key]))
+    for child in plan.get("inputStages", []):
+        stages.extend(_plan_stages(child))
+    return stages
+
+
+async def explain_query_shape(db, shape: Dict[str, Any]) -> List[str]:
+    """Вернуть стадии выигравшего плана для формы запроса"""
+    cursor = db[shape["collection"]].find(shape["filter"])
+    if shape.get("sort"):
+        cursor = cursor.sort(shape["sort"])
+    explanation = await cursor.explain()
+    winning_plan = explanation.get("queryPlanner", {}).get("winningPlan", {})
+    return _plan_stages(winning_plan)
+
+
+async def verify_query_plans(db) -> List[Dict[str, Any]]:
+    """Проверить, что ни одна форма запроса не использует COLLSCAN"""
+    report = []
+    failures = []
+    for shape in QUERY_SHAPES:
+        stages = await explain_query_shape(db, shape)
+        entry = {"collection": shape["collection"], "filter": list(shape["filter"].keys()), "stages": stages}
+        report.append(entry)
+        if "COLLSCAN" in stages:
+            failures.append(entry)
+            print(f"❌ COLLSCAN: {shape['collection']} {entry['filter']}")
+        else:
+            print(f"✅ {shape['collection']} {entry['filter']}: {' <- '.join(stages)}")
+
+    if failures:
+        details = "; ".join(f"{f['collection']} {f['filter']}" for f in failures)
+        raise IndexVerificationError(f"Запросы без индекса: {details}")
+    return report
+
+
+async def main():
+    import argparse
+    from .database import connect_to_mongo, close_mongo_connection, get_database
+
+    parser = argparse.ArgumentParser(description="Создание и проверка индексов MongoDB")
+    parser.add_argument("--verify", action="store_true", help="Проверить планы запросов через explain()")
+    args = parser.parse_args()
+
+    await connect_to_mongo()
+    try:
+        db = await get_database()
+        result = await ensure_indexes(db)
+        if result["failed"]:
+            raise SystemExit(f"Не созданы индексы коллекций: {', '.join(result['failed'])}")
+        if args.verify:
+            await verify_query_plans(db)
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
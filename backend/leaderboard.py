@@ -0,0 +1,353 @@
+"""
+Рейтинги пользователей на sorted set Redis
+
+finish_quiz начисляет очки сразу в три набора (ZINCRBY в одном pipeline):
+    lb:global               - за все время (совпадает с users.quiz_points)
+    lb:category:{category}  - по категории квиза
+    lb:weekly:{YYYY-Www}    - за ISO-неделю, ключ живет LEADERBOARD_WEEKLY_TTL
+Топ N - ZREVRANGE, место пользователя - ZREVRANK: O(log n) без сортировки
+коллекции users. Имена хранятся рядом, в хеше lb:names, чтобы топ не ходил
+в MongoDB.
+
+Наборы можно пересобрать из MongoDB (rebuild): новые значения пишутся во
+временные ключи и атомарно подменяют живые через RENAME. Начисления,
+пришедшие во время пересборки, могут потеряться - запускать в тихое время:
+    python -m backend.leaderboard
+
+При запуске (LEADERBOARD_SEED_ON_STARTUP) наборы пересобираются в фоне,
+если lb:global нет: первый деплой или Redis без персистентности.
+
+Без Redis глобальный рейтинг считается по users.quiz_points (индекс
+quiz_points_desc), недельный и по категориям недоступны.
+"""
+import asyncio
+import os
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from bson import ObjectId
+from .redis_cache import cache
+from .database import get_database
+
+GLOBAL_KEY = "lb:global"
+NAMES_KEY = "lb:names"
+# Недельный набор хранится с запасом после окончания недели (секунды)
+LEADERBOARD_WEEKLY_TTL = int(os.getenv("LEADERBOARD_WEEKLY_TTL", str(35 * 24 * 3600)))
+LEADERBOARD_MAX_LIMIT = 100
+REBUILD_BATCH_SIZE = 1000
+LEADERBOARD_SEED_ON_STARTUP = os.getenv("LEADERBOARD_SEED_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+# Пересборку при старте запускает один воркер; замок снимается и по TTL, если воркер упал
+SEED_LOCK_KEY = "lb:seed:lock"
+SEED_LOCK_TTL = 600
+
+SCOPES = ("global", "category", "weekly")
+
+
+class LeaderboardUnavailable(Exception):
+    """Рейтинг нельзя посчитать без Redis"""
+
+
+def week_id(moment: datetime) -> str:
+    """ISO-неделя: 2024-W07"""
+    year, week, _ = moment.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def category_key(category: str) -> str:
+    return f"lb:category:{category}"
+
+
+def weekly_key(week: str) -> str:
+    return f"lb:weekly:{week}"
+
+
+def board_key(scope: str, category: Optional[str] = None, week: Optional[str] = None) -> str:
+    if scope == "global":
+        return GLOBAL_KEY
+    if scope == "category":
+        if not category:
+            raise ValueError("Для рейтинга по категории нужна категория")
+        return category_key(category)
+    if scope == "weekly":
+        return weekly_key(week or week_id(datetime.utcnow()))
+    raise ValueError(f"Неизвестный рейтинг: {scope}")
+
+
+def _decode(value: Any) -> Any:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+# === НАЧИСЛЕНИЕ ===
+
+async def record_points(user_id: str, name: str, points: int, category: Optional[str], completed_at: datetime):
+    """Начислить очки за квиз во все рейтинги одним pipeline (ошибка Redis не мешает завершению квиза)"""
+    client = cache.redis_client
+    if not client or points <= 0:
+        return
+    weekly = weekly_key(week_id(completed_at))
+    try:
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.zincrby(GLOBAL_KEY, points, user_id)
+            if category:
+                pipe.zincrby(category_key(category), points, user_id)
+            pipe.zincrby(weekly, points, user_id)
+            pipe.expire(weekly, LEADERBOARD_WEEKLY_TTL)
+            pipe.hset(NAMES_KEY, user_id, name)
+            await pipe.execute()
+    except Exception as e:
+        cache.report_failure(e)
+        print(f"Ошибка обновления рейтингов для {user_id}: {e}")
+
+
+async def remove_user(user_id: str) -> bool:
+    """
+    Убрать пользователя из всех рейтингов (удаление аккаунта): ZREM из глобального,
+    всех категорий и недель, HDEL имени. False - Redis недоступен, поможет rebuild
+    """
+    client = cache.redis_client
+    if not client:
+        return False
+    try:
+        boards = [GLOBAL_KEY]
+        for pattern in ("lb:category:*", "lb:weekly:*"):
+            boards.extend([key async for key in client.scan_iter(match=pattern, count=500)
+                           if b":rebuild:" not in key])
+        async with client.pipeline(transaction=False) as pipe:
+            for board in boards:
+                pipe.zrem(board, user_id)
+            pipe.hdel(NAMES_KEY, user_id)
+            await pipe.execute()
+        return True
+    except Exception as e:
+        cache.report_failure(e)
+        print(f"Ошибка удаления {user_id} из рейтингов: {e}")
+        return False
+
+
+# === ЧТЕНИЕ ===
+
+async def top(key: str, limit: int = 10) -> List[Dict[str, Any]]:
+    """Первые limit мест: [{rank, user_id, name, points}]"""
+    client = cache.redis_client
+    if not client:
+        if key == GLOBAL_KEY:
+            return await _top_from_mongo(limit)
+        raise LeaderboardUnavailable()
+    try:
+        rows = await client.zrevrange(key, 0, limit - 1, withscores=True)
+        user_ids = [_decode(member) for member, _ in rows]
+        names = await client.hmget(NAMES_KEY, user_ids) if user_ids else []
+    except Exception as e:
+        cache.report_failure(e)
+        print(f"Ошибка чтения рейтинга {key}: {e}")
+        if key == GLOBAL_KEY:
+            return await _top_from_mongo(limit)
+        raise LeaderboardUnavailable() from e
+    return [
+        {"rank": index + 1, "user_id": user_id, "name": _decode(name), "points": int(score)}
+        for index, ((_, score), user_id, name) in enumerate(zip(rows, user_ids, names))
+    ]
+
+
+async def rank(key: str, user_id: str) -> Dict[str, Any]:
+    """Место пользователя {rank, points, total}; rank None - очков в рейтинге нет"""
+    client = cache.redis_client
+    if not client:
+        if key == GLOBAL_KEY:
+            return await _rank_from_mongo(user_id)
+        raise LeaderboardUnavailable()
+    try:
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.zrevrank(key, user_id)
+            pipe.zscore(key, user_id)
+            pipe.zcard(key)
+            position, score, total = await pipe.execute()
+    except Exception as e:
+        cache.report_failure(e)
+        print(f"Ошибка чтения места в рейтинге {key}: {e}")
+        if key == GLOBAL_KEY:
+            return await _rank_from_mongo(user_id)
+        raise LeaderboardUnavailable() from e
+    return {
+        "user_id": user_id,
+        "rank": None if position is None else position + 1,
+        "points": int(score or 0),
+        "total": total
+    }
+
+
+async def _top_from_mongo(limit: int) -> List[Dict[str, Any]]:
+    db = await get_database()
+    users = await db.users.find(
+        {"quiz_points": {"$gt": 0}}, {"name": 1, "quiz_points": 1}
+    ).sort([("quiz_points", -1), ("_id", 1)]).limit(limit).to_list(limit)
+    return [
+        {"rank": index + 1, "user_id": str(user["_id"]), "name": user.get("name"), "points": user["quiz_points"]}
+        for index, user in enumerate(users)
+    ]
+
+
+async def _rank_from_mongo(user_id: str) -> Dict[str, Any]:
+    db = await get_database()
+    user = None
+    if ObjectId.is_valid(user_id):
+        user = await db.users.find_one({"_id": ObjectId(user_id)}, {"quiz_points": 1})
+    points = (user or {}).get("quiz_points", 0)
+    total = await db.users.count_documents({"quiz_points": {"$gt": 0}})
+    position = None
+    if points > 0:
+        position = await db.users.count_documents({"quiz_points": {"$gt": points}}) + 1
+    return {"user_id": user_id, "rank": position, "points": points, "total": total}
+
+
+# === ПЕРЕСБОРКА ===
+
+async def rebuild() -> Dict[str, Any]:
+    """Пересобрать все рейтинги из MongoDB: users.quiz_points и quiz_results (потоково, пачками)"""
+    client = cache.redis_client
+    if not client:
+        raise LeaderboardUnavailable()
+    db = await get_database()
+    started = datetime.utcnow()
+    suffix = f":rebuild:{uuid.uuid4().hex}"
+    names_tmp = NAMES_KEY + suffix
+    live_keys = {GLOBAL_KEY: GLOBAL_KEY + suffix, NAMES_KEY: names_tmp}
+    users_count = results_count = 0
+    # Результаты удаленных пользователей остаются в quiz_results, но в рейтинги не попадают
+    ranked_users = set()
+
+    # Глобальный рейтинг и имена - из users (quiz_points - источник истины)
+    pipe = client.pipeline(transaction=False)
+    async for user in db.users.find({"quiz_points": {"$gt": 0}}, {"name": 1, "quiz_points": 1},
+                                    batch_size=REBUILD_BATCH_SIZE):
+        user_id = str(user["_id"])
+        ranked_users.add(user_id)
+        pipe.zadd(live_keys[GLOBAL_KEY], {user_id: user["quiz_points"]})
+        pipe.hset(names_tmp, user_id, user.get("name") or "")
+        users_count += 1
+        if users_count % REBUILD_BATCH_SIZE == 0:
+            await pipe.execute()
+    await pipe.execute()
+
+    # Категории и недели - из quiz_results; старые результаты без points/category дополняются
+    categories = {
+        str(quiz["_id"]): quiz.get("category")
+        async for quiz in db.quizzes.find({}, {"category": 1}, batch_size=REBUILD_BATCH_SIZE)
+    }
+    current_week = week_id(started)
+    async for result in db.quiz_results.find(
+        {}, {"user_id": 1, "quiz_id": 1, "score": 1, "points": 1, "category": 1, "completed_at": 1},
+        batch_size=REBUILD_BATCH_SIZE
+    ):
+        points = result.get("points")
+        if points is None:
+            points = int((result.get("score") or 0) // 10)
+        if points <= 0:
+            continue
+        user_id = str(result["user_id"])
+        if user_id not in ranked_users:
+            continue
+        category = result.get("category") or categories.get(str(result.get("quiz_id")))
+        if category:
+            key = category_key(category)
+            live_keys.setdefault(key, key + suffix)
+            pipe.zincrby(live_keys[key], points, user_id)
+        completed_at = result.get("completed_at")
+        if completed_at and week_id(completed_at) == current_week:
+            key = weekly_key(current_week)
+            live_keys.setdefault(key, key + suffix)
+            pipe.zincrby(live_keys[key], points, user_id)
+        results_count += 1
+        if results_count % REBUILD_BATCH_SIZE == 0:
+            await pipe.execute()
+    await pipe.execute()
+
+    # Атомарная подмена: RENAME новых наборов, удаление наборов, которых больше нет
+    async with client.pipeline(transaction=False) as check:
+        for tmp in live_keys.values():
+            check.exists(tmp)
+        built = await check.execute()
+    stale = [
+        key async for key in client.scan_iter(match="lb:category:*")
+        if b":rebuild:" not in key and _decode(key) not in live_keys
+    ]
+    async with client.pipeline(transaction=True) as swap:
+        if stale:
+            swap.unlink(*stale)
+        for (live, tmp), tmp_exists in zip(live_keys.items(), built):
+            if tmp_exists:
+                swap.rename(tmp, live)
+            else:
+                swap.unlink(live)
+        swap.expire(weekly_key(current_week), LEADERBOARD_WEEKLY_TTL)
+        await swap.execute()
+
+    report = {
+        "users": users_count,
+        "results": results_count,
+        "boards": sorted(live for live in live_keys if live != NAMES_KEY),
+        "duration_ms": round((datetime.utcnow() - started).total_seconds() * 1000, 1)
+    }
+    print(f"🏆 Рейтинги пересобраны за {report['duration_ms']} мс: "
+          f"пользователей {users_count}, результатов {results_count}")
+    return report
+
+
+async def ensure_built() -> Optional[Dict[str, Any]]:
+    """Пересобрать рейтинги, если lb:global нет; None - пересборка не нужна или ее делает другой воркер"""
+    client = cache.redis_client
+    if not client:
+        return None
+    try:
+        if await client.exists(GLOBAL_KEY):
+            return None
+        if not await client.set(SEED_LOCK_KEY, "1", nx=True, ex=SEED_LOCK_TTL):
+            return None
+    except Exception as e:
+        cache.report_failure(e)
+        print(f"Ошибка проверки рейтингов: {e}")
+        return None
+    try:
+        return await rebuild()
+    except Exception as e:
+        cache.report_failure(e)
+        print(f"❌ Ошибка пересборки рейтингов: {e}")
+        return None
+    finally:
+        try:
+            await client.delete(SEED_LOCK_KEY)
+        except Exception:
+            pass
+
+
+_seed_task: Optional[asyncio.Task] = None
+
+
+def start_seeding(on_startup: bool = LEADERBOARD_SEED_ON_STARTUP):
+    """Фоновая пересборка при старте: запуск не ждет MongoDB-выборку"""
+    global _seed_task
+    if on_startup and _seed_task is None:
+        _seed_task = asyncio.ensure_future(ensure_built())
+
+
+async def stop_seeding():
+    global _seed_task
+    if _seed_task and not _seed_task.done():
+        _seed_task.cancel()
+        try:
+            await _seed_task
+        except (asyncio.CancelledError, Exception):
+            pass
+    _seed_task = None
+
+
+if __name__ == "__main__":
+
+    async def _main():
+        await cache.connect()
+        try:
+            print(await rebuild())
+        finally:
+            await cache.disconnect()
+
+    asyncio.run(_main())
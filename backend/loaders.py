@@ -0,0 +1,110 @@
+"""
+Пакетные загрузчики (data loader) для устранения N+1 запросов
+
+BatchLoader собирает ключи, запрошенные в рамках одного шага event loop,
+и отвечает на все одним пакетным запросом ($in / $group). Загрузчики живут
+в пределах одного HTTP-запроса: создаются в обработчике и не разделяются
+между пользователями.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List
+from bson import ObjectId
+
+BatchFn = Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]]
+
+
+class BatchLoader:
+    """Коалесцирует load(key) в один вызов batch_fn(keys) на шаг event loop"""
+
+    def __init__(self, batch_fn: BatchFn, default: Any = None):
+        self._batch_fn = batch_fn
+        self._default = default
+        self._futures: Dict[Hashable, asyncio.Future] = {}
+        self._pending: List[Hashable] = []
+        self._scheduled = False
+
+    def load(self, key: Hashable) -> Awaitable[Any]:
+        """Запросить значение по ключу (повторные ключи не загружаются дважды)"""
+        if key in self._futures:
+            return self._futures[key]
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._futures[key] = future
+        self._pending.append(key)
+        if not self._scheduled:
+            self._scheduled = True
+            loop.call_soon(lambda: asyncio.ensure_future(self._dispatch()))
+        return future
+
+    async def load_many(self, keys: Iterable[Hashable]) -> List[Any]:
+        """Загрузить значения для списка ключей одним пакетом"""
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    async def _dispatch(self):
+        keys, self._pending = self._pending, []
+        self._scheduled = False
+        try:
+            results = await self._batch_fn(keys)
+        except Exception as e:
+            for key in keys:
+                if not self._futures[key].done():
+                    self._futures[key].set_exception(e)
+            return
+        for key in keys:
+            if not self._futures[key].done():
+                self._futures[key].set_result(results.get(key, self._default))
+
+
+def _id_variants(ids: Iterable[str]) -> List[Any]:
+    """Строковые id и их ObjectId-версии (ссылки хранятся в обоих видах)"""
+    variants: List[Any] = []
+    for value in ids:
+        variants.append(value)
+        if ObjectId.is_valid(value):
+            variants.append(ObjectId(value))
+    return variants
+
+
+def quiz_count_by_document_loader(db) -> BatchLoader:
+    """Количество квизов, сгенерированных из каждого документа"""
+
+    async def batch(document_ids: List[str]) -> Dict[str, int]:
+        pipeline = [
+            {"$match": {"source_document_id": {"$in": list(document_ids)}}},
+            {"$group": {"_id": "$source_document_id", "count": {"$sum": 1}}}
+        ]
+        rows = await db.quizzes.aggregate(pipeline).to_list(None)
+        return {row["_id"]: row["count"] for row in rows}
+
+    return BatchLoader(batch, default=0)
+
+
+def attempt_count_by_quiz_loader(db) -> BatchLoader:
+    """Количество попыток по каждому квизу"""
+
+    async def batch(quiz_ids: List[str]) -> Dict[str, int]:
+        pipeline = [
+            {"$match": {"quiz_id": {"$in": _id_variants(quiz_ids)}}},
+            {"$group": {"_id": {"$toString": "$quiz_id"}, "count": {"$sum": 1}}}
+        ]
+        rows = await db.quiz_attempts.aggregate(pipeline).to_list(None)
+        return {row["_id"]: row["count"] for row in rows}
+
+    return BatchLoader(batch, default=0)
+
+
+def s3_key_exists_loader(s3_service) -> BatchLoader:
+    """Существование файлов в S3: один листинг на префикс вместо head_object на файл"""
+
+    async def batch(s3_keys: List[str]) -> Dict[str, bool]:
+        if not s3_service.is_available():
+            return {}
+        # Ключ без "{user_id}/" проверяется сам по себе: пустой префикс листал бы весь бакет
+        prefixes = {key.split("/", 1)[0] + "/" if "/" in key else key for key in s3_keys if key}
+        existing = set()
+        for prefix in prefixes:
+            existing.update(await s3_service.list_keys(prefix))
+        return {key: key in existing for key in s3_keys}
+
+    return BatchLoader(batch, default=False)
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.docs import get_swagger_ui_html, get_redoc_html
 from fastapi.openapi.utils import get_openapi
@@ -6,11 +6,18 @@ from motor.motor_asyncio import AsyncIOMotorClient
 from .models import QuizBase, QuizQuestion, UserCreate, UserLogin, UserResponse, QuizDB, QuizResponse, UserInDB, QuizAttempt, UserRole
 from .middleware import create_access_token, get_current_user, require_admin, require_teacher_or_admin
 from .redis_cache import cache
+from .indexes import ensure_indexes, verify_query_plans
+from .db_metrics import mongo_metrics_middleware, route_metrics
+from .pagination import NEXT_CURSOR_HEADER
+from .http_cache import ETAG_HEADER
+from .response_cache import cached_json_response
+from .cache_warmer import cache_warmer
+from . import leaderboard
+from .password_hashing import password_hasher
 from datetime import datetime, timedelta
-from passlib.context import CryptContext
 from bson import ObjectId
 from typing import List
-from src.auth.routers import quiz_attempts, quizzes, admin, teachers
+from src.auth.routers import quiz_attempts, quizzes, admin, teachers, leaderboards
 import os
 
 app = FastAPI(
@@ -41,16 +48,20 @@ for origin in required_origins:
 
 print(f"🌐 CORS origins: {cors_origins}")
 
+# Счетчики команд MongoDB по эндпоинтам (см. /api/metrics)
+app.middleware("http")(mongo_metrics_middleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=cors_origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, ETAG_HEADER],
 )
 
 # MongoDB connection - используем централизованное подключение
-from .database import client, db, MONGODB_URL, get_client, get_database
+from .database import client, db, MONGODB_URL, SERVERLESS, get_client, get_database, connect_to_mongo, close_mongo_connection
 
 # Collections
 quizzes_collection = db.quizzes
@@ -58,31 +69,55 @@ users_collection = db.users
 learning_paths_collection = db.learning_paths
 quiz_attempts_collection = db.quiz_attempts
 
-# Настройка хеширования паролей
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Индексы создаются при старте; проверку планов (explain) можно включить отдельно
+ENSURE_INDEXES_ON_STARTUP = os.getenv("MONGODB_ENSURE_INDEXES", "true").lower() in ("1", "true", "yes")
+VERIFY_INDEXES_ON_STARTUP = os.getenv("MONGODB_VERIFY_INDEXES", "false").lower() in ("1", "true", "yes")
+
+# Хеширование паролей выполняется вне event loop (см. password_hashing.py)
 
 # === СОБЫТИЯ ЖИЗНЕННОГО ЦИКЛА ===
 
 @app.on_event("startup")
 async def startup_event():
     """Инициализация при запуске приложения"""
-    # Проверяем подключение к MongoDB
+    # Создаем общий пул MongoDB и прогреваем его
     try:
-        mongodb_client = await get_client()
-        print("✅ MongoDB подключена успешно")
+        await connect_to_mongo()
         print(f"🔗 MongoDB URL: {MONGODB_URL[:50]}...")
     except Exception as e:
         print(f"❌ Ошибка подключения к MongoDB: {e}")
     
+    # Индексы для горячих запросов
+    if ENSURE_INDEXES_ON_STARTUP:
+        try:
+            result = await ensure_indexes(await get_database())
+            if result["failed"]:
+                print(f"⚠️ Индексы не созданы для: {', '.join(result['failed'])}")
+        except Exception as e:
+            print(f"❌ Ошибка создания индексов: {e}")
+    if VERIFY_INDEXES_ON_STARTUP:
+        # Намеренно без try: запуск с COLLSCAN в горячих запросах должен падать
+        await verify_query_plans(await get_database())
+    
     # Подключаем Redis
     await cache.connect()
+    # Прогрев популярных квизов и каталога идет в фоне и не задерживает запуск
+    cache_warmer.start()
+    # Пустой Redis (первый деплой, рестарт без персистентности) - рейтинги пересобираются из MongoDB
+    leaderboard.start_seeding()
     print("🚀 Приложение запущено")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Очистка при остановке приложения"""
-    # Отключаем Redis
+    # Останавливаем прогрев и отключаем Redis
+    await cache_warmer.stop()
+    await leaderboard.stop_seeding()
     await cache.disconnect()
+    # В serverless-режиме пул сохраняется между "теплыми" вызовами
+    if not SERVERLESS:
+        await close_mongo_connection()
+    password_hasher.shutdown()
     print("🛑 Приложение остановлено")
 
 # Include routers
@@ -90,6 +125,7 @@ app.include_router(quiz_attempts.router, prefix="/api/quiz-attempts", tags=["qui
 app.include_router(quizzes.router, tags=["quizzes"])
 app.include_router(admin.router, prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
 app.include_router(teachers.router, prefix="/teachers", tags=["teachers"])
+app.include_router(leaderboards.router, prefix="/api/leaderboard", tags=["leaderboard"])
 
 # Кастомные эндпоинты для документации
 @app.get("/docs", include_in_schema=False)
@@ -165,6 +201,8 @@ async def health_check():
         if cache.redis_client:
             await cache.redis_client.ping()
             status["services"]["redis"] = "healthy"
+        elif not cache.breaker.is_closed:
+            status["services"]["redis"] = f"circuit_{cache.breaker.state}"
         else:
             status["services"]["redis"] = "not_configured"
     except Exception as e:
@@ -172,6 +210,19 @@ async def health_check():
     
     return status
 
+@app.get("/api/metrics",
+        dependencies=[Depends(require_admin)],
+        summary="Метрики производительности [админ]",
+        description="Количество и время команд MongoDB по эндпоинтам, пул bcrypt, попадания в кэш по уровням, последний прогрев кэша",
+        tags=["статус"])
+async def get_metrics():
+    return {
+        "mongo": route_metrics.snapshot(),
+        "password_hashing": password_hasher.stats(),
+        "cache": cache.get_stats(),
+        "cache_warmer": cache_warmer.stats()
+    }
+
 @app.post("/api/register", 
          response_model=UserResponse,
          summary="Регистрация пользователя",
@@ -185,7 +236,7 @@ async def register(user: UserCreate):
         raise HTTPException(status_code=400, detail="Пользователь с таким email уже существует")
     
     # Хешируем пароль
-    hashed_password = pwd_context.hash(user.password)
+    hashed_password = await password_hasher.hash(user.password)
     user_dict = user.model_dump()
     user_dict["password"] = hashed_password
     user_dict["created_at"] = datetime.now()
@@ -212,22 +263,23 @@ async def login(user: UserLogin):
     # Находим пользователя
     db = await get_database()
     db_user = await db.users.find_one({"login": user.login})
-    if not db_user or not pwd_context.verify(user.password, db_user["password"]):
+    if not db_user or not await password_hasher.verify(user.password, db_user["password"]):
         raise HTTPException(status_code=401, detail="Неверный email или пароль")
     
-    # Создаем токен
+    # Получаем роль пользователя (для обратной совместимости проверяем старое поле is_admin)
+    user_role = db_user.get("role", "student")
+    if "is_admin" in db_user and db_user["is_admin"]:
+        user_role = "admin"
+    
+    # Создаем токен (роль в него не кладется: она проверяется по актуальным данным пользователя)
     access_token_expires = timedelta(minutes=30)
     access_token = create_access_token(
         data={"sub": str(db_user["_id"])},
         expires_delta=access_token_expires
     )
     
-    # Получаем роль пользователя (для обратной совместимости проверяем старое поле is_admin)
-    user_role = db_user.get("role", "student")
-    if "is_admin" in db_user and db_user["is_admin"]:
-        user_role = "admin"
-    
-    # Сохраняем сессию в Redis
+    # Сессию в Redis создает первый запрос с токеном (resolve_principal): она
+    # помечается поколением principal:{id}, прочитанным до чтения пользователя
     user_id = str(db_user["_id"])
     session_data = {
         "id": user_id,
@@ -235,10 +287,9 @@ async def login(user: UserLogin):
         "login": db_user["login"],
         "role": user_role,
         "quiz_points": db_user.get("quiz_points", 0),
+        "created_at": db_user.get("created_at"),
         "last_activity": datetime.now().isoformat()
     }
-    await cache.save_session(user_id, session_data)
-    
     # Кэшируем профиль пользователя
     await cache.cache_user_profile(user_id, session_data)
     
@@ -272,34 +323,40 @@ async def check_admin(current_user: UserInDB = Depends(get_current_user)):
         summary="Профиль пользователя",
         description="Возвращает информацию о текущем пользователе",
         tags=["аутентификация"])
-async def get_profile(current_user: UserInDB = Depends(get_current_user)):
+async def get_profile(request: Request, current_user: UserInDB = Depends(get_current_user)):
     """
     Возвращает профиль текущего авторизованного пользователя
     """
     user_id = str(current_user.id) if hasattr(current_user, 'id') else str(current_user._id)
     
-    # Сначала пробуем получить из кэша
-    cached_profile = await cache.get_user_profile(user_id)
-    if cached_profile:
-        print(f"📦 Профиль пользователя {user_id} получен из кэша")
-        return cached_profile
-    
-    # Если нет в кэше, получаем из БД
-    user_role = getattr(current_user, 'role', 'student')
-    profile_data = {
-        "id": user_id,
-        "name": current_user.name,
-        "login": current_user.login,
-        "role": user_role,
-        "quiz_points": getattr(current_user, 'quiz_points', 0),
-        "created_at": getattr(current_user, 'created_at', None)
-    }
-    
-    # Кэшируем профиль
-    await cache.cache_user_profile(user_id, profile_data)
-    print(f"💾 Профиль пользователя {user_id} сохранен в кэш")
+    async def load_profile():
+        # Сначала пробуем получить из кэша
+        cached_profile = await cache.get_user_profile(user_id)
+        if cached_profile:
+            print(f"📦 Профиль пользователя {user_id} получен из кэша")
+            return cached_profile
+        
+        # Если нет в кэше, собираем из принципала
+        user_role = getattr(current_user, 'role', 'student')
+        profile_data = {
+            "id": user_id,
+            "name": current_user.name,
+            "login": current_user.login,
+            "role": user_role,
+            "quiz_points": getattr(current_user, 'quiz_points', 0),
+            "created_at": getattr(current_user, 'created_at', None)
+        }
+        
+        # Кэшируем профиль
+        await cache.cache_user_profile(user_id, profile_data)
+        print(f"💾 Профиль пользователя {user_id} сохранен в кэш")
+        return profile_data
     
-    return profile_data
+    # Готовый ответ сбрасывается вместе с данными пользователя (bump user:{id})
+    return await cached_json_response(
+        request, f"profile:{user_id}", [f"user:{user_id}"], load_profile,
+        ttl=7200, headers={"Cache-Control": "private, no-cache"}
+    )
 
 if __name__ == "__main__":
     import uvicorn
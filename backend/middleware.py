@@ -4,6 +4,8 @@ from typing import Optional
 import jwt
 from datetime import datetime, timedelta
 from .models import UserInDB, UserRole
+from .redis_cache import cache
+from .local_cache import LocalTTLCache
 from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
 import os
@@ -31,6 +33,29 @@ print(f"🔑 SECRET_KEY loaded: {'***' + SECRET_KEY[-4:] if len(SECRET_KEY) > 4
 
 security = HTTPBearer()
 
+# In-process кэш принципалов: короткий TTL ограничивает устаревание на других воркерах
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "30"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+principal_cache = LocalTTLCache(max_entries=AUTH_CACHE_SIZE, default_ttl=AUTH_CACHE_TTL)
+# Поля хеша сессии, из которых собирается принципал
+SESSION_PRINCIPAL_FIELDS = ["id", "name", "login", "role", "quiz_points", "created_at"]
+
+
+def _evict_principal_on_invalidation(key: str):
+    """
+    Инвалидация session:{id} / user:{id} / поколения principal:{id}
+    (в т.ч. из другого воркера) сбрасывает принципала
+    """
+    if key.startswith("gen:principal:"):
+        principal_cache.delete(key[len("gen:principal:"):])
+        return
+    namespace, _, user_id = key.partition(":")
+    if namespace in ("session", "user") and user_id:
+        principal_cache.delete(user_id)
+
+
+cache.add_invalidation_listener(_evict_principal_on_invalidation)
+
 # MongoDB connection - используем централизованное подключение
 from .database import get_database
 
@@ -44,27 +69,28 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(request: Request) -> UserInDB:
+def _decode_token(token: str) -> dict:
+    """Проверить подпись и срок действия JWT; вернуть claims"""
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    if payload.get("sub") is None:
+        raise jwt.InvalidTokenError("missing sub")
+    return payload
+
+async def _get_token_payload(request: Request) -> dict:
     try:
         credentials: HTTPAuthorizationCredentials = await security(request)
-        token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(status_code=401, detail="Неверный токен")
+        return _decode_token(credentials.credentials)
     except jwt.DecodeError:
         raise HTTPException(status_code=401, detail="Неверный токен")
     except Exception:
         raise HTTPException(status_code=401, detail="Не авторизован")
-    
-    # Получаем пользователя из базы данных
-    db = await get_database()
-    user_doc = await db.users.find_one({"_id": ObjectId(user_id)})
-    if not user_doc:
-        raise HTTPException(status_code=401, detail="Пользователь не найден")
-    
-    # Создаем объект UserInDB из документа
-    user_doc["id"] = str(user_doc["_id"])
+
+def _build_principal(user_doc: dict) -> UserInDB:
+    """Собрать UserInDB из документа MongoDB или сессии Redis (без хеша пароля)"""
+    user_doc = dict(user_doc)
+    if "_id" in user_doc:
+        user_doc["id"] = str(user_doc.pop("_id"))
+    user_doc["password"] = ""
     
     # Обеспечиваем обратную совместимость для is_admin
     user_role = user_doc.get("role", "student")
@@ -76,24 +102,102 @@ async def get_current_user(request: Request) -> UserInDB:
     
     return UserInDB(**user_doc)
 
+async def resolve_principal(user_id: str) -> Optional[UserInDB]:
+    """
+    Найти пользователя по id, двигаясь по уровням от дешевого к дорогому:
+    in-process LRU -> сессия в Redis -> MongoDB
+    """
+    if not ObjectId.is_valid(user_id):
+        return None
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+    
+    # Только нужные принципалу поля; чтение продлевает сессию (скользящий срок).
+    # Сессия сверяется с поколением principal:{id}: после смены роли или удаления она
+    # недействительна, даже если DEL не дошел до Redis. Пока инвалидация не
+    # подтверждена, get_session возвращает None и роль читается из MongoDB.
+    # Новые результаты квизов сбрасывают только user:{id} (профиль, страницы
+    # результатов), сессию они не отменяют - очки в ней обновляет HINCRBY
+    tag = f"principal:{user_id}"
+    session = await cache.get_session(user_id, fields=SESSION_PRINCIPAL_FIELDS, touch=True, tag=tag)
+    if session and session.get("id") == user_id and session.get("login"):
+        principal = _build_principal(session)
+    else:
+        # Поколение - до чтения пользователя: правка между ними сделает сессию недействительной
+        generation = (await cache.current_generations([tag]))[0]
+        db = await get_database()
+        user_doc = await db.users.find_one({"_id": ObjectId(user_id)}, {"password": 0})
+        if not user_doc:
+            return None
+        principal = _build_principal(user_doc)
+        if generation >= 0:
+            await cache.save_session(user_id, {**_session_data(principal), "gen": generation})
+        else:
+            # Данные в Redis под вопросом - принципал не кэшируется и в памяти
+            return principal
+    
+    principal_cache.set(user_id, principal)
+    return principal
+
+def _session_data(principal: UserInDB) -> dict:
+    """Данные сессии Redis, достаточные для восстановления принципала"""
+    return {
+        "id": principal.id,
+        "name": principal.name,
+        "login": principal.login,
+        "role": principal.role.value if isinstance(principal.role, UserRole) else principal.role,
+        "quiz_points": principal.quiz_points,
+        "created_at": principal.created_at,
+        "last_activity": datetime.now().isoformat()
+    }
+
+async def invalidate_principal(user_id: str) -> bool:
+    """
+    Сбросить все уровни кэша принципала (смена роли, удаление, смена логина).
+    Если Redis не подтвердил инвалидацию, она повторяется при восстановлении,
+    а до тех пор resolve_principal берет роль из MongoDB (см. cache.invalidation_pending)
+    """
+    principal_cache.delete(user_id)
+    confirmed = await cache.invalidate_user_cache(user_id)
+    if not confirmed:
+        print(f"⚠️ Инвалидация сессии {user_id} не подтверждена Redis, роль проверяется по MongoDB")
+    return confirmed
+
+async def get_current_user(request: Request) -> UserInDB:
+    payload = await _get_token_payload(request)
+    user = await resolve_principal(payload["sub"])
+    if not user:
+        raise HTTPException(status_code=401, detail="Пользователь не найден")
+    return user
+
 async def require_admin(request: Request):
-    user = await get_current_user(request)
+    detail = "Доступ запрещен. Требуются права администратора"
+    payload = await _get_token_payload(request)
+    user = await resolve_principal(payload["sub"])
+    if not user:
+        raise HTTPException(status_code=401, detail="Пользователь не найден")
     user_role = getattr(user, 'role', 'student')
     is_admin = user_role == UserRole.admin.value or getattr(user, 'is_admin', False)
     
     if not is_admin:
-        raise HTTPException(status_code=403, detail="Доступ запрещен. Требуются права администратора")
+        raise HTTPException(status_code=403, detail=detail)
     return user
 
 async def require_teacher_or_admin(request: Request):
     """
     Требует роль преподавателя или администратора
     """
-    user = await get_current_user(request)
+    detail = "Доступ запрещен. Требуются права преподавателя или администратора"
+    allowed_roles = [UserRole.teacher.value, UserRole.admin.value]
+    payload = await _get_token_payload(request)
+    user = await resolve_principal(payload["sub"])
+    if not user:
+        raise HTTPException(status_code=401, detail="Пользователь не найден")
     user_role = getattr(user, 'role', 'student')
     
-    if user_role not in [UserRole.teacher.value, UserRole.admin.value]:
-        raise HTTPException(status_code=403, detail="Доступ запрещен. Требуются права преподавателя или администратора")
+    if user_role not in allowed_roles:
+        raise HTTPException(status_code=403, detail=detail)
     return user
 
 async def require_role(required_role: UserRole):
@@ -124,28 +228,7 @@ async def optional_auth(request: Request):
             return None
         
         token = auth_header.replace("Bearer ", "")
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            return None
-        
-        # Получаем пользователя из базы данных
-        db = await get_database()
-        user_doc = await db.users.find_one({"_id": ObjectId(user_id)})
-        if not user_doc:
-            return None
-        
-        # Создаем объект UserInDB из документа
-        user_doc["id"] = str(user_doc["_id"])
-        
-        # Обеспечиваем обратную совместимость для is_admin
-        user_role = user_doc.get("role", "student")
-        if "is_admin" in user_doc and user_doc["is_admin"]:
-            user_role = "admin"
-            user_doc["role"] = "admin"
-        
-        user_doc["is_admin"] = user_role == "admin"
-        
-        return UserInDB(**user_doc)
+        payload = _decode_token(token)
+        return await resolve_principal(payload["sub"])
     except Exception:
         return None 
\ No newline at end of file
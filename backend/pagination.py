@@ -0,0 +1,113 @@
+"""
+Keyset-пагинация для списковых эндпоинтов
+
+Страница выбирается условием по ключам сортировки последнего элемента
+предыдущей страницы (а не skip), поэтому стоимость запроса не растет с
+номером страницы. Курсор непрозрачен для клиента: это base64 от значений
+ключей сортировки с сохранением типов ObjectId и datetime.
+"""
+import base64
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from bson import ObjectId
+from fastapi import HTTPException
+
+DEFAULT_PAGE_SIZE = int(os.getenv("PAGE_SIZE_DEFAULT", "50"))
+MAX_PAGE_SIZE = int(os.getenv("PAGE_SIZE_MAX", "200"))
+
+# Заголовок со ссылкой на следующую страницу для эндпоинтов, возвращающих массив
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Проекция для списков квизов: без тел вопросов, только их количество
+QUIZ_LIST_PROJECTION = {
+    "title": 1,
+    "description": 1,
+    "category": 1,
+    "difficulty": 1,
+    "time_limit": 1,
+    "created_by": 1,
+    "created_at": 1,
+    "updated_at": 1,
+    "question_count": {"$size": {"$ifNull": ["$questions", []]}}
+}
+
+SortSpec = List[Tuple[str, int]]
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return {"$oid": str(value)}
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "$oid" in value:
+            return ObjectId(value["$oid"])
+        if "$date" in value:
+            return datetime.fromisoformat(value["$date"])
+    return value
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """Упаковать значения ключей сортировки в непрозрачный курсор"""
+    raw = json.dumps([_encode_value(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, expected_len: int) -> List[Any]:
+    """Распаковать курсор; 400 если он поврежден или от другого эндпоинта"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(values, list) or len(values) != expected_len:
+            raise ValueError("cursor length mismatch")
+        return [_decode_value(v) for v in values]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Неверный курсор пагинации")
+
+
+def keyset_filter(sort: SortSpec, values: List[Any]) -> Dict[str, Any]:
+    """Условие "строго после" последнего элемента для составной сортировки"""
+    branches = []
+    for i, (field, direction) in enumerate(sort):
+        branch = {prev_field: values[j] for j, (prev_field, _) in enumerate(sort[:i])}
+        branch[field] = {"$gt" if direction > 0 else "$lt": values[i]}
+        branches.append(branch)
+    return branches[0] if len(branches) == 1 else {"$or": branches}
+
+
+def clamp_page_size(limit: Optional[int]) -> int:
+    """Ограничить размер страницы"""
+    if not limit or limit < 1:
+        return DEFAULT_PAGE_SIZE
+    return min(limit, MAX_PAGE_SIZE)
+
+
+async def paginate(
+    collection,
+    query: Dict[str, Any],
+    sort: SortSpec,
+    projection: Optional[Dict[str, Any]] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Вернуть одну страницу и курсор следующей (None - страниц больше нет).
+    Последним ключом сортировки должен быть уникальный _id.
+    """
+    page_size = clamp_page_size(limit)
+    if cursor:
+        after = keyset_filter(sort, decode_cursor(cursor, len(sort)))
+        query = {"$and": [query, after]} if query else after
+
+    docs = await collection.find(query, projection).sort(sort).limit(page_size + 1).to_list(page_size + 1)
+    next_cursor = None
+    if len(docs) > page_size:
+        docs = docs[:page_size]
+        next_cursor = encode_cursor([docs[-1].get(field) for field, _ in sort])
+    return docs, next_cursor
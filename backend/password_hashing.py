@@ -0,0 +1,94 @@
+"""
+Хеширование и проверка паролей вне event loop
+
+bcrypt намеренно медленный (~200 мс на операцию) и при вызове прямо в
+обработчике блокирует все остальные запросы воркера. Здесь операции
+выполняются в отдельном пуле потоков (bcrypt отпускает GIL), число
+одновременных операций ограничено, а глубина очереди видна в метриках.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Максимум ожидающих операций; 0 - без ограничения (лишние получают 503)
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "0"))
+
+
+class PasswordHasher:
+    """bcrypt в ограниченном пуле потоков со счетчиками очереди"""
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_queue: int = PASSWORD_HASH_MAX_QUEUE):
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self._context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        self._semaphore = None  # создается в работающем event loop
+        self.queued = 0
+        self.in_flight = 0
+        self.max_queue_seen = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_ms = 0.0
+        self.total_work_ms = 0.0
+
+    async def _run(self, fn: Callable[..., Any], *args) -> Any:
+        if self.max_queue and self.queued >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Сервер перегружен, повторите попытку позже")
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.workers)
+        enqueued_at = time.perf_counter()
+        self.queued += 1
+        self.max_queue_seen = max(self.max_queue_seen, self.queued)
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+
+        started_at = time.perf_counter()
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+            self.completed += 1
+            self.total_wait_ms += (started_at - enqueued_at) * 1000
+            self.total_work_ms += (time.perf_counter() - started_at) * 1000
+
+    async def hash(self, password: str) -> str:
+        """Захешировать пароль"""
+        return await self._run(self._context.hash, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        """Проверить пароль по хешу"""
+        return await self._run(self._context.verify, password, hashed)
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики пула: глубина очереди, занятость, средние времена"""
+        completed = self.completed or 1
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "max_queue_seen": self.max_queue_seen,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.total_wait_ms / completed, 2),
+            "avg_work_ms": round(self.total_work_ms / completed, 2)
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+# Глобальный экземпляр для всего приложения
+password_hasher = PasswordHasher()
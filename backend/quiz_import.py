@@ -0,0 +1,241 @@
+"""
+Потоковый импорт квизов из NDJSON или JSON-массива
+
+Вход читается по частям (тело запроса или файл) и разбирается по одной
+записи: в памяти только текущий фрагмент и одна пачка квизов, сколько бы
+их ни было. Формат определяется по первому символу: "[" - JSON-массив,
+иначе NDJSON (одна запись на строку).
+
+Каждая запись проходит приведение вопросов (quiz_schema) и проверку QuizBase;
+корректные пишутся пачками insert_many(ordered=False) вместе с первой
+версией (quiz_versions). Ошибки собираются по номерам записей и не
+останавливают импорт. Кэш списков и каталога сбрасывается один раз в конце,
+в том числе когда импорт прерван (отчет с полем aborted).
+"""
+import codecs
+import json
+import time
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from bson import ObjectId
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+from .models import QuizBase
+from .quiz_schema import normalize_questions, QuestionSchemaError
+from .quiz_versions import build_version
+from .redis_cache import cache
+
+IMPORT_BATCH_SIZE = 500
+# Сколько ошибок возвращать в отчете (счетчик failed учитывает все)
+MAX_REPORTED_ERRORS = 1000
+# Одна запись не может быть больше (защита от бесконечного буфера на битом JSON)
+MAX_RECORD_BYTES = 5 * 1024 * 1024
+# Поля, которые назначает сервер (например, при повторном импорте экспорта)
+SERVER_FIELDS = ("_id", "id", "version_id", "created_at", "updated_at")
+
+
+class ImportFormatError(ValueError):
+    """Поток нельзя разобрать дальше (битый JSON-массив, слишком длинная запись)"""
+
+
+async def iter_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Any, Optional[str]]]:
+    """
+    (номер записи, запись, ошибка разбора) по мере поступления байтов.
+    Ошибка в строке NDJSON пропускает только эту строку; в JSON-массиве
+    продолжить разбор нельзя - ImportFormatError
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    json_decoder = json.JSONDecoder()
+    buffer = ""
+    mode = None  # "ndjson" | "array"
+    index = 0
+
+    async def more() -> bool:
+        nonlocal buffer
+        async for chunk in chunks:
+            if chunk:
+                buffer += decoder.decode(chunk)
+                return True
+        buffer += decoder.decode(b"", final=True)
+        return False
+
+    has_more = True
+    while has_more or buffer:
+        if mode is None:
+            stripped = buffer.lstrip("\ufeff \t\r\n")
+            if not stripped:
+                if not has_more:
+                    return
+                has_more = await more()
+                continue
+            mode = "array" if stripped[0] == "[" else "ndjson"
+            buffer = stripped[1:] if mode == "array" else stripped
+
+        if mode == "ndjson":
+            newline = buffer.find("\n")
+            if newline < 0 and has_more:
+                if len(buffer) > MAX_RECORD_BYTES:
+                    raise ImportFormatError(f"Запись {index + 1} длиннее {MAX_RECORD_BYTES} байт")
+                has_more = await more()
+                continue
+            line, buffer = (buffer[:newline], buffer[newline + 1:]) if newline >= 0 else (buffer, "")
+            if not line.strip():
+                continue
+            try:
+                yield index, json.loads(line), None
+            except json.JSONDecodeError as e:
+                yield index, None, f"Некорректный JSON: {e.msg}"
+            index += 1
+            continue
+
+        # JSON-массив: элементы разбираются raw_decode, как только целиком пришли
+        position = 0
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        buffer = buffer[position:]
+        if buffer.startswith("]"):
+            buffer = buffer[1:]
+            while not buffer.strip() and has_more:
+                buffer = ""
+                has_more = await more()
+            if buffer.strip():
+                raise ImportFormatError("Данные после конца JSON-массива")
+            return
+        if not buffer:
+            if not has_more:
+                break
+            has_more = await more()
+            continue
+        try:
+            record, end = json_decoder.raw_decode(buffer)
+        except json.JSONDecodeError as e:
+            if not has_more:
+                raise ImportFormatError(f"Запись {index + 1}: некорректный JSON ({e.msg})")
+            if len(buffer) > MAX_RECORD_BYTES:
+                raise ImportFormatError(f"Запись {index + 1} длиннее {MAX_RECORD_BYTES} байт")
+            has_more = await more()
+            continue
+        # Значение принимается, только когда за ним виден разделитель: иначе число,
+        # оборванное на границе куска ("12" из "123", "4." из "4.5"), разобралось бы частично
+        delimiter = end
+        while delimiter < len(buffer) and buffer[delimiter] in " \t\r\n":
+            delimiter += 1
+        if delimiter == len(buffer) or buffer[delimiter] not in ",]":
+            if not has_more:
+                raise ImportFormatError(f"Запись {index + 1}: некорректный JSON (ожидается , или ])")
+            if len(buffer) > MAX_RECORD_BYTES:
+                raise ImportFormatError(f"Запись {index + 1} длиннее {MAX_RECORD_BYTES} байт")
+            has_more = await more()
+            continue
+        buffer = buffer[end:]
+        yield index, record, None
+        index += 1
+
+    if mode == "array":
+        raise ImportFormatError("JSON-массив не закрыт")
+
+
+def prepare_quiz(record: Any) -> Dict[str, Any]:
+    """Запись -> документ квиза (ValueError с понятным текстом, если запись некорректна)"""
+    if not isinstance(record, dict):
+        raise ValueError("Ожидается объект квиза")
+    record = {key: value for key, value in record.items() if key not in SERVER_FIELDS}
+    if isinstance(record.get("questions"), list):
+        record["questions"] = normalize_questions(record["questions"])
+    try:
+        quiz = QuizBase.model_validate(record).model_dump()
+    except ValidationError as e:
+        raise ValueError("; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+    now = datetime.utcnow()
+    quiz["_id"] = ObjectId()
+    quiz["created_at"] = now
+    quiz["updated_at"] = now
+    return quiz
+
+
+class QuizImporter:
+    """Пачки insert_many(ordered=False) и отчет по записям"""
+
+    def __init__(self, db, batch_size: int = IMPORT_BATCH_SIZE, dry_run: bool = False):
+        self.db = db
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.batch: List[Tuple[int, Dict[str, Any]]] = []
+        self.report: Dict[str, Any] = {"received": 0, "inserted": 0, "failed": 0, "errors": [], "aborted": None}
+
+    def _error(self, index: int, message: str):
+        self.report["failed"] += 1
+        if len(self.report["errors"]) < MAX_REPORTED_ERRORS:
+            self.report["errors"].append({"index": index, "error": message})
+
+    async def add(self, index: int, record: Any, parse_error: Optional[str] = None):
+        self.report["received"] += 1
+        if parse_error:
+            self._error(index, parse_error)
+            return
+        try:
+            quiz = prepare_quiz(record)
+        except (ValueError, QuestionSchemaError) as e:
+            self._error(index, str(e))
+            return
+        self.batch.append((index, quiz))
+        if len(self.batch) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        batch, self.batch = self.batch, []
+        if not batch:
+            return
+        if self.dry_run:
+            self.report["inserted"] += len(batch)
+            return
+
+        # Первые версии - до квизов: указатель никогда не ведет в пустоту
+        versions = [build_version(quiz) for _, quiz in batch]
+        for (_, quiz), version in zip(batch, versions):
+            quiz["version_id"] = version["_id"]
+        try:
+            await self.db.quiz_versions.insert_many(versions, ordered=False)
+        except BulkWriteError as e:
+            # Повтор той же версии (дубликат _id) - не ошибка
+            if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+
+        try:
+            result = await self.db.quizzes.insert_many([quiz for _, quiz in batch], ordered=False)
+            self.report["inserted"] += len(result.inserted_ids)
+        except BulkWriteError as e:
+            write_errors = e.details.get("writeErrors", [])
+            self.report["inserted"] += e.details.get("nInserted", 0)
+            for error in write_errors:
+                self._error(batch[error["index"]][0], error.get("errmsg", "Ошибка записи"))
+
+    async def finish(self) -> Dict[str, Any]:
+        try:
+            await self.flush()
+        except Exception as e:
+            self.report["aborted"] = self.report["aborted"] or f"Ошибка записи: {e}"
+        finally:
+            if self.report["inserted"] and not self.dry_run:
+                # Один сброс списков и каталога на весь импорт, в том числе прерванный
+                await cache.invalidate_quiz_lists()
+        return self.report
+
+
+async def import_quizzes(db, chunks: AsyncIterator[bytes], batch_size: int = IMPORT_BATCH_SIZE,
+                         dry_run: bool = False) -> Dict[str, Any]:
+    """Импортировать поток квизов; отчет {received, inserted, failed, errors, aborted, duration_ms}"""
+    started = time.perf_counter()
+    importer = QuizImporter(db, batch_size, dry_run)
+    try:
+        async for index, record, parse_error in iter_records(chunks):
+            await importer.add(index, record, parse_error)
+    except ImportFormatError as e:
+        # Записанное до ошибки остается; отчет говорит, где поток оборвался
+        importer.report["aborted"] = str(e)
+    except Exception as e:
+        # Ошибка MongoDB или обрыв потока: записанные пачки остаются, отчет частичный
+        importer.report["aborted"] = f"Ошибка импорта: {e}"
+    report = await importer.finish()
+    report["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return report
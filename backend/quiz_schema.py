@@ -0,0 +1,44 @@
+"""
+Каноническая форма вопросов квиза, приводимая при записи
+
+Квизы от администраторов хранят текст вопроса в "text", сгенерированные GPT
+(generate_quiz_with_gpt) - в "question". Раньше get_quiz выравнивал их при
+каждом чтении; теперь форма приводится один раз при записи (create_quiz,
+update_quiz, загрузка документа, миграция normalize_questions), а чтение
+отдает документ как есть.
+
+Канонический вопрос:
+    text            - текст вопроса (источник истины)
+    question        - копия text для клиентов, читающих старое поле
+    options         - варианты ответа (строки)
+    correct_answer  - индекс правильного варианта
+Прочие поля (_id, explanation, ...) сохраняются без изменений.
+"""
+from typing import Any, Dict, List
+from pydantic import ValidationError
+from .models import QuizQuestion
+
+
+class QuestionSchemaError(ValueError):
+    """Вопрос нельзя привести к канонической форме"""
+
+
+def normalize_question(question: Dict[str, Any], index: int = 0) -> Dict[str, Any]:
+    """Вопрос в канонической форме (повторное применение ничего не меняет)"""
+    if not isinstance(question, dict):
+        raise QuestionSchemaError(f"Вопрос {index + 1}: ожидается объект")
+    text = question.get("text") or question.get("question")
+    try:
+        canonical = QuizQuestion.model_validate({**question, "text": text}).model_dump()
+    except ValidationError as e:
+        errors = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+        raise QuestionSchemaError(f"Вопрос {index + 1}: {errors}") from e
+    if not 0 <= canonical["correct_answer"] < len(canonical["options"]):
+        raise QuestionSchemaError(f"Вопрос {index + 1}: correct_answer вне списка вариантов")
+    canonical["question"] = canonical["text"]
+    return canonical
+
+
+def normalize_questions(questions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Все вопросы квиза в канонической форме; первая ошибка - QuestionSchemaError"""
+    return [normalize_question(question, index) for index, question in enumerate(questions or [])]
@@ -0,0 +1,92 @@
+"""
+Неизменяемые версии квизов, адресуемые хешем содержимого
+
+Каждое изменение квиза порождает документ quiz_versions с _id = хеш
+содержимого (quiz_id + название, описание, категория, сложность, время,
+вопросы). Квиз хранит указатель version_id на текущую версию, попытки -
+версию, с которой начаты, и оцениваются по ней, даже если квиз правили во
+время прохождения.
+
+Версия по определению не меняется: в Redis и у клиентов она кэшируется без
+инвалидации (Cache-Control: immutable), сбрасывать при правке нужно только
+маленький указатель - сам квиз (тег quiz:{id}).
+
+Квизы, созданные до появления версий, получают версию при первой попытке
+(current_version).
+"""
+import hashlib
+import json
+from datetime import datetime
+from typing import Any, Dict, Optional
+from pymongo.errors import DuplicateKeyError
+from .redis_cache import cache
+
+VERSION_FIELDS = ("title", "description", "category", "difficulty", "time_limit", "questions")
+# Год - максимум, который понимают браузеры и CDN
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def quiz_content(quiz: Dict[str, Any]) -> Dict[str, Any]:
+    """Поля квиза, входящие в версию"""
+    return {field: quiz.get(field) for field in VERSION_FIELDS}
+
+
+def version_id_for(quiz_id: str, content: Dict[str, Any]) -> str:
+    """Хеш канонического JSON содержимого: одинаковое содержимое - одна версия"""
+    canonical = json.dumps({"quiz_id": quiz_id, **content}, sort_keys=True, default=str,
+                           ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:32]
+
+
+def build_version(quiz: Dict[str, Any]) -> Dict[str, Any]:
+    """Документ quiz_versions для текущего содержимого квиза (без записи)"""
+    quiz_id = str(quiz["_id"])
+    content = quiz_content(quiz)
+    return {
+        "_id": version_id_for(quiz_id, content),
+        "quiz_id": quiz_id,
+        **content,
+        "created_at": datetime.utcnow()
+    }
+
+
+async def publish_version(db, quiz: Dict[str, Any]) -> str:
+    """Сохранить версию содержимого квиза (повторная запись той же версии - no-op)"""
+    version = build_version(quiz)
+    try:
+        await db.quiz_versions.insert_one(version)
+    except DuplicateKeyError:
+        pass
+    return version["_id"]
+
+
+async def stamp_current_version(db, quiz: Dict[str, Any]) -> str:
+    """
+    Сохранить версию и перевести на нее указатель квиза. Условие на updated_at
+    не дает перезаписать указатель, если квиз успели изменить еще раз
+    """
+    version_id = await publish_version(db, quiz)
+    await db.quizzes.update_one(
+        {"_id": quiz["_id"], "updated_at": quiz.get("updated_at")},
+        {"$set": {"version_id": version_id}}
+    )
+    quiz["version_id"] = version_id
+    return version_id
+
+
+async def current_version(db, quiz: Dict[str, Any]) -> str:
+    """Текущая версия квиза; у старых квизов без версии она создается сейчас"""
+    if quiz.get("version_id"):
+        return quiz["version_id"]
+    version_id = await stamp_current_version(db, quiz)
+    # В закэшированном квизе еще нет указателя
+    await cache.bump(f"quiz:{quiz['_id']}")
+    return version_id
+
+
+async def get_version(db, version_id: str) -> Optional[Dict[str, Any]]:
+    """Версия из кэша (без инвалидации - она неизменна) или из MongoDB"""
+    async def load_version():
+        return await db.quiz_versions.find_one({"_id": version_id})
+
+    return await cache.get_or_load_quiz_version(version_id, load_version)
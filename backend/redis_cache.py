@@ -1,73 +1,743 @@
 import redis.asyncio as redis
-import json
 import os
-from typing import Optional, Dict, Any, List
-from datetime import timedelta
+from typing import Optional, Dict, Any, List, Callable, Awaitable
+from datetime import datetime, timedelta
 import asyncio
+import contextvars
+import hashlib
+import json
+import time
+import uuid
+from .local_cache import LocalTTLCache
+from .cache_codec import CacheCodec, CacheCodecError
+from .circuit_breaker import CircuitBreaker
+
+# Канал pub/sub, через который воркеры сообщают друг другу об инвалидации L1
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+# L1 (in-process) кэш перед Redis: включение, размер и TTL по пространствам имен
+CACHE_L1_ENABLED = os.getenv("CACHE_L1_ENABLED", "true").lower() in ("1", "true", "yes")
+CACHE_L1_MAX_ENTRIES = int(os.getenv("CACHE_L1_MAX_ENTRIES", "5000"))
+# Пространства имен без TTL (сессии, результаты) в L1 не попадают
+DEFAULT_L1_TTLS = {
+    "quiz": 60,
+    "quizzes": 30,
+    "quiz_stats": 30,
+    "user": 15,
+    "leaderboard": 10,
+    "resp": 30,
+    "quiz_version": 300,
+}
+
+# Пул соединений и таймауты: при деградации Redis операция должна быстро сдаться
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "0.25"))
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "0.5"))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30"))
+# Circuit breaker: N ошибок за окно (секунды) открывают его, через reset - пробный PING
+REDIS_BREAKER_FAILURES = int(os.getenv("REDIS_BREAKER_FAILURES", "5"))
+REDIS_BREAKER_WINDOW = float(os.getenv("REDIS_BREAKER_WINDOW", "10"))
+REDIS_BREAKER_RESET = float(os.getenv("REDIS_BREAKER_RESET", "5"))
+# Как часто фоновая задача проверяет/переподключает Redis (секунды)
+REDIS_RECONNECT_INTERVAL = float(os.getenv("REDIS_RECONNECT_INTERVAL", "1"))
+
+# Локальная копия счетчиков поколений (секунды); сбрасывается по pub/sub при bump
+CACHE_GEN_LOCAL_TTL = float(os.getenv("CACHE_GEN_LOCAL_TTL", "5"))
+# Single-flight: время жизни межворкерной блокировки загрузки и ожидание чужой загрузки (секунды)
+CACHE_LOCK_TTL = float(os.getenv("CACHE_LOCK_TTL", "5"))
+CACHE_LOCK_WAIT = float(os.getenv("CACHE_LOCK_WAIT", "2"))
+# Устаревшая копия живет дольше основной в STALE_TTL_FACTOR раз и отдается ждущим
+STALE_TTL_FACTOR = int(os.getenv("CACHE_STALE_TTL_FACTOR", "4"))
+LOCK_POLL_INTERVAL = 0.05
+# Сессия живет SESSION_TTL секунд с последнего обращения (скользящий срок)
+SESSION_TTL = int(os.getenv("SESSION_TTL", "1800"))
+# Числовые поля хеша сессии (в Redis все поля - строки)
+SESSION_INT_FIELDS = ("quiz_points", "gen")
+
+# Снять блокировку, только если она все еще наша
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+# Ошибки, означающие недоступность Redis (только они открывают выключатель)
+_CONNECTIVITY_ERRORS = (redis.ConnectionError, redis.TimeoutError, asyncio.TimeoutError, OSError)
+
+# Значение в Redis есть, но этот узел не может его декодировать
+_UNREADABLE = object()
+
+
+def _parse_l1_ttls(raw: str) -> Dict[str, float]:
+    """CACHE_L1_TTLS="quiz=60,quizzes=30" поверх значений по умолчанию"""
+    ttls = dict(DEFAULT_L1_TTLS)
+    for item in raw.split(","):
+        if "=" in item:
+            namespace, ttl = item.split("=", 1)
+            ttls[namespace.strip()] = float(ttl)
+    return ttls
+
+
+def _namespace(key: str) -> str:
+    return key.split(":", 1)[0]
+
+
+def _decode_str(value: Any) -> Any:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def _session_fields(data: Dict[str, Any]) -> Dict[str, str]:
+    """Поля сессии -> строки для HSET (datetime - ISO, None пропускается)"""
+    return {
+        name: value.isoformat() if isinstance(value, datetime) else str(value)
+        for name, value in data.items() if value is not None
+    }
+
+
+def _decode_session_value(name: str, value: Any) -> Any:
+    value = _decode_str(value)
+    if name in SESSION_INT_FIELDS:
+        try:
+            return int(value)
+        except ValueError:
+            return 0
+    return value
+
 
 class RedisCache:
     """Redis кэш для образовательной платформы"""
     
     def __init__(self):
         self.redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
-        self.redis_client: Optional[redis.Redis] = None
+        self._client: Optional[redis.Redis] = None
+        self.breaker = CircuitBreaker(REDIS_BREAKER_FAILURES, REDIS_BREAKER_WINDOW, REDIS_BREAKER_RESET)
+        self._supervisor_task: Optional[asyncio.Task] = None
+        self.l1_enabled = CACHE_L1_ENABLED
+        self.l1_ttls = _parse_l1_ttls(os.getenv("CACHE_L1_TTLS", ""))
+        self.l1 = LocalTTLCache(max_entries=CACHE_L1_MAX_ENTRIES)
+        self.codec = CacheCodec()
+        self._generations = LocalTTLCache(max_entries=CACHE_L1_MAX_ENTRIES, default_ttl=CACHE_GEN_LOCAL_TTL)
+        self.stats = {"redis_hits": 0, "redis_misses": 0, "redis_errors": 0, "invalidations_received": 0,
+                      "loads": 0, "coalesced": 0, "lock_waits": 0, "stale_served": 0,
+                      "generation_misses": 0, "background_refreshes": 0, "decode_errors": 0}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._refreshing = set()
+        self._background_tasks = set()
+        self._invalidation_listeners: List[Callable[[str], None]] = []
+        self._pubsub = None
+        self._pubsub_task: Optional[asyncio.Task] = None
+        # Инвалидации, не дошедшие до Redis (выключатель открыт или ошибка):
+        # повторяются до закрытия выключателя, иначе старые записи снова станут актуальными
+        self._pending_tags = set()
+        self._pending_keys = set()
+    
+    @property
+    def redis_client(self) -> Optional[redis.Redis]:
+        """
+        Клиент Redis, пока выключатель закрыт. При открытом выключателе None:
+        все операции сразу идут мимо Redis, как будто кэш не настроен
+        """
+        if self._client is not None and self.breaker.is_closed:
+            return self._client
+        return None
+    
+    @redis_client.setter
+    def redis_client(self, client: Optional[redis.Redis]):
+        self._client = client
+    
+    def _record_failure(self, error: Optional[BaseException] = None):
+        """
+        Учесть ошибку Redis. Выключатель считает только недоступность (соединение,
+        таймаут): ошибка данных или команды (WRONGTYPE, нечитаемое значение) не
+        повод отключать Redis для всего трафика
+        """
+        self.stats["redis_errors"] += 1
+        if error is not None and not isinstance(error, _CONNECTIVITY_ERRORS):
+            return
+        was_closed = self.breaker.is_closed
+        self.breaker.record_failure()
+        if was_closed and not self.breaker.is_closed:
+            print(f"⚠️ Redis: выключатель открыт, кэш в обход на {self.breaker.reset_timeout:.0f} с")
+    
+    def report_failure(self, error: Optional[BaseException] = None):
+        """Ошибка Redis в коде вне RedisCache (например, рейтинги) - учитывается выключателем"""
+        self._record_failure(error)
+    
+    def _create_client(self) -> redis.Redis:
+        pool = redis.ConnectionPool.from_url(
+            self.redis_url,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+            health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+            # Значения бинарные (см. cache_codec), декодирование делает кодек
+            decode_responses=False
+        )
+        return redis.Redis(connection_pool=pool)
     
     async def connect(self):
-        """Подключение к Redis"""
-        try:
-            self.redis_client = redis.from_url(
-                self.redis_url,
-                encoding="utf-8",
-                decode_responses=True
-            )
-            # Проверяем соединение
-            await self.redis_client.ping()
+        """Подключение к Redis; при неудаче фоновая задача продолжает попытки"""
+        if await self._try_connect():
             print("✅ Redis подключен успешно")
+        else:
+            print("⚠️ Redis недоступен, работаем без кэширования и переподключаемся в фоне")
+        if self._supervisor_task is None:
+            self._supervisor_task = asyncio.create_task(self._supervise())
+    
+    async def _try_connect(self) -> bool:
+        client = self._client or self._create_client()
+        try:
+            await client.ping()
+        except Exception as e:
+            print(f"⚠️ Redis: {e}")
+            if self._client is None:
+                await client.close(close_connection_pool=True)
+            return False
+        if not await self._replay_pending(client):
+            if self._client is None:
+                await client.close(close_connection_pool=True)
+            return False
+        self._client = client
+        self.breaker.record_success()
+        await self._subscribe_invalidations()
+        return True
+    
+    async def _subscribe_invalidations(self):
+        """Подписка на инвалидации от других воркеров"""
+        if self._pubsub is not None:
+            return
+        try:
+            self._pubsub = self._client.pubsub()
+            await self._pubsub.subscribe(INVALIDATION_CHANNEL)
+            self._pubsub_task = asyncio.create_task(self._listen_invalidations())
+        except Exception as e:
+            print(f"⚠️ Подписка на инвалидации недоступна, L1 работает только по TTL: {e}")
+            self._pubsub = None
+    
+    async def _supervise(self):
+        """Фоновая задача: переподключение и пробные PING при открытом выключателе"""
+        while True:
+            await asyncio.sleep(REDIS_RECONNECT_INTERVAL)
+            try:
+                if self._client is None:
+                    if await self._try_connect():
+                        print("✅ Redis подключен (фоновое переподключение)")
+                        self._forget_local_state()
+                elif self.breaker.should_probe():
+                    try:
+                        await self._client.ping()
+                    except Exception:
+                        self.breaker.record_failure()
+                    else:
+                        # Сначала пропущенные инвалидации, потом трафик в Redis
+                        if not await self._replay_pending(self._client):
+                            self.breaker.record_failure()
+                            continue
+                        self.breaker.record_success()
+                        # Пока Redis был недоступен, инвалидации по pub/sub могли потеряться
+                        self._forget_local_state()
+                        print("✅ Redis снова доступен, выключатель закрыт")
+                elif self._pending_tags or self._pending_keys:
+                    # Единичная ошибка без открытия выключателя
+                    await self._replay_pending(self._client)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Ошибка фоновой проверки Redis: {e}")
+    
+    async def _replay_pending(self, client: redis.Redis) -> bool:
+        """Повторить недошедшие INCR/UNLINK напрямую через клиент (выключатель еще может быть открыт)"""
+        tags, keys = list(self._pending_tags), list(self._pending_keys)
+        if not tags and not keys:
+            return True
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                for tag in tags:
+                    pipe.incr(f"gen:{tag}")
+                if keys:
+                    pipe.unlink(*keys, *(f"stale:{key}" for key in keys))
+                pipe.publish(INVALIDATION_CHANNEL, "\n".join([*(f"gen:{tag}" for tag in tags), *keys]))
+                await pipe.execute()
         except Exception as e:
-            print(f"⚠️ Redis недоступен, работаем без кэширования: {e}")
-            self.redis_client = None
+            print(f"⚠️ Redis: не удалось повторить инвалидации ({len(tags)} тегов, {len(keys)} ключей): {e}")
+            return False
+        # Новые инвалидации, пришедшие во время повтора, остаются в очереди
+        self._pending_tags.difference_update(tags)
+        self._pending_keys.difference_update(keys)
+        print(f"🔁 Redis: повторены инвалидации ({len(tags)} тегов, {len(keys)} ключей)")
+        return True
+    
+    def invalidation_pending(self, tag: str) -> bool:
+        """Инвалидация тега еще не подтверждена Redis (данные в Redis по нему могут быть устаревшими)"""
+        return tag in self._pending_tags
+    
+    def _decode_entry(self, key: str, data: bytes) -> Any:
+        """
+        Значение из Redis или _UNREADABLE, если этот узел его не читает (новая
+        версия формата во время выкатки, zstd без zstandard, битые байты).
+        Такое значение - промах: загрузчик перезапишет его понятным форматом
+        """
+        try:
+            return self.codec.decode(data)
+        except (CacheCodecError, ValueError) as e:
+            self.stats["decode_errors"] += 1
+            print(f"⚠️ Нечитаемое значение в кэше {key}: {e}")
+            return _UNREADABLE
+    
+    def _mask_pending(self, tags: List[str], generations: List[int]) -> List[int]:
+        """Поколения тегов с неподтвержденной инвалидацией - -1: в Redis они устарели, запись не актуальна"""
+        if not self._pending_tags:
+            return generations
+        return [-1 if tag in self._pending_tags else generation for tag, generation in zip(tags, generations)]
+    
+    def _forget_local_state(self):
+        self.l1.clear()
+        self._generations.clear()
     
     async def disconnect(self):
         """Отключение от Redis"""
-        if self.redis_client:
-            await self.redis_client.close()
+        for task in (self._supervisor_task, self._pubsub_task):
+            if task:
+                task.cancel()
+        self._supervisor_task = None
+        self._pubsub_task = None
+        if self._pubsub:
+            try:
+                await self._pubsub.close()
+            except Exception:
+                pass
+            self._pubsub = None
+        if self._client:
+            await self._client.close(close_connection_pool=True)
+            self._client = None
+    
+    # === L1 И ИНВАЛИДАЦИЯ ===
     
-    async def get(self, key: str) -> Optional[Any]:
-        """Получить данные из кэша"""
+    def _l1_ttl(self, key: str) -> float:
+        if not self.l1_enabled:
+            return 0
+        return self.l1_ttls.get(_namespace(key), 0)
+    
+    def add_invalidation_listener(self, listener: Callable[[str], None]):
+        """Вызывать listener(key) при любой инвалидации ключа (локальной или от другого воркера)"""
+        self._invalidation_listeners.append(listener)
+    
+    def _evict_local(self, key: str):
+        self.l1.delete(key)
+        if key.startswith("gen:"):
+            self._generations.delete(key[4:])
+        for listener in self._invalidation_listeners:
+            try:
+                listener(key)
+            except Exception as e:
+                print(f"Ошибка обработчика инвалидации {key}: {e}")
+    
+    async def _listen_invalidations(self):
+        """Фоновая задача: вытесняет из L1 ключи, инвалидированные другими воркерами"""
+        while True:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message and message.get("type") == "message":
+                    self.stats["invalidations_received"] += 1
+                    data = message["data"]
+                    # Одно сообщение может содержать несколько ключей через перевод строки
+                    for key in (data.decode("utf-8") if isinstance(data, bytes) else data).split("\n"):
+                        self._evict_local(key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Ошибка подписки на инвалидации: {e}")
+                # Сообщения, пришедшие во время обрыва, потеряны: L1 больше не доверяем
+                self._forget_local_state()
+                await asyncio.sleep(1)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики попаданий по уровням кэша"""
+        redis_lookups = self.stats["redis_hits"] + self.stats["redis_misses"]
+        return {
+            "codec": self.codec.describe(),
+            "l1": {"enabled": self.l1_enabled, **self.l1.stats()},
+            "redis": {
+                "connected": self._client is not None,
+                "pending_invalidations": len(self._pending_tags) + len(self._pending_keys),
+                "breaker": self.breaker.stats(),
+                **self.stats,
+                "hit_ratio": round(self.stats["redis_hits"] / redis_lookups, 4) if redis_lookups else 0.0
+            }
+        }
+    
+    # === БАЗОВЫЕ ОПЕРАЦИИ ===
+    
+    async def get(self, key: str, tags: Optional[List[str]] = None) -> Optional[Any]:
+        """
+        Получить данные из кэша (сначала L1, затем Redis).
+        tags - сущности, от которых зависит запись (см. bump)
+        """
+        if tags is not None:
+            entry, _ = await self._get_entry(key, tags)
+            return entry["v"] if entry else None
+        if key in self._pending_keys:
+            return None
+        
+        l1_ttl = self._l1_ttl(key)
+        if l1_ttl:
+            value = self.l1.get(key)
+            if value is not None:
+                return value
+        
         if not self.redis_client:
             return None
         
         try:
             data = await self.redis_client.get(key)
             if data:
-                return json.loads(data)
+                value = self._decode_entry(key, data)
+                if value is _UNREADABLE:
+                    self.stats["redis_misses"] += 1
+                    return None
+                self.stats["redis_hits"] += 1
+                if l1_ttl:
+                    self.l1.set(key, value, l1_ttl)
+                return value
+            self.stats["redis_misses"] += 1
         except Exception as e:
+            self._record_failure(e)
             print(f"Ошибка чтения из кэша {key}: {e}")
         return None
     
-    async def set(self, key: str, value: Any, ttl: int = 3600):
-        """Сохранить данные в кэш"""
+    async def set(self, key: str, value: Any, ttl: int = 3600, tags: Optional[List[str]] = None,
+                  generations: Optional[List[int]] = None, soft_ttl: Optional[int] = None):
+        """
+        Сохранить данные в кэш. С tags запись запоминает поколения сущностей
+        (generations - прочитанные до загрузки данных, иначе текущие).
+        soft_ttl - через сколько секунд запись нужно обновить в фоне (ttl - жесткий срок)
+        """
+        if tags is not None or soft_ttl:
+            tags = tags or []
+            if generations is None:
+                generations = await self.current_generations(tags)
+            value = {"g": generations, "v": value}
+            if soft_ttl:
+                # Время по часам, а не monotonic: его сравнивают все воркеры
+                value["r"] = time.time() + soft_ttl
+        serialized = self.codec.encode(value)
+        l1_ttl = self._l1_ttl(key)
+        if l1_ttl:
+            # В L1 кладем то же, что вернет Redis, а не ссылку на объект вызывающего
+            self.l1.set(key, self.codec.decode(serialized), min(l1_ttl, ttl))
+        
         if not self.redis_client:
             return False
         
         try:
-            serialized = json.dumps(value, default=str)
             await self.redis_client.set(key, serialized, ex=ttl)
             return True
         except Exception as e:
+            self._record_failure(e)
             print(f"Ошибка записи в кэш {key}: {e}")
             return False
     
     async def delete(self, key: str):
-        """Удалить ключ из кэша"""
+        """Удалить ключ из кэша (и из L1 всех воркеров)"""
+        return await self.delete_many([key])
+    
+    # === ИНВАЛИДАЦИЯ ПО ПОКОЛЕНИЯМ ===
+    #
+    # У каждой сущности (тега) есть счетчик gen:{tag}. Запись с тегами хранит
+    # поколения тегов на момент загрузки и считается промахом, если хоть один
+    # счетчик с тех пор увеличился. Инвалидация - один INCR, без поиска ключей.
+    
+    async def current_generations(self, tags: List[str]) -> List[int]:
+        """Текущие поколения тегов (локальная копия, иначе один MGET)"""
+        if not tags:
+            return []
+        generations = [self._generations.get(tag) for tag in tags]
+        missing = [tag for tag, generation in zip(tags, generations) if generation is None]
+        if not missing:
+            return generations
+        
+        fetched = {tag: 0 for tag in missing}
+        if self.redis_client:
+            try:
+                values = await self.redis_client.mget([f"gen:{tag}" for tag in missing])
+                fetched = dict(zip(missing, self._mask_pending(missing, [int(value or 0) for value in values])))
+            except Exception as e:
+                self._record_failure(e)
+                print(f"Ошибка чтения поколений {missing}: {e}")
+                return [-1] * len(tags)  # такую запись никто не сочтет актуальной
+        self._remember_generations(fetched)
+        return [fetched[tag] if generation is None else generation for tag, generation in zip(tags, generations)]
+    
+    def _remember_generations(self, generations: Dict[str, int]):
+        # Без Redis локальные счетчики - единственный источник, им нельзя истекать
+        ttl = None if self.redis_client else float("inf")
+        for tag, generation in generations.items():
+            self._generations.set(tag, generation, ttl)
+    
+    async def bump(self, *tags: str) -> bool:
+        """
+        Инвалидировать все записи, зависящие от тегов. False - Redis инвалидацию
+        не подтвердил, она повторится при восстановлении (см. _replay_pending)
+        """
+        if not tags:
+            return True
+        if not self.redis_client:
+            self._pending_tags.update(tags)
+            self._remember_generations({tag: (self._generations.get(tag) or 0) + 1 for tag in tags})
+            return False
+        
+        for tag in tags:
+            self._evict_local(f"gen:{tag}")
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for tag in tags:
+                    pipe.incr(f"gen:{tag}")
+                pipe.publish(INVALIDATION_CHANNEL, "\n".join(f"gen:{tag}" for tag in tags))
+                results = await pipe.execute()
+            self._remember_generations(dict(zip(tags, results[:len(tags)])))
+            return True
+        except Exception as e:
+            self._record_failure(e)
+            self._pending_tags.update(tags)
+            print(f"Ошибка увеличения поколений {tags}: {e}")
+            return False
+    
+    async def _get_entry(self, key: str, tags: List[str]):
+        """(конверт {"g", "v", "r"}, поколения) - конверт None, если записи нет или она устарела"""
+        l1_ttl = self._l1_ttl(key)
+        local_generations = [self._generations.get(tag) for tag in tags]
+        if l1_ttl and None not in local_generations:
+            entry = self.l1.get(key)
+            if entry is not None and entry["g"] == local_generations:
+                return entry, local_generations
+        
+        if not self.redis_client:
+            return None, await self.current_generations(tags)
+        
+        try:
+            # Запись и счетчики поколений одним round trip
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.get(key)
+                if tags:
+                    pipe.mget([f"gen:{tag}" for tag in tags])
+                data, *rest = await pipe.execute()
+            values = rest[0] if tags else []
+        except Exception as e:
+            self._record_failure(e)
+            print(f"Ошибка чтения из кэша {key}: {e}")
+            return None, [-1] * len(tags)
+        
+        generations = self._mask_pending(tags, [int(value or 0) for value in values])
+        self._remember_generations(dict(zip(tags, generations)))
+        if not data:
+            self.stats["redis_misses"] += 1
+            return None, generations
+        
+        entry = self._decode_entry(key, data)
+        if not isinstance(entry, dict) or entry.get("g") != generations:
+            self.stats["generation_misses"] += 1
+            return None, generations
+        self.stats["redis_hits"] += 1
+        if l1_ttl:
+            self.l1.set(key, entry, l1_ttl)
+        return entry, generations
+    
+    async def get_many_tagged(self, tags_by_key: Dict[str, List[str]]) -> Dict[str, Any]:
+        """Пакетный get для записей с тегами: записи и все счетчики одним pipeline"""
+        if not tags_by_key:
+            return {}
+        if not self.redis_client:
+            found = {}
+            for key, tags in tags_by_key.items():
+                entry, _ = await self._get_entry(key, tags)
+                if entry is not None:
+                    found[key] = entry["v"]
+            return found
+        
+        keys = list(tags_by_key)
+        all_tags = sorted({tag for tags in tags_by_key.values() for tag in tags})
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.mget(keys)
+                pipe.mget([f"gen:{tag}" for tag in all_tags])
+                values, raw_generations = await pipe.execute()
+        except Exception as e:
+            self._record_failure(e)
+            print(f"Ошибка пакетного чтения из кэша ({len(keys)} ключей): {e}")
+            return {}
+        
+        generation_by_tag = dict(zip(all_tags, self._mask_pending(all_tags, [int(value or 0) for value in raw_generations])))
+        self._remember_generations(generation_by_tag)
+        found = {}
+        for key, data in zip(keys, values):
+            if not data:
+                self.stats["redis_misses"] += 1
+                continue
+            entry = self._decode_entry(key, data)
+            if not isinstance(entry, dict) or entry.get("g") != [generation_by_tag[tag] for tag in tags_by_key[key]]:
+                self.stats["generation_misses"] += 1
+                continue
+            self.stats["redis_hits"] += 1
+            found[key] = entry["v"]
+        return found
+    
+    # === СЫРЫЕ БАЙТЫ (готовые ответы, см. response_cache) ===
+    #
+    # Без кодека: значение - "поколения через запятую\n" + байты как есть
+    
+    async def get_raw(self, key: str, tags: List[str]):
+        """(байты, поколения) - байты None, если записи нет или она устарела"""
+        l1_ttl = self._l1_ttl(key)
+        local_generations = [self._generations.get(tag) for tag in tags]
+        if l1_ttl and None not in local_generations:
+            entry = self.l1.get(key)
+            if entry is not None and entry[0] == local_generations:
+                return entry[1], local_generations
+        
+        if not self.redis_client:
+            return None, await self.current_generations(tags)
+        
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.get(key)
+                if tags:
+                    pipe.mget([f"gen:{tag}" for tag in tags])
+                raw, *rest = await pipe.execute()
+        except Exception as e:
+            self._record_failure(e)
+            print(f"Ошибка чтения из кэша {key}: {e}")
+            return None, [-1] * len(tags)
+        
+        generations = self._mask_pending(tags, [int(value or 0) for value in (rest[0] if tags else [])])
+        self._remember_generations(dict(zip(tags, generations)))
+        if not raw:
+            self.stats["redis_misses"] += 1
+            return None, generations
+        
+        stored_generations, _, data = raw.partition(b"\n")
+        if stored_generations.decode("ascii") != ",".join(map(str, generations)):
+            self.stats["generation_misses"] += 1
+            return None, generations
+        self.stats["redis_hits"] += 1
+        if l1_ttl:
+            self.l1.set(key, (generations, data), l1_ttl)
+        return data, generations
+    
+    async def set_raw(self, key: str, data: bytes, ttl: int, tags: List[str], generations: List[int]):
+        """Сохранить байты с поколениями тегов, прочитанными до построения данных"""
+        l1_ttl = self._l1_ttl(key)
+        if l1_ttl:
+            self.l1.set(key, (generations, data), min(l1_ttl, ttl))
+        if not self.redis_client:
+            return False
+        try:
+            await self.redis_client.set(key, ",".join(map(str, generations)).encode("ascii") + b"\n" + data, ex=ttl)
+            return True
+        except Exception as e:
+            self._record_failure(e)
+            print(f"Ошибка записи в кэш {key}: {e}")
+            return False
+    
+    async def _lookup(self, key: str, tags: Optional[List[str]]):
+        """(значение, поколения, время фонового обновления)"""
+        if tags is None:
+            return await self.get(key), None, None
+        entry, generations = await self._get_entry(key, tags)
+        if entry is None:
+            return None, generations, None
+        return entry["v"], generations, entry.get("r")
+    
+    # === ПАКЕТНЫЕ ОПЕРАЦИИ (один round trip) ===
+    
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """Получить несколько ключей: L1, затем один MGET. Промахи в результат не попадают"""
+        found: Dict[str, Any] = {}
+        remote_keys = []
+        for key in keys:
+            if key in self._pending_keys:
+                continue
+            value = self.l1.get(key) if self._l1_ttl(key) else None
+            if value is not None:
+                found[key] = value
+            else:
+                remote_keys.append(key)
+        
+        if not remote_keys or not self.redis_client:
+            return found
+        
+        try:
+            values = await self.redis_client.mget(remote_keys)
+        except Exception as e:
+            self._record_failure(e)
+            print(f"Ошибка пакетного чтения из кэша ({len(remote_keys)} ключей): {e}")
+            return found
+        
+        for key, data in zip(remote_keys, values):
+            if not data:
+                self.stats["redis_misses"] += 1
+                continue
+            value = self._decode_entry(key, data)
+            if value is _UNREADABLE:
+                self.stats["redis_misses"] += 1
+                continue
+            self.stats["redis_hits"] += 1
+            found[key] = value
+            l1_ttl = self._l1_ttl(key)
+            if l1_ttl:
+                self.l1.set(key, value, l1_ttl)
+        return found
+    
+    async def set_many(self, items: Dict[str, Any], ttl: int = 3600):
+        """Сохранить несколько ключей одним pipeline (у каждого свой TTL на сервере)"""
+        if not items:
+            return True
+        encoded = {}
+        for key, value in items.items():
+            encoded[key] = self.codec.encode(value)
+            l1_ttl = self._l1_ttl(key)
+            if l1_ttl:
+                self.l1.set(key, self.codec.decode(encoded[key]), min(l1_ttl, ttl))
+        
+        if not self.redis_client:
+            return False
+        
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for key, data in encoded.items():
+                    pipe.set(key, data, ex=ttl)
+                await pipe.execute()
+            return True
+        except Exception as e:
+            self._record_failure(e)
+            print(f"Ошибка пакетной записи в кэш ({len(items)} ключей): {e}")
+            return False
+    
+    async def delete_many(self, keys: List[str]):
+        """
+        Удалить несколько ключей (вместе с их устаревшими копиями) одним UNLINK
+        и разослать одну инвалидацию L1 на все ключи
+        """
+        if not keys:
+            return True
+        for key in keys:
+            self._evict_local(key)
         if not self.redis_client:
+            self._pending_keys.update(keys)
             return False
         
         try:
-            await self.redis_client.delete(key)
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                # UNLINK освобождает память в фоне и не блокирует Redis на больших значениях
+                pipe.unlink(*keys, *(f"stale:{key}" for key in keys))
+                pipe.publish(INVALIDATION_CHANNEL, "\n".join(keys))
+                await pipe.execute()
             return True
         except Exception as e:
-            print(f"Ошибка удаления из кэша {key}: {e}")
+            self._record_failure(e)
+            self._pending_keys.update(keys)
+            print(f"Ошибка удаления из кэша {keys}: {e}")
             return False
     
     async def exists(self, key: str) -> bool:
@@ -78,20 +748,287 @@ class RedisCache:
         try:
             return await self.redis_client.exists(key) > 0
         except Exception as e:
+            self._record_failure(e)
             print(f"Ошибка проверки ключа {key}: {e}")
             return False
 
+    # === READ-THROUGH С ЗАЩИТОЙ ОТ STAMPEDE ===
+    
+    async def get_or_load(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Optional[Any]]],
+        ttl: int = 3600,
+        tags: Optional[List[str]] = None,
+        soft_ttl: Optional[int] = None
+    ) -> Optional[Any]:
+        """
+        Вернуть значение из кэша или загрузить его ровно одним загрузчиком.
+        Одновременные промахи в воркере ждут одну задачу, между воркерами
+        загрузку сериализует короткая блокировка lock:{key} в Redis.
+        Загрузчик, вернувший None, ничего не кэширует.
+        
+        stale-while-revalidate: после soft_ttl значение по-прежнему отдается
+        сразу, а обновление выполняется в фоне (одно на все воркеры); блокирует
+        запрос только промах после жесткого ttl.
+        """
+        if soft_ttl and tags is None:
+            tags = []
+        value, generations, refresh_at = await self._lookup(key, tags)
+        if value is not None:
+            if refresh_at and time.time() >= refresh_at:
+                self._schedule_refresh(key, loader, ttl, tags, soft_ttl)
+            return value
+        
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.stats["coalesced"] += 1
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # Запрос-загрузчик отменили - грузим сами
+                return await self.get_or_load(key, loader, ttl, tags, soft_ttl)
+        
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await self._load_single_flight(key, loader, ttl, tags, generations, soft_ttl)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Исключение получат ждущие; чтобы не было предупреждения, если их нет
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+    
+    async def _acquire_lock(self, key: str):
+        """Токен межворкерной блокировки lock:{key}; None - занята. Без Redis блокировать нечего"""
+        if not self.redis_client:
+            return ""
+        token = uuid.uuid4().hex
+        try:
+            acquired = await self.redis_client.set(f"lock:{key}", token, nx=True, px=int(CACHE_LOCK_TTL * 1000))
+        except Exception as e:
+            self._record_failure(e)
+            print(f"Ошибка блокировки lock:{key}: {e}")
+            return ""
+        return token if acquired else None
+    
+    async def _release_lock(self, key: str, token: str):
+        if not token:
+            return
+        try:
+            await self.redis_client.eval(_RELEASE_LOCK_SCRIPT, 1, f"lock:{key}", token)
+        except Exception as e:
+            self._record_failure(e)
+            print(f"Ошибка снятия блокировки lock:{key}: {e}")
+    
+    def _schedule_refresh(self, key: str, loader, ttl: int, tags, soft_ttl):
+        """Запустить фоновое обновление, если в этом воркере оно еще не идет"""
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+        # Пустой контекст: команды MongoDB фонового обновления не попадают в метрики запроса
+        task = contextvars.Context().run(
+            asyncio.ensure_future, self._refresh(key, loader, ttl, tags, soft_ttl)
+        )
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+    
+    async def _refresh(self, key: str, loader, ttl: int, tags, soft_ttl):
+        try:
+            token = await self._acquire_lock(key)
+            if token is None:
+                return  # обновляет другой воркер
+            try:
+                # Поколения читаем до загрузки: запись, пересекшаяся с bump, сразу станет промахом
+                generations = await self.current_generations(tags)
+                await self._load_and_store(key, loader, ttl, tags, generations, soft_ttl)
+                self.stats["background_refreshes"] += 1
+            finally:
+                await self._release_lock(key, token)
+        except Exception as e:
+            print(f"Ошибка фонового обновления {key}: {e}")
+        finally:
+            self._refreshing.discard(key)
+    
+    async def _load_single_flight(self, key: str, loader, ttl: int, tags, generations, soft_ttl) -> Optional[Any]:
+        if not self.redis_client:
+            return await self._load_and_store(key, loader, ttl, tags, generations, soft_ttl)
+        
+        token = await self._acquire_lock(key)
+        if token is not None:
+            try:
+                return await self._load_and_store(key, loader, ttl, tags, generations, soft_ttl)
+            finally:
+                await self._release_lock(key, token)
+        
+        # Загружает другой воркер: ждем его результат, по таймауту отдаем устаревшую копию
+        self.stats["lock_waits"] += 1
+        deadline = time.monotonic() + CACHE_LOCK_WAIT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+            value, _, _ = await self._lookup(key, tags)
+            if value is not None:
+                return value
+        
+        stale = await self._get_stale(key, generations)
+        if stale is not None:
+            self.stats["stale_served"] += 1
+            return stale
+        return await self._load_and_store(key, loader, ttl, tags, generations, soft_ttl)
+    
+    async def _load_and_store(self, key: str, loader, ttl: int, tags=None, generations=None,
+                              soft_ttl=None) -> Optional[Any]:
+        self.stats["loads"] += 1
+        value = await loader()
+        if value is not None:
+            await self.set(key, value, ttl, tags, generations, soft_ttl)
+            if self.redis_client:
+                stale = {"g": generations, "v": value} if tags is not None else value
+                try:
+                    await self.redis_client.set(f"stale:{key}", self.codec.encode(stale),
+                                                ex=ttl * STALE_TTL_FACTOR)
+                except Exception as e:
+                    self._record_failure(e)
+                    print(f"Ошибка записи устаревшей копии {key}: {e}")
+        return value
+    
+    async def _get_stale(self, key: str, generations: Optional[List[int]] = None) -> Optional[Any]:
+        """Устаревшая по TTL копия; для записей с тегами - только того же поколения"""
+        try:
+            data = await self.redis_client.get(f"stale:{key}")
+            if not data:
+                return None
+            stale = self._decode_entry(f"stale:{key}", data)
+            if stale is _UNREADABLE:
+                return None
+            if generations is None:
+                return stale
+            return stale["v"] if isinstance(stale, dict) and stale.get("g") == generations else None
+        except Exception as e:
+            self._record_failure(e)
+            print(f"Ошибка чтения устаревшей копии {key}: {e}")
+            return None
+    
     # === МЕТОДЫ ДЛЯ СЕССИЙ ===
     
-    async def save_session(self, user_id: str, session_data: Dict[str, Any], ttl: int = 1800):
-        """Сохранить пользовательскую сессию (30 минут)"""
+    # Сессия - хеш session:{id}: поля читаются и обновляются по отдельности
+    # (HMGET / HSET / HINCRBY), каждое обращение продлевает TTL (скользящий срок).
+    # Хеш без id/login (например, HINCRBY после истечения сессии) читатели
+    # считают отсутствующей сессией и пересоздают ее из MongoDB.
+    
+    async def save_session(self, user_id: str, session_data: Dict[str, Any], ttl: int = SESSION_TTL):
+        """Сохранить сессию целиком (DEL + HSET + EXPIRE в одной транзакции)"""
+        if not self.redis_client:
+            return False
+        key = f"session:{user_id}"
+        try:
+            async with self.redis_client.pipeline(transaction=True) as pipe:
+                pipe.delete(key)
+                pipe.hset(key, mapping=_session_fields(session_data))
+                pipe.expire(key, ttl)
+                await pipe.execute()
+            return True
+        except Exception as e:
+            self._record_failure(e)
+            print(f"Ошибка сохранения сессии {user_id}: {e}")
+            return False
+    
+    async def get_session(self, user_id: str, fields: Optional[List[str]] = None,
+                          touch: bool = False, ttl: int = SESSION_TTL,
+                          tag: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Поля сессии (все или только fields). touch=True в том же round trip
+        обновляет last_activity и продлевает TTL. С tag сессия действительна,
+        только если ее поле gen равно текущему поколению тега: инвалидация
+        через bump (в т.ч. повторенная после сбоя Redis) отменяет ее, даже
+        если удалить сам хеш не удалось
+        """
+        if not self.redis_client:
+            return None
+        if tag is not None and tag in self._pending_tags:
+            return None
+        key = f"session:{user_id}"
+        if fields and tag is not None:
+            fields = [*fields, "gen"]
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                if fields:
+                    pipe.hmget(key, fields)
+                else:
+                    pipe.hgetall(key)
+                if tag is not None:
+                    pipe.get(f"gen:{tag}")
+                if touch:
+                    # EXPIRE на отсутствующем ключе - no-op; HSET создаст неполный хеш без id/login
+                    pipe.hset(key, "last_activity", datetime.now().isoformat())
+                    pipe.expire(key, ttl)
+                results = await pipe.execute()
+        except redis.ResponseError as e:
+            if "WRONGTYPE" not in str(e):
+                raise
+            # Сессия в старом формате (JSON-строка): удаляем, она будет пересоздана
+            await self.delete(key)
+            return None
+        except Exception as e:
+            self._record_failure(e)
+            print(f"Ошибка чтения сессии {user_id}: {e}")
+            return None
+        
+        raw = dict(zip(fields, results[0])) if fields else results[0]
+        session = {
+            _decode_str(name): _decode_session_value(_decode_str(name), value)
+            for name, value in raw.items() if value is not None
+        }
+        if tag is not None and session.pop("gen", None) != int(results[1] or 0):
+            # Сессия старше последней инвалидации (или без поколения) - как отсутствующая
+            return None
+        return session or None
+    
+    async def touch_session(self, user_id: str, ttl: int = SESSION_TTL, **fields: Any):
+        """Обновить last_activity (и другие поля) и продлить сессию одним pipeline"""
+        if not self.redis_client:
+            return False
         key = f"session:{user_id}"
-        return await self.set(key, session_data, ttl)
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.hset(key, mapping=_session_fields({**fields, "last_activity": datetime.now().isoformat()}))
+                pipe.expire(key, ttl)
+                await pipe.execute()
+            return True
+        except Exception as e:
+            self._record_failure(e)
+            print(f"Ошибка продления сессии {user_id}: {e}")
+            return False
     
-    async def get_session(self, user_id: str) -> Optional[Dict[str, Any]]:
-        """Получить данные сессии пользователя"""
+    async def incr_session_field(self, user_id: str, field: str, amount: int, ttl: int = SESSION_TTL):
+        """
+        Атомарно увеличить числовое поле сессии (HINCRBY вместо чтения-изменения-записи)
+        и сбросить принципала в памяти всех воркеров
+        """
         key = f"session:{user_id}"
-        return await self.get(key)
+        self._evict_local(key)
+        if not self.redis_client:
+            return None
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.hincrby(key, field, amount)
+                pipe.expire(key, ttl)
+                pipe.publish(INVALIDATION_CHANNEL, key)
+                results = await pipe.execute()
+            return results[0]
+        except Exception as e:
+            self._record_failure(e)
+            print(f"Ошибка изменения {field} в сессии {user_id}: {e}")
+            return None
     
     async def delete_session(self, user_id: str):
         """Удалить сессию пользователя"""
@@ -99,128 +1036,156 @@ class RedisCache:
         return await self.delete(key)
 
     # === МЕТОДЫ ДЛЯ КВИЗОВ ===
+    #
+    # Теги: quiz:{id} - сам квиз, quizzes - любой список квизов,
+    # quiz_results:{id} - результаты по квизу, user:{id} - данные пользователя,
+    # principal:{id} - личность и роль (поколение в сессии, см. get_session),
+    # leaderboard - рейтинги. TTL большие: устаревание снимается через bump.
     
-    async def cache_quiz(self, quiz_id: str, quiz_data: Dict[str, Any], ttl: int = 3600):
-        """Кэшировать данные квиза (1 час)"""
+    async def cache_quiz(self, quiz_id: str, quiz_data: Dict[str, Any], ttl: int = 86400):
+        """Кэшировать данные квиза (24 часа, сбрасывается при изменении квиза)"""
         key = f"quiz:{quiz_id}"
-        return await self.set(key, quiz_data, ttl)
+        return await self.set(key, quiz_data, ttl, tags=[key])
     
     async def get_quiz(self, quiz_id: str) -> Optional[Dict[str, Any]]:
         """Получить квиз из кэша"""
         key = f"quiz:{quiz_id}"
-        return await self.get(key)
+        return await self.get(key, tags=[key])
+    
+    async def get_quizzes_many(self, quiz_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Квизы из кэша за один round trip: {quiz_id: квиз} только для найденных"""
+        found = await self.get_many_tagged({f"quiz:{quiz_id}": [f"quiz:{quiz_id}"] for quiz_id in quiz_ids})
+        return {key.split(":", 1)[1]: value for key, value in found.items()}
+    
+    async def get_or_load_quiz(self, quiz_id: str, loader, ttl: int = 86400,
+                               soft_ttl: int = 3600) -> Optional[Dict[str, Any]]:
+        """Квиз из кэша или из loader(): после часа обновляется в фоне, блокирует только промах"""
+        key = f"quiz:{quiz_id}"
+        return await self.get_or_load(key, loader, ttl, tags=[key], soft_ttl=soft_ttl)
+    
+    async def get_or_load_quiz_version(self, version_id: str, loader, ttl: int = 30 * 86400) -> Optional[Dict[str, Any]]:
+        """Неизменяемая версия квиза: без тегов и инвалидации, вытесняется только по TTL"""
+        return await self.get_or_load(f"quiz_version:{version_id}", loader, ttl)
     
-    async def cache_quizzes_list(self, quizzes: List[Dict[str, Any]], ttl: int = 600):
-        """Кэшировать список всех квизов (10 минут)"""
-        key = "quizzes:all"
-        return await self.set(key, quizzes, ttl)
+    async def get_or_load_quizzes_page(self, scope: str, params: Dict[str, Any], loader,
+                                       ttl: int = 3600) -> Optional[Dict[str, Any]]:
+        """
+        Страница списка квизов {items, next_cursor, etag} из кэша или из loader().
+        scope отделяет разные эндпоинты, params - фильтры, размер страницы и курсор
+        """
+        digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        return await self.get_or_load(f"quizzes:page:{scope}:{digest}", loader, ttl, tags=["quizzes"])
     
-    async def get_quizzes_list(self) -> Optional[List[Dict[str, Any]]]:
-        """Получить список квизов из кэша"""
-        key = "quizzes:all"
-        return await self.get(key)
+    async def get_or_load_quiz_catalog(self, loader, ttl: int = 21600, soft_ttl: int = 600) -> Optional[List[Dict[str, Any]]]:
+        """Каталог из кэша или из loader() (фоновое обновление через 10 минут)"""
+        return await self.get_or_load("quizzes:catalog", loader, ttl, tags=["quizzes"], soft_ttl=soft_ttl)
     
-    async def cache_quizzes_by_category(self, category: str, quiz_ids: List[str], ttl: int = 900):
-        """Кэшировать квизы по категории (15 минут)"""
+    async def cache_quizzes_by_category(self, category: str, quiz_ids: List[str], ttl: int = 3600):
+        """Кэшировать квизы по категории (1 час, сбрасывается при записи)"""
         key = f"quizzes:category:{category}"
-        return await self.set(key, quiz_ids, ttl)
+        return await self.set(key, quiz_ids, ttl, tags=["quizzes"])
     
     async def get_quizzes_by_category(self, category: str) -> Optional[List[str]]:
         """Получить квизы по категории из кэша"""
         key = f"quizzes:category:{category}"
-        return await self.get(key)
+        return await self.get(key, tags=["quizzes"])
 
     # === МЕТОДЫ ДЛЯ ПОЛЬЗОВАТЕЛЕЙ ===
     
-    async def cache_user_profile(self, user_id: str, user_data: Dict[str, Any], ttl: int = 1800):
-        """Кэшировать профиль пользователя (30 минут)"""
+    async def cache_user_profile(self, user_id: str, user_data: Dict[str, Any], ttl: int = 7200):
+        """Кэшировать профиль пользователя (2 часа, сбрасывается при изменении)"""
         key = f"user:{user_id}"
-        return await self.set(key, user_data, ttl)
+        return await self.set(key, user_data, ttl, tags=[key])
     
     async def get_user_profile(self, user_id: str) -> Optional[Dict[str, Any]]:
         """Получить профиль пользователя из кэша"""
         key = f"user:{user_id}"
-        return await self.get(key)
+        return await self.get(key, tags=[key])
     
-    async def cache_user_results(self, user_id: str, results: List[Dict[str, Any]], ttl: int = 7200):
-        """Кэшировать результаты пользователя (2 часа)"""
+    async def cache_user_results(self, user_id: str, results: List[Dict[str, Any]], ttl: int = 21600):
+        """Кэшировать результаты пользователя (6 часов)"""
         key = f"user_results:{user_id}"
-        return await self.set(key, results, ttl)
+        return await self.set(key, results, ttl, tags=[f"user:{user_id}"])
     
     async def get_user_results(self, user_id: str) -> Optional[List[Dict[str, Any]]]:
         """Получить результаты пользователя из кэша"""
         key = f"user_results:{user_id}"
-        return await self.get(key)
+        return await self.get(key, tags=[f"user:{user_id}"])
 
     # === МЕТОДЫ ДЛЯ РЕКОМЕНДАЦИЙ ===
     
     async def cache_learning_recommendations(self, user_id: str, recommendations: Dict[str, Any], ttl: int = 21600):
         """Кэшировать рекомендации обучения (6 часов)"""
         key = f"recommendations:{user_id}"
-        return await self.set(key, recommendations, ttl)
+        return await self.set(key, recommendations, ttl, tags=[f"user:{user_id}"])
     
     async def get_learning_recommendations(self, user_id: str) -> Optional[Dict[str, Any]]:
         """Получить рекомендации из кэша"""
         key = f"recommendations:{user_id}"
-        return await self.get(key)
+        return await self.get(key, tags=[f"user:{user_id}"])
     
     async def cache_learning_path(self, user_id: str, learning_path: Dict[str, Any], ttl: int = 86400):
         """Кэшировать персональный план обучения (24 часа)"""
         key = f"learning_path:{user_id}"
-        return await self.set(key, learning_path, ttl)
+        return await self.set(key, learning_path, ttl, tags=[f"user:{user_id}"])
     
     async def get_learning_path(self, user_id: str) -> Optional[Dict[str, Any]]:
         """Получить план обучения из кэша"""
         key = f"learning_path:{user_id}"
-        return await self.get(key)
+        return await self.get(key, tags=[f"user:{user_id}"])
 
     # === МЕТОДЫ ДЛЯ СТАТИСТИКИ ===
     
-    async def cache_quiz_stats(self, quiz_id: str, stats: Dict[str, Any], ttl: int = 3600):
-        """Кэшировать статистику квиза (1 час)"""
+    async def cache_quiz_stats(self, quiz_id: str, stats: Dict[str, Any], ttl: int = 21600):
+        """Кэшировать статистику квиза (6 часов, сбрасывается новым результатом)"""
         key = f"quiz_stats:{quiz_id}"
-        return await self.set(key, stats, ttl)
+        return await self.set(key, stats, ttl, tags=[f"quiz:{quiz_id}", f"quiz_results:{quiz_id}"])
     
     async def get_quiz_stats(self, quiz_id: str) -> Optional[Dict[str, Any]]:
         """Получить статистику квиза из кэша"""
         key = f"quiz_stats:{quiz_id}"
-        return await self.get(key)
+        return await self.get(key, tags=[f"quiz:{quiz_id}", f"quiz_results:{quiz_id}"])
+    
+    async def get_or_load_admin_quiz_stats(self, loader, ttl: int = 3600, soft_ttl: int = 300) -> Optional[Dict[str, Any]]:
+        """Сводная статистика квизов для админки (фоновое обновление через 5 минут)"""
+        return await self.get_or_load("quizzes:admin_stats", loader, ttl, tags=["quizzes"], soft_ttl=soft_ttl)
     
-    async def cache_leaderboard(self, leaderboard: List[Dict[str, Any]], ttl: int = 300):
-        """Кэшировать топ пользователей (5 минут)"""
+    async def cache_leaderboard(self, leaderboard: List[Dict[str, Any]], ttl: int = 3600):
+        """Кэшировать топ пользователей (1 час, сбрасывается новым результатом)"""
         key = "leaderboard:top"
-        return await self.set(key, leaderboard, ttl)
+        return await self.set(key, leaderboard, ttl, tags=["leaderboard"])
     
     async def get_leaderboard(self) -> Optional[List[Dict[str, Any]]]:
         """Получить топ пользователей из кэша"""
         key = "leaderboard:top"
-        return await self.get(key)
+        return await self.get(key, tags=["leaderboard"])
 
     # === УТИЛИТЫ ===
     
-    async def invalidate_user_cache(self, user_id: str):
-        """Очистить весь кэш пользователя"""
-        patterns = [
-            f"user:{user_id}",
-            f"session:{user_id}",
-            f"user_results:{user_id}",
-            f"recommendations:{user_id}",
-            f"learning_path:{user_id}"
-        ]
-        
-        for pattern in patterns:
-            await self.delete(pattern)
+    async def invalidate_user_cache(self, user_id: str) -> bool:
+        """
+        Очистить весь кэш пользователя (профиль, результаты, рекомендации, сессия).
+        False - Redis не подтвердил инвалидацию (она будет повторена)
+        """
+        deleted = await self.delete(f"session:{user_id}")
+        bumped = await self.bump(f"user:{user_id}", f"principal:{user_id}", "leaderboard")
+        return deleted and bumped
+    
+    async def invalidate_quiz_lists(self):
+        """Очистить кэш списков квизов (после создания/удаления)"""
+        return await self.bump("quizzes")
     
     async def invalidate_quiz_cache(self, quiz_id: str):
-        """Очистить кэш квиза"""
-        patterns = [
-            f"quiz:{quiz_id}",
-            f"quiz_stats:{quiz_id}",
-            "quizzes:all"
-        ]
-        
-        for pattern in patterns:
-            await self.delete(pattern)
+        """Очистить кэш квиза, его статистики и всех списков квизов"""
+        return await self.bump(f"quiz:{quiz_id}", "quizzes")
+    
+    async def invalidate_quiz_result(self, quiz_id: str, user_id: str):
+        """
+        После нового результата: профиль, статистика квиза, рейтинги.
+        principal:{id} не трогается: сессия остается действительной, а quiz_points
+        в ней увеличивает incr_session_field
+        """
+        return await self.bump(f"user:{user_id}", f"quiz_results:{quiz_id}", "leaderboard")
 
 # Глобальный экземпляр Redis кэша
 cache = RedisCache() 
\ No newline at end of file
@@ -0,0 +1,141 @@
+"""
+Кэш готовых HTTP-ответов: байты JSON (при необходимости уже сжатые gzip) и заголовки
+
+На попадании эндпоинт возвращает Response из сохраненных байтов: ни
+валидации Pydantic, ни jsonable_encoder, ни json.dumps - один поход в Redis
+(или L1) и запись в сокет. Записи помечаются теми же тегами, что и данные
+(quiz:{id}, quizzes, user:{id}), и сбрасываются тем же bump.
+
+Формат записи: MAGIC + 4 байта длины метаданных + метаданные (JSON: статус,
+заголовки, кодировка тела) + тело.
+"""
+import gzip
+import json
+import os
+import struct
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from bson import ObjectId
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from .http_cache import compute_body_etag, etag_matches, ETAG_HEADER, REVALIDATE_CACHE_CONTROL
+from .redis_cache import cache
+
+MAGIC = b"RC1"
+# Тела меньше порога не сжимаются (байты)
+RESPONSE_CACHE_GZIP_MIN_BYTES = int(os.getenv("RESPONSE_CACHE_GZIP_MIN_BYTES", "1024"))
+RESPONSE_CACHE_HEADER = "X-Response-Cache"
+
+
+def render_json(payload: Any) -> bytes:
+    """Те же байты, что отдал бы JSONResponse FastAPI (ObjectId - строкой)"""
+    return json.dumps(
+        jsonable_encoder(payload, custom_encoder={ObjectId: str}), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def pack_response(body: bytes, headers: Optional[Dict[str, str]] = None, status_code: int = 200) -> bytes:
+    """Упаковать тело и заголовки в запись кэша (с ETag и, для больших тел, gzip)"""
+    meta = {
+        "status": status_code,
+        "headers": {ETAG_HEADER: compute_body_etag(body), "Cache-Control": REVALIDATE_CACHE_CONTROL, **(headers or {})},
+        "encoding": "identity"
+    }
+    if len(body) >= RESPONSE_CACHE_GZIP_MIN_BYTES:
+        body = gzip.compress(body, compresslevel=6)
+        meta["encoding"] = "gzip"
+    raw_meta = json.dumps(meta, separators=(",", ":")).encode("utf-8")
+    return MAGIC + struct.pack(">I", len(raw_meta)) + raw_meta + body
+
+
+def unpack_response(blob: bytes):
+    """(метаданные, тело) из записи кэша"""
+    if not blob.startswith(MAGIC):
+        raise ValueError("Неизвестный формат записи кэша ответов")
+    offset = len(MAGIC) + 4
+    (meta_length,) = struct.unpack(">I", blob[len(MAGIC):offset])
+    meta = json.loads(blob[offset:offset + meta_length])
+    return meta, blob[offset + meta_length:]
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    """Принимает ли клиент gzip: q-значения из Accept-Encoding, "gzip;q=0" - отказ, "*" - любое сжатие"""
+    qualities = {}
+    for item in (accept_encoding or "").split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.lower()] = quality
+    for coding in ("gzip", "x-gzip", "*"):
+        if coding in qualities:
+            return qualities[coding] > 0
+    return False
+
+
+def build_response(request: Request, blob: bytes, cache_status: str) -> Response:
+    """Response из записи кэша: 304 по If-None-Match, gzip как есть, если клиент его принимает"""
+    meta, body = unpack_response(blob)
+    headers = dict(meta["headers"])
+    headers[RESPONSE_CACHE_HEADER] = cache_status
+    headers["Vary"] = "Accept-Encoding"
+    if etag_matches(request.headers.get("if-none-match"), headers[ETAG_HEADER]):
+        return Response(status_code=304, headers=headers)
+    if meta["encoding"] == "gzip":
+        if accepts_gzip(request.headers.get("accept-encoding")):
+            headers["Content-Encoding"] = "gzip"
+        else:
+            body = gzip.decompress(body)
+    return Response(content=body, status_code=meta["status"], headers=headers, media_type="application/json")
+
+
+async def _load_blob(key: str, tags: List[str], loader: Callable[[], Awaitable[Optional[Any]]],
+                     ttl: int, headers: Optional[Dict[str, str]]):
+    """(запись, "HIT" | "MISS"); запись None - loader ничего не вернул"""
+    blob, generations = await cache.get_raw(f"resp:{key}", tags)
+    if blob is not None:
+        return blob, "HIT"
+
+    payload = await loader()
+    if payload is None:
+        return None, "MISS"
+    blob = pack_response(render_json(payload), headers)
+    # Поколения прочитаны до загрузки: ответ, пересекшийся с bump, сразу станет промахом
+    await cache.set_raw(f"resp:{key}", blob, ttl, tags, generations)
+    return blob, "MISS"
+
+
+async def cached_json_response(
+    request: Request,
+    key: str,
+    tags: List[str],
+    loader: Callable[[], Awaitable[Optional[Any]]],
+    ttl: int = 3600,
+    headers: Optional[Dict[str, str]] = None
+) -> Optional[Response]:
+    """
+    Готовый ответ из кэша или построенный из loader() и сохраненный.
+    loader возвращает данные для JSON (None - ответа нет, ничего не кэшируется)
+    """
+    blob, cache_status = await _load_blob(key, tags, loader, ttl, headers)
+    if blob is None:
+        return None
+    return build_response(request, blob, cache_status)
+
+
+async def warm_response(
+    key: str,
+    tags: List[str],
+    loader: Callable[[], Awaitable[Optional[Any]]],
+    ttl: int = 3600,
+    headers: Optional[Dict[str, str]] = None
+) -> bool:
+    """Заполнить кэш ответа без запроса (прогрев); False - loader ничего не вернул"""
+    blob, _ = await _load_blob(key, tags, loader, ttl, headers)
+    return blob is not None
@@ -1,12 +1,24 @@
-from fastapi import APIRouter, HTTPException, Body, Query, Path, Depends
+from fastapi import APIRouter, HTTPException, Body, Query, Path, Depends, Request, Response
+from fastapi.responses import StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
+from pymongo import ReturnDocument
 from typing import List, Optional, Dict, Any
 import os
 from dotenv import load_dotenv
 from datetime import datetime
-from passlib.context import CryptContext
 from ..models import UserCreate, UserResponse, User, UserRole
+from ..redis_cache import cache
+from ..middleware import invalidate_principal
+from ..password_hashing import password_hasher
+from ..pagination import paginate, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, QUIZ_LIST_PROJECTION
+from ..http_cache import compute_etag, conditional_response
+from ..cache_warmer import cache_warmer
+from ..quiz_schema import normalize_questions, QuestionSchemaError
+from ..quiz_versions import publish_version, stamp_current_version
+from ..quiz_import import import_quizzes, IMPORT_BATCH_SIZE
+from ..data_export import stream_export, export_headers, export_media_type, ExportError, EXPORT_BATCH_SIZE
+from .. import leaderboard
 
 # Load .env from parent directory with encoding fallback
 env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
@@ -23,30 +35,42 @@ except FileNotFoundError:
     pass
 
 router = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # MongoDB connection - используем централизованное подключение
-from ..database import get_database, MONGODB_URL
+from ..database import get_database
 
 # User management endpoints
 @router.get("/users", 
             summary="Получить список пользователей [админ]",
-            description="Возвращает список всех пользователей (требуются права администратора)")
-async def get_users():
+            description="Возвращает страницу пользователей (курсор следующей страницы - в заголовке X-Next-Cursor)")
+async def get_users(
+    response: Response,
+    role: Optional[str] = Query(None, description="Фильтр по роли"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы")
+):
     try:
-        print(f"🔍 Admin endpoint: Attempting to fetch users from MongoDB")
-        print(f"🔗 MongoDB URL: {MONGODB_URL[:50]}...")  # Log partial URL for debugging
+        query = {}
+        if role:
+            try:
+                query["role"] = UserRole(role).value
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Недопустимая роль пользователя")
         
         db = await get_database()
-        users = []
-        cursor = db.users.find({}, {"password": 0})  # Exclude passwords
-        async for user in cursor:
-            user["id"] = str(user["_id"])
-            del user["_id"]
-            users.append(user)
+        users, next_cursor = await paginate(
+            db.users, query, [("_id", 1)],
+            projection={"password": 0},  # Exclude passwords
+            limit=limit, cursor=cursor
+        )
+        for user in users:
+            user["id"] = str(user.pop("_id"))
         
-        print(f"✅ Successfully fetched {len(users)} users")
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
         return users
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Error fetching users: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
@@ -65,7 +89,7 @@ async def create_user(user: UserCreate):
         
         # Хешируем пароль
         user_dict = user.model_dump()
-        user_dict["password"] = pwd_context.hash(user_dict["password"])
+        user_dict["password"] = await password_hasher.hash(user_dict["password"])
         user_dict["created_at"] = datetime.now()
         user_dict["quiz_points"] = 0
         # Убеждаемся, что роль корректно сохраняется как строка
@@ -81,6 +105,8 @@ async def create_user(user: UserCreate):
         del created_user["password"]
         
         return UserResponse(**created_user)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -110,7 +136,7 @@ async def update_user(
         
         # Если обновляется пароль, хешируем его
         if "password" in user_update:
-            user_update["password"] = pwd_context.hash(user_update["password"])
+            user_update["password"] = await password_hasher.hash(user_update["password"])
         
         # Проверяем и валидируем роль, если она обновляется
         if "role" in user_update:
@@ -137,6 +163,9 @@ async def update_user(
         if update_result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Пользователь не найден")
         
+        # Роль/логин могли измениться - сбрасываем кэши аутентификации
+        await invalidate_principal(user_id)
+        
         # Получаем обновленного пользователя
         updated_user = await db.users.find_one({"_id": ObjectId(user_id)})
         updated_user["id"] = str(updated_user["_id"])
@@ -144,6 +173,8 @@ async def update_user(
         del updated_user["password"]
         
         return UserResponse(**updated_user)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -156,6 +187,12 @@ async def delete_user(user_id: str):
         result = await db.users.delete_one({"_id": ObjectId(user_id)})
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Пользователь не найден")
+        
+        # Удаленный пользователь не должен проходить аутентификацию ни через один уровень кэша
+        await invalidate_principal(user_id)
+        # ...и показываться в рейтингах
+        if not await leaderboard.remove_user(user_id):
+            print(f"⚠️ Пользователь {user_id} остался в рейтингах (Redis недоступен), нужна пересборка")
         return {"message": "Пользователь успешно удален"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -173,8 +210,14 @@ async def create_quiz(
     time_limit: int = Body(..., description="Ограничение времени на тест в минутах"),
     questions: List[dict] = Body(..., description="Список вопросов с вариантами ответов")
 ):
+    # Каноническая форма вопросов приводится при записи, чтение отдает документ как есть
+    try:
+        questions = normalize_questions(questions)
+    except QuestionSchemaError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     try:
         quiz = {
+            "_id": ObjectId(),
             "title": title,
             "description": description,
             "category": category,
@@ -186,9 +229,14 @@ async def create_quiz(
         }
         
         db = await get_database()
+        # Первая неизменяемая версия записывается до квиза, указатель - вместе с ним
+        quiz["version_id"] = await publish_version(db, quiz)
         result = await db.quizzes.insert_one(quiz)
         quiz["_id"] = str(result.inserted_id)
         
+        # Инвалидируем кэш списка и каталога квизов
+        await cache.invalidate_quiz_lists()
+        
         return quiz
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -206,6 +254,12 @@ async def update_quiz(
     time_limit: Optional[int] = Body(None, description="Новое ограничение времени в минутах"),
     questions: Optional[List[dict]] = Body(None, description="Новый список вопросов")
 ):
+    # Каноническая форма вопросов приводится при записи, чтение отдает документ как есть
+    if questions is not None:
+        try:
+            questions = normalize_questions(questions)
+        except QuestionSchemaError as e:
+            raise HTTPException(status_code=422, detail=str(e))
     try:
         update_data = {
             "updated_at": datetime.utcnow()
@@ -225,18 +279,26 @@ async def update_quiz(
             update_data["questions"] = questions
 
         db = await get_database()
-        result = await db.quizzes.update_one(
+        updated_quiz = await db.quizzes.find_one_and_update(
             {"_id": ObjectId(quiz_id)},
-            {"$set": update_data}
+            {"$set": update_data},
+            return_document=ReturnDocument.AFTER
         )
 
-        if result.modified_count == 0:
+        if not updated_quiz:
             raise HTTPException(status_code=404, detail="Quiz not found")
 
-        updated_quiz = await db.quizzes.find_one({"_id": ObjectId(quiz_id)})
+        # Правка порождает новую неизменяемую версию; меняется только указатель
+        await stamp_current_version(db, updated_quiz)
+
+        # Инвалидируем кэш квиза и списков квизов
+        await cache.invalidate_quiz_cache(quiz_id)
+
         updated_quiz["_id"] = str(updated_quiz["_id"])
         
         return updated_quiz
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -251,6 +313,9 @@ async def delete_quiz(quiz_id: str = Path(..., description="ID теста для
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Quiz not found")
+        
+        # Инвалидируем кэш квиза и списков квизов
+        await cache.invalidate_quiz_cache(quiz_id)
             
         return {"status": "success", "message": "Quiz deleted successfully"}
     except Exception as e:
@@ -261,7 +326,7 @@ async def delete_quiz(quiz_id: str = Path(..., description="ID теста для
            description="Возвращает общую статистику по тестам",
            response_description="Статистика по категориям и сложности")
 async def get_quiz_stats():
-    try:
+    async def load_stats():
         db = await get_database()
         total_quizzes = await db.quizzes.count_documents({})
         quizzes_by_category = await db.quizzes.aggregate([
@@ -276,24 +341,116 @@ async def get_quiz_stats():
             "by_category": quizzes_by_category,
             "by_difficulty": quizzes_by_difficulty
         }
+    
+    try:
+        # Агрегации дорогие: устаревшая статистика отдается сразу, обновление - в фоне
+        return await cache.get_or_load_admin_quiz_stats(load_stats)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/quizzes/import",
+            summary="Импорт тестов",
+            description="Потоковый импорт тестов из NDJSON (одна запись на строку) или JSON-массива в теле запроса. "
+                        "Записи проверяются по одной и пишутся пачками; некорректные попадают в отчет с номером записи "
+                        "и не останавливают импорт",
+            response_description="Отчет: получено, записано, ошибки по записям")
+async def import_quizzes_endpoint(
+    request: Request,
+    batch_size: int = Query(IMPORT_BATCH_SIZE, ge=1, le=5000, description="Размер пачки insert_many"),
+    dry_run: bool = Query(False, description="Только проверить записи, ничего не записывать")
+):
+    try:
+        db = await get_database()
+        return await import_quizzes(db, request.stream(), batch_size=batch_size, dry_run=dry_run)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/export/{collection}",
+           summary="Выгрузка данных",
+           description="Потоковая выгрузка quizzes, quiz_results или quiz_attempts в NDJSON или CSV. "
+                       "Фильтры: владелец (created_by / user_id) и интервал дат [since, until). "
+                       "gzip=true отдает сжатый файл .gz. Память сервера не зависит от размера коллекции",
+           response_description="Файл выгрузки")
+async def export_collection(
+    collection: str = Path(..., description="quizzes, quiz_results или quiz_attempts"),
+    format: str = Query("ndjson", description="ndjson или csv"),
+    owner: Optional[str] = Query(None, description="ID автора теста или пользователя"),
+    since: Optional[datetime] = Query(None, description="Начало интервала (включительно)"),
+    until: Optional[datetime] = Query(None, description="Конец интервала (не включительно)"),
+    gzip: bool = Query(False, description="Сжать выгрузку gzip"),
+    batch_size: int = Query(EXPORT_BATCH_SIZE, ge=1, le=10000, description="Размер пачки курсора MongoDB")
+):
+    try:
+        db = await get_database()
+        body = stream_export(db, collection, format, owner, since, until, gzip, batch_size)
+    except ExportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return StreamingResponse(body, media_type=export_media_type(format, gzip),
+                             headers=export_headers(collection, format, gzip))
+
+@router.post("/cache/warm",
+            summary="Прогреть кэш",
+            description="Заполняет кэш популярных квизов, каталога и списков по категориям (например, по cron после деплоя). "
+                        "Возвращает отчет с длительностью прогрева")
+async def warm_cache():
+    try:
+        return await cache_warmer.warm()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/leaderboards/rebuild",
+            summary="Пересобрать рейтинги",
+            description="Заново строит sorted set рейтингов из users.quiz_points и quiz_results. "
+                        "Начисления во время пересборки могут потеряться - запускать в тихое время")
+async def rebuild_leaderboards():
+    try:
+        return await leaderboard.rebuild()
+    except leaderboard.LeaderboardUnavailable:
+        raise HTTPException(status_code=503, detail="Redis недоступен")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/quizzes",
            summary="Список тестов",
-           description="Возвращает список всех тестов",
+           description="Возвращает страницу тестов без тел вопросов (курсор следующей страницы - в заголовке X-Next-Cursor). "
+                       "Поддерживает If-None-Match (ETag)",
            response_description="Массив тестов")
-async def get_quizzes():
-    try:
-        print(f"🔍 Admin endpoint: Attempting to fetch quizzes from MongoDB")
+async def get_quizzes(
+    request: Request,
+    response: Response,
+    category: Optional[str] = Query(None, description="Фильтр по категории"),
+    difficulty: Optional[str] = Query(None, description="Фильтр по сложности"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы")
+):
+    query = {}
+    if category:
+        query["category"] = category
+    if difficulty:
+        query["difficulty"] = difficulty
+    
+    async def load_page():
         db = await get_database()
-        quizzes = await db.quizzes.find().to_list(None)
+        quizzes, next_cursor = await paginate(
+            db.quizzes, query, [("_id", 1)],
+            projection=QUIZ_LIST_PROJECTION, limit=limit, cursor=cursor
+        )
         # Convert ObjectId to string for JSON serialization 
         for quiz in quizzes:
             quiz["_id"] = str(quiz["_id"])
-        
-        print(f"✅ Successfully fetched {len(quizzes)} quizzes")
-        return quizzes
+        return {"items": quizzes, "next_cursor": next_cursor, "etag": compute_etag([quizzes, next_cursor])}
+    
+    try:
+        page = await cache.get_or_load_quizzes_page(
+            "admin", {"query": query, "limit": limit, "cursor": cursor}, load_page
+        )
+        headers = {NEXT_CURSOR_HEADER: page["next_cursor"]} if page["next_cursor"] else {}
+        not_modified = conditional_response(request, response, page["etag"], headers)
+        return not_modified or page["items"]
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Error fetching quizzes: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
@@ -352,9 +509,13 @@ async def get_available_roles():
            summary="Получить пользователей по роли",
            description="Возвращает список пользователей с определенной ролью",
            response_description="Список пользователей указанной роли")
-async def get_users_by_role(role: str = Path(..., description="Роль пользователей для поиска")):
+async def get_users_by_role(
+    role: str = Path(..., description="Роль пользователей для поиска"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы")
+):
     """
-    Возвращает список пользователей с указанной ролью
+    Возвращает страницу пользователей с указанной ролью
     """
     try:
         # Проверяем, что роль валидна
@@ -364,17 +525,21 @@ async def get_users_by_role(role: str = Path(..., description="Роль поль
             raise HTTPException(status_code=400, detail="Недопустимая роль пользователя")
         
         db = await get_database()
-        users = []
-        cursor = db.users.find({"role": role}, {"password": 0})  # Exclude passwords
-        async for user in cursor:
-            user["id"] = str(user["_id"])
-            del user["_id"]
-            users.append(user)
+        users, next_cursor = await paginate(
+            db.users, {"role": role}, [("_id", 1)],
+            projection={"password": 0},  # Exclude passwords
+            limit=limit, cursor=cursor
+        )
+        for user in users:
+            user["id"] = str(user.pop("_id"))
         
         return {
             "role": role,
             "count": len(users),
-            "users": users
+            "users": users,
+            "next_cursor": next_cursor
         }
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,74 @@
+from fastapi import APIRouter, HTTPException, Depends, Path, Query
+from typing import Optional
+from bson import ObjectId
+from ..middleware import get_current_user
+from ..models import UserInDB
+from .. import leaderboard
+from ..leaderboard import LeaderboardUnavailable, LEADERBOARD_MAX_LIMIT
+
+router = APIRouter()
+
+SCOPE_DESCRIPTION = "Рейтинг: global - за все время, category - по категории, weekly - за неделю"
+
+
+def _board_key(scope: str, category: Optional[str], week: Optional[str]) -> str:
+    try:
+        return leaderboard.board_key(scope, category, week)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("",
+           summary="Топ пользователей",
+           description="Первые N мест рейтинга из sorted set Redis (без сортировки коллекции пользователей)")
+async def get_leaderboard(
+    scope: str = Query("global", description=SCOPE_DESCRIPTION),
+    category: Optional[str] = Query(None, description="Категория (для scope=category)"),
+    week: Optional[str] = Query(None, description="ISO-неделя, например 2024-W07 (для scope=weekly, по умолчанию текущая)"),
+    limit: int = Query(10, ge=1, le=LEADERBOARD_MAX_LIMIT, description="Количество мест"),
+    current_user: UserInDB = Depends(get_current_user)
+):
+    key = _board_key(scope, category, week)
+    try:
+        return {"scope": scope, "board": key, "items": await leaderboard.top(key, limit)}
+    except LeaderboardUnavailable:
+        raise HTTPException(status_code=503, detail="Рейтинг временно недоступен")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/me",
+           summary="Мое место в рейтинге",
+           description="Место, очки текущего пользователя и число участников рейтинга")
+async def get_my_rank(
+    scope: str = Query("global", description=SCOPE_DESCRIPTION),
+    category: Optional[str] = Query(None, description="Категория (для scope=category)"),
+    week: Optional[str] = Query(None, description="ISO-неделя (для scope=weekly)"),
+    current_user: UserInDB = Depends(get_current_user)
+):
+    return await _rank_response(current_user.id, scope, category, week)
+
+
+@router.get("/users/{user_id}",
+           summary="Место пользователя в рейтинге",
+           description="Место, очки пользователя и число участников рейтинга (rank = null - очков нет)")
+async def get_user_rank(
+    user_id: str = Path(..., description="ID пользователя"),
+    scope: str = Query("global", description=SCOPE_DESCRIPTION),
+    category: Optional[str] = Query(None, description="Категория (для scope=category)"),
+    week: Optional[str] = Query(None, description="ISO-неделя (для scope=weekly)"),
+    current_user: UserInDB = Depends(get_current_user)
+):
+    if not ObjectId.is_valid(user_id):
+        raise HTTPException(status_code=422, detail="Некорректный ID пользователя")
+    return await _rank_response(user_id, scope, category, week)
+
+
+async def _rank_response(user_id: str, scope: str, category: Optional[str], week: Optional[str]):
+    key = _board_key(scope, category, week)
+    try:
+        return {"scope": scope, "board": key, **await leaderboard.rank(key, user_id)}
+    except LeaderboardUnavailable:
+        raise HTTPException(status_code=503, detail="Рейтинг временно недоступен")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
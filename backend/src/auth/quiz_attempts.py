@@ -1,7 +1,7 @@
-from fastapi import APIRouter, HTTPException, Body, Path, Depends, Request, Form, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Body, Path, Depends, Request, Form, BackgroundTasks, Query, Response
 from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import os
 from dotenv import load_dotenv
 from datetime import datetime
@@ -9,6 +9,10 @@ from pydantic import BaseModel, Field
 from ..middleware import get_current_user
 from ..models import UserInDB
 from ..ai_service import generate_learning_recommendations
+from ..pagination import paginate, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER
+from ..redis_cache import cache
+from .. import leaderboard
+from ..quiz_versions import current_version, get_version
 
 router = APIRouter()
 
@@ -131,9 +135,10 @@ async def create_quiz_attempt(
         if not quiz:
             raise HTTPException(status_code=404, detail="Тест не найден")
 
-        # Создаем новую попытку
+        # Создаем новую попытку; она оценивается по версии квиза на момент начала
         attempt = {
             "quiz_id": ObjectId(quiz_id),
+            "version_id": await current_version(db, quiz),
             "user_id": ObjectId(current_user.id),
             "start_time": datetime.utcnow(),
             "status": "in_progress",
@@ -212,15 +217,22 @@ async def finish_quiz(
         if not quiz:
             raise HTTPException(status_code=404, detail="Quiz not found")
 
+        # Вопросы - из версии, с которой начата попытка (квиз могли изменить после начала)
+        questions = quiz["questions"]
+        if attempt.get("version_id"):
+            version = await get_version(db, attempt["version_id"])
+            if version:
+                questions = version["questions"]
+
         # Calculate score and collect incorrect answers
         correct_answers = 0
-        total_questions = len(quiz["questions"])
+        total_questions = len(questions)
         incorrect_questions = []
         
         for answer in attempt["answers"]:
             question_idx = answer.get("question_index")
             if 0 <= question_idx < total_questions:
-                question = quiz["questions"][question_idx]
+                question = questions[question_idx]
                 if answer["answer"] == question["correct_answer"]:
                     correct_answers += 1
                 else:
@@ -260,13 +272,26 @@ async def finish_quiz(
         quiz_result = {
             "quiz_id": str(quiz["_id"]),
             "quiz_title": quiz["title"],
+            "version_id": attempt.get("version_id"),
             "user_id": current_user.id,
             "score": score,
+            "points": points_earned,
+            "category": quiz.get("category"),
             "completed_at": completion_time,
             "incorrect_questions": incorrect_questions
         }
         await db.quiz_results.insert_one(quiz_result)
         
+        # Рейтинги обновляются инкрементально: ZINCRBY вместо сортировки users
+        await leaderboard.record_points(current_user.id, current_user.name, points_earned,
+                                        quiz.get("category"), completion_time)
+        
+        # Очки в сессии - атомарный HINCRBY вместо пересоздания сессии из MongoDB
+        if points_earned:
+            await cache.incr_session_field(current_user.id, "quiz_points", points_earned)
+        # Профиль (quiz_points), статистика квиза и рейтинги больше не актуальны
+        await cache.invalidate_quiz_result(str(quiz["_id"]), current_user.id)
+        
         # Генерируем рекомендации в фоновом режиме
         try:
             background_tasks.add_task(
@@ -326,20 +351,27 @@ async def get_attempt(
            description="Возвращает список результатов квизов для текущего пользователя (требуется аутентификация)",
            response_description="Список результатов квизов")
 async def get_user_quiz_results(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы"),
     current_user: UserInDB = Depends(get_current_user)
 ):
     try:
         # Получаем результаты квизов пользователя, сортируем по дате завершения (сначала новые)
         db = await get_db()
-        cursor = db.quiz_results.find({"user_id": current_user.id}).sort("completed_at", -1)
-        
-        # Преобразуем результаты в список
-        results = []
-        async for result in cursor:
+        results, next_cursor = await paginate(
+            db.quiz_results, {"user_id": current_user.id},
+            [("completed_at", -1), ("_id", -1)],
+            limit=limit, cursor=cursor
+        )
+        for result in results:
             result["_id"] = str(result["_id"])
-            results.append(result)
-            
+        
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
         return results
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
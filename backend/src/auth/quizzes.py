@@ -1,6 +1,7 @@
-from fastapi import APIRouter, HTTPException, Depends, Body, Path
+from fastapi import APIRouter, HTTPException, Depends, Body, Path, Query, Request, Response
 from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
+from pymongo import ReturnDocument
 import os
 from dotenv import load_dotenv
 from datetime import datetime
@@ -8,6 +9,12 @@ from typing import List, Dict, Optional
 from ..models import QuizBase, QuizResponse
 from ..middleware import require_admin
 from ..redis_cache import cache
+from ..pagination import paginate, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, QUIZ_LIST_PROJECTION
+from ..http_cache import compute_etag, conditional_response
+from ..response_cache import cached_json_response, warm_response
+from ..cache_warmer import cache_warmer
+from ..quiz_schema import normalize_questions, QuestionSchemaError
+from ..quiz_versions import publish_version, stamp_current_version, get_version, IMMUTABLE_CACHE_CONTROL
 
 # Load .env from parent directory with encoding fallback
 env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
@@ -28,100 +35,193 @@ router = APIRouter()
 # MongoDB connection - используем централизованное подключение
 from ..database import get_database
 
+CATALOG_RESPONSE_KEY = "catalog"
+CATALOG_RESPONSE_TTL = 600
+QUIZ_VERSION_RESPONSE_TTL = 30 * 86400
+
+# === ЗАГРУЗЧИКИ (общие для эндпоинтов и прогрева кэша) ===
+
+async def load_quizzes_page(query: Dict, limit: int, cursor: Optional[str]) -> Dict:
+    """Страница списка квизов {items, next_cursor, etag} из MongoDB"""
+    db = await get_database()
+    quizzes, next_cursor = await paginate(
+        db.quizzes, query, [("_id", 1)],
+        projection=QUIZ_LIST_PROJECTION, limit=limit, cursor=cursor
+    )
+    for quiz_doc in quizzes:
+        # Преобразуем _id в строку для правильной сериализации
+        quiz_doc["id"] = str(quiz_doc.pop("_id"))
+    return {"items": quizzes, "next_cursor": next_cursor, "etag": compute_etag([quizzes, next_cursor])}
+
+async def get_quizzes_page(query: Dict, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None) -> Dict:
+    """Страница публичного списка из кэша или из MongoDB"""
+    return await cache.get_or_load_quizzes_page(
+        "public", {"query": query, "limit": limit, "cursor": cursor},
+        lambda: load_quizzes_page(query, limit, cursor)
+    )
+
+async def load_quiz_catalog() -> List[Dict]:
+    """Каталог из MongoDB: тела вопросов не покидают базу, считаем только их количество"""
+    db = await get_database()
+    return await db.quizzes.aggregate([
+        {"$sort": {"_id": 1}},
+        {"$project": {
+            "_id": 0,
+            "id": {"$toString": "$_id"},
+            "title": 1,
+            "category": 1,
+            "difficulty": 1,
+            "time_limit": 1,
+            "question_count": {"$size": {"$ifNull": ["$questions", []]}}
+        }}
+    ]).to_list(None)
+
+async def render_quiz_catalog() -> Optional[List[Dict]]:
+    """Данные ответа каталога: устаревший каталог отдается сразу, обновление идет в фоне"""
+    return await cache.get_or_load_quiz_catalog(load_quiz_catalog)
+
+async def load_quiz(quiz_id: str) -> Optional[Dict]:
+    """Квиз из MongoDB (None - не найден)"""
+    db = await get_database()
+    quiz = await db.quizzes.find_one({"_id": ObjectId(quiz_id)})
+    if not quiz:
+        return None
+    
+    # Преобразуем _id в строку для правильной сериализации
+    quiz["id"] = str(quiz["_id"])
+    del quiz["_id"]  # Удаляем _id, так как он уже преобразован в id
+    # Вопросы уже в канонической форме (quiz_schema): приводятся при записи
+    
+    print(f"💾 Квиз {quiz_id} загружен из БД и сохранен в кэш")
+    return quiz
+
+async def render_quiz(quiz_id: str) -> Optional[Dict]:
+    """Данные ответа квиза: кэш данных, а при промахе - одна загрузка из БД на все одновременные запросы"""
+    quiz = await cache.get_or_load_quiz(quiz_id, lambda: load_quiz(quiz_id))
+    # Поля ответа как у response_model: промах кэша ответов проходит через Pydantic один раз
+    return QuizResponse.model_validate(quiz).model_dump() if quiz else None
+
 @router.get("/api/quizzes", 
            summary="Получить список тестов",
-           description="Возвращает список всех доступных тестов",
+           description="Возвращает страницу тестов без тел вопросов (курсор следующей страницы - в заголовке X-Next-Cursor). "
+                       "Поддерживает If-None-Match: при совпадении ETag ответ 304 без тела",
            tags=["quizzes"])
-async def get_quizzes():
+async def get_quizzes(
+    request: Request,
+    response: Response,
+    category: Optional[str] = Query(None, description="Фильтр по категории"),
+    difficulty: Optional[str] = Query(None, description="Фильтр по сложности"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы")
+):
+    query = {}
+    if category:
+        query["category"] = category
+    if difficulty:
+        query["difficulty"] = difficulty
+    
     try:
-        print("🔍 DEBUG: Starting get_quizzes function")
-        
-        # Temporary disable cache for debugging
-        print("🔍 DEBUG: Bypassing cache, fetching from MongoDB...")
-        
-        try:
-            db = await get_database()
-            print("🔍 DEBUG: Database connection successful")
-        except Exception as db_error:
-            print(f"❌ DEBUG: Database connection failed: {db_error}")
-            raise HTTPException(status_code=500, detail=f"Database connection failed: {str(db_error)}")
-        
-        quizzes = []
-        try:
-            cursor = db.quizzes.find()
-            print("🔍 DEBUG: Cursor created")
-            
-            async for quiz_doc in cursor:
-                try:
-                    # Преобразуем _id в строку для правильной сериализации
-                    quiz_doc["id"] = str(quiz_doc["_id"])
-                    del quiz_doc["_id"]  # Удаляем _id, так как он уже преобразован в id
-                    quizzes.append(quiz_doc)
-                except Exception as e:
-                    print(f"⚠️ DEBUG: Error processing quiz document: {e}")
-                    continue
-            
-            print(f"✅ DEBUG: Successfully fetched {len(quizzes)} quizzes from MongoDB")
-        except Exception as db_query_error:
-            print(f"❌ DEBUG: Database query failed: {db_query_error}")
-            raise HTTPException(status_code=500, detail=f"Database query failed: {str(db_query_error)}")
-        
-        return quizzes
+        page = await get_quizzes_page(query, limit, cursor)
+        headers = {NEXT_CURSOR_HEADER: page["next_cursor"]} if page["next_cursor"] else {}
+        not_modified = conditional_response(request, response, page["etag"], headers)
+        return not_modified or page["items"]
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ DEBUG: Unexpected error in get_quizzes: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        print(f"❌ Ошибка получения списка квизов: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail=f"Failed to fetch quizzes: {str(e)}"
         )
 
+@router.get("/api/quizzes/catalog",
+           summary="Каталог тестов",
+           description="Краткая информация обо всех тестах: название, категория, сложность, время и количество вопросов. Поддерживает If-None-Match (ETag)",
+           tags=["quizzes"])
+async def get_quiz_catalog(request: Request):
+    try:
+        # Готовые байты ответа; ETag и 304 - по телу
+        return await cached_json_response(request, CATALOG_RESPONSE_KEY, ["quizzes"], render_quiz_catalog,
+                                          ttl=CATALOG_RESPONSE_TTL)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to fetch quiz catalog: {str(e)}"
+        )
+
 @router.get("/api/quizzes/{quiz_id}", 
            response_model=QuizResponse,
            summary="Получить тест по ID",
            description="Возвращает подробную информацию о тесте по его ID",
            tags=["quizzes"])
-async def get_quiz(quiz_id: str = Path(..., description="ID теста для получения")):
+async def get_quiz(request: Request, quiz_id: str = Path(..., description="ID теста для получения")):
     try:
-        # Сначала пробуем получить из кэша
-        cached_quiz = await cache.get_quiz(quiz_id)
-        if cached_quiz:
-            print(f"📦 Квиз {quiz_id} получен из кэша")
-            return cached_quiz
-
-        # Если нет в кэше, получаем из БД
-        db = await get_database()
-        quiz = await db.quizzes.find_one({"_id": ObjectId(quiz_id)})
-        if not quiz:
+        # Попадание - готовые байты без Pydantic и сериализации
+        response = await cached_json_response(request, f"quiz:{quiz_id}", [f"quiz:{quiz_id}"],
+                                              lambda: render_quiz(quiz_id))
+        if response is None:
             raise HTTPException(status_code=404, detail="Тест не найден")
-        
-        # Преобразуем _id в строку для правильной сериализации
-        quiz["id"] = str(quiz["_id"])
-        del quiz["_id"]  # Удаляем _id, так как он уже преобразован в id
-        
-        # Нормализуем структуру вопросов для совместимости
-        if "questions" in quiz and quiz["questions"]:
-            for question in quiz["questions"]:
-                # Если есть поле "question" но нет "text", копируем его
-                if "question" in question and "text" not in question:
-                    question["text"] = question["question"]
-                # Если есть поле "text" но нет "question", копируем его
-                elif "text" in question and "question" not in question:
-                    question["question"] = question["text"]
-        
-        # Кэшируем квиз на 1 час
-        await cache.cache_quiz(quiz_id, quiz, ttl=3600)
-        print(f"💾 Квиз {quiz_id} сохранен в кэш")
-        
-        return quiz
+        return response
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Failed to fetch quiz: {str(e)}"
         )
 
+@router.get("/api/quizzes/{quiz_id}/versions/{version_id}",
+           summary="Версия теста",
+           description="Неизменяемая версия теста (version_id из самого теста или попытки). "
+                       "Кэшируется без ограничения срока: Cache-Control: immutable",
+           tags=["quizzes"])
+async def get_quiz_version(
+    request: Request,
+    quiz_id: str = Path(..., description="ID теста"),
+    version_id: str = Path(..., description="ID версии (хеш содержимого)")
+):
+    async def render_version():
+        db = await get_database()
+        version = await get_version(db, version_id)
+        if not version or version.get("quiz_id") != quiz_id:
+            return None
+        version["id"] = version.pop("_id")
+        return version
+    
+    try:
+        # Версия не меняется: без тегов, инвалидация не нужна
+        response = await cached_json_response(
+            request, f"quiz_version:{quiz_id}:{version_id}", [], render_version,
+            ttl=QUIZ_VERSION_RESPONSE_TTL, headers={"Cache-Control": IMMUTABLE_CACHE_CONTROL}
+        )
+        if response is None:
+            raise HTTPException(status_code=404, detail="Версия теста не найдена")
+        return response
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to fetch quiz version: {str(e)}"
+        )
+
+# === ПРОГРЕВ КЭША ===
+
+async def warm_quiz(quiz_id: str) -> bool:
+    """Данные и готовый ответ квиза; False - квиз не найден"""
+    return await warm_response(f"quiz:{quiz_id}", [f"quiz:{quiz_id}"], lambda: render_quiz(quiz_id))
+
+async def warm_catalog() -> bool:
+    """Данные и готовый ответ каталога"""
+    return await warm_response(CATALOG_RESPONSE_KEY, ["quizzes"], render_quiz_catalog, ttl=CATALOG_RESPONSE_TTL)
+
+async def warm_category(category: str) -> bool:
+    """Первая страница списка по категории (то, что открывает фильтр на фронтенде)"""
+    await get_quizzes_page({"category": category})
+    return True
+
+cache_warmer.configure(warm_quiz=warm_quiz, warm_catalog=warm_catalog, warm_category=warm_category)
+
 # Защищенные маршруты для администраторов
 @router.post("/api/quizzes", 
             dependencies=[Depends(require_admin)],
@@ -136,8 +236,14 @@ async def create_quiz(
     time_limit: int = Body(..., description="Ограничение времени в минутах"),
     questions: List[Dict] = Body(..., description="Список вопросов и вариантов ответов")
 ):
+    # Каноническая форма вопросов приводится при записи, чтение отдает документ как есть
+    try:
+        questions = normalize_questions(questions)
+    except QuestionSchemaError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     try:
         quiz = {
+            "_id": ObjectId(),
             "title": title,
             "description": description,
             "category": category,
@@ -149,11 +255,13 @@ async def create_quiz(
         }
         
         db = await get_database()
+        # Первая неизменяемая версия записывается до квиза, указатель - вместе с ним
+        quiz["version_id"] = await publish_version(db, quiz)
         result = await db.quizzes.insert_one(quiz)
         quiz["id"] = str(result.inserted_id)
         
-        # Инвалидируем кэш списка квизов
-        await cache.delete("quizzes:all")
+        # Инвалидируем кэш списка и каталога квизов
+        await cache.invalidate_quiz_lists()
         print("🗑️ Кэш списка квизов очищен после создания нового квиза")
         
         return quiz
@@ -174,6 +282,12 @@ async def update_quiz(
     time_limit: Optional[int] = Body(None, description="Новое ограничение времени"),
     questions: Optional[List[Dict]] = Body(None, description="Новый список вопросов")
 ):
+    # Каноническая форма вопросов приводится при записи, чтение отдает документ как есть
+    if questions is not None:
+        try:
+            questions = normalize_questions(questions)
+        except QuestionSchemaError as e:
+            raise HTTPException(status_code=422, detail=str(e))
     try:
         # Создаем словарь для обновления, включая только переданные поля
         update_data = {}
@@ -193,21 +307,24 @@ async def update_quiz(
         update_data["updated_at"] = datetime.utcnow()
         
         db = await get_database()
-        result = await db.quizzes.update_one(
+        quiz = await db.quizzes.find_one_and_update(
             {"_id": ObjectId(quiz_id)},
-            {"$set": update_data}
+            {"$set": update_data},
+            return_document=ReturnDocument.AFTER
         )
+        if not quiz:
+            raise HTTPException(status_code=404, detail="Тест не найден")
         
-        if result.modified_count == 0:
-            quiz = await db.quizzes.find_one({"_id": ObjectId(quiz_id)})
-            if not quiz:
-                raise HTTPException(status_code=404, detail="Тест не найден")
+        # Правка порождает новую неизменяемую версию; меняется только указатель
+        await stamp_current_version(db, quiz)
         
         # Инвалидируем кэш квиза и списка квизов
         await cache.invalidate_quiz_cache(quiz_id)
         print(f"🗑️ Кэш квиза {quiz_id} очищен после обновления")
             
         return {"message": "Тест успешно обновлен"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -8,6 +8,10 @@ from openai import OpenAI
 from ..models import User, UserRole, DocumentS3
 from ..middleware import require_teacher_or_admin, get_current_user
 from ..s3_service import s3_service
+from ..redis_cache import cache
+from ..quiz_schema import normalize_questions, QuestionSchemaError
+from ..quiz_versions import publish_version
+from ..loaders import quiz_count_by_document_loader, attempt_count_by_quiz_loader, s3_key_exists_loader
 import json
 import io
 import traceback
@@ -429,11 +433,19 @@ async def upload_document_and_generate_quiz(
         # Генерируем квиз с помощью GPT
         quiz_data = await generate_quiz_with_gpt(document_text, quiz_title, difficulty, questions_count)
         
+        # GPT отвечает в форме {"question": ...}: приводим к канонической до записи
+        try:
+            quiz_data["questions"] = normalize_questions(quiz_data.get("questions", []))
+        except QuestionSchemaError as e:
+            raise HTTPException(status_code=502, detail=f"ИИ вернул некорректный квиз: {e}")
+        
         # Добавляем информацию о создателе и источнике
+        quiz_data["_id"] = ObjectId()
         quiz_data["created_by"] = current_user.id
         quiz_data["source_document_id"] = str(document_result.inserted_id)
         quiz_data["created_at"] = datetime.utcnow()
         quiz_data["updated_at"] = datetime.utcnow()
+        quiz_data["version_id"] = await publish_version(db, quiz_data)
         
         logger.info("🗄️ Сохранение квиза в БД...")
         # Сохраняем квиз в базе данных
@@ -441,6 +453,7 @@ async def upload_document_and_generate_quiz(
         quiz_data["_id"] = str(quiz_result.inserted_id)
         
         logger.info(f"✅ Квиз успешно создан с ID: {quiz_result.inserted_id}")
+        await cache.invalidate_quiz_lists()
         
         return {
             "message": "Документ успешно загружен в S3 и квиз создан",
@@ -476,15 +489,20 @@ async def get_my_documents(current_user: User = Depends(get_current_user)):
     
     try:
         db = await get_db()
-        documents = []
-        cursor = db.documents.find({"uploaded_by": current_user.id})
-        async for doc in cursor:
+        documents = await db.documents.find({"uploaded_by": current_user.id}).to_list(None)
+        for doc in documents:
             doc["id"] = str(doc["_id"])
             del doc["_id"]
-            
-            # Находим связанные квизы
-            quizzes = await db.quizzes.find({"source_document_id": doc["id"]}).to_list(None)
-            doc["generated_quizzes"] = len(quizzes)
+        
+        # Счетчики квизов и наличие файлов в S3 - одним пакетом на все документы
+        quiz_counts = quiz_count_by_document_loader(db)
+        s3_files = s3_key_exists_loader(s3_service)
+        counts = await quiz_counts.load_many(doc["id"] for doc in documents)
+        s3_keys = [doc["s3_key"] for doc in documents if doc.get("s3_key")]
+        exists_by_key = dict(zip(s3_keys, await s3_files.load_many(s3_keys)))
+        
+        for doc, count in zip(documents, counts):
+            doc["generated_quizzes"] = count
             
             # Генерируем временную ссылку для скачивания (если S3 доступен)
             if s3_service.is_available() and doc.get("s3_key"):
@@ -492,14 +510,7 @@ async def get_my_documents(current_user: User = Depends(get_current_user)):
             else:
                 doc["download_url"] = None
             
-            # Проверяем существование файла в S3
-            if doc.get("s3_key"):
-                metadata = await s3_service.get_file_metadata(doc["s3_key"])
-                doc["file_exists"] = metadata is not None
-            else:
-                doc["file_exists"] = False
-            
-            documents.append(doc)
+            doc["file_exists"] = exists_by_key.get(doc.get("s3_key"), False)
         
         return {"documents": documents}
         
@@ -519,17 +530,16 @@ async def get_my_generated_quizzes(current_user: User = Depends(get_current_user
     
     try:
         db = await get_db()
-        quizzes = []
-        cursor = db.quizzes.find({"created_by": current_user.id})
-        async for quiz in cursor:
+        quizzes = await db.quizzes.find({"created_by": current_user.id}).to_list(None)
+        for quiz in quizzes:
             quiz["id"] = str(quiz["_id"])
             del quiz["_id"]
-            
-            # Добавляем статистику по попыткам
-            attempts_count = await db.quiz_attempts.count_documents({"quiz_id": quiz["id"]})
+        
+        # Добавляем статистику по попыткам (одна агрегация на все квизы)
+        attempt_counts = attempt_count_by_quiz_loader(db)
+        counts = await attempt_counts.load_many(quiz["id"] for quiz in quizzes)
+        for quiz, attempts_count in zip(quizzes, counts):
             quiz["attempts_count"] = attempts_count
-            
-            quizzes.append(quiz)
         
         return {"quizzes": quizzes}
         
@@ -573,6 +583,8 @@ async def delete_document(
         # Удаляем связанные квизы
         deleted_quizzes = await db.quizzes.delete_many({"source_document_id": document_id})
         logger.info(f"🗑️ Удалено {deleted_quizzes.deleted_count} связанных квизов")
+        if deleted_quizzes.deleted_count:
+            await cache.invalidate_quiz_lists()
         
         # Удаляем метаданные документа из MongoDB
         await db.documents.delete_one({"_id": ObjectId(document_id)})
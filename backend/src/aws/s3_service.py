@@ -1,6 +1,7 @@
+import asyncio
 import os
 import uuid
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Set
 import boto3
 from botocore.exceptions import ClientError, NoCredentialsError
 from fastapi import HTTPException, UploadFile
@@ -242,6 +243,35 @@ class S3Service:
             logger.error(f"❌ Ошибка генерации presigned URL: {e}")
             return None
     
+    async def list_keys(self, prefix: str) -> Set[str]:
+        """
+        Возвращает все ключи файлов с указанным префиксом
+        
+        Args:
+            prefix: Префикс ключей (например, "<user_id>/")
+            
+        Returns:
+            Множество ключей (пустое если ошибка)
+        """
+        if not self.is_available():
+            return set()
+        
+        def list_sync() -> Set[str]:
+            keys = set()
+            paginator = self.s3_client.get_paginator('list_objects_v2')
+            for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix):
+                for item in page.get('Contents', []):
+                    keys.add(item['Key'])
+            return keys
+        
+        try:
+            # boto3 синхронный: листинг в пуле потоков, чтобы не блокировать event loop
+            return await asyncio.to_thread(list_sync)
+            
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения списка файлов {prefix}: {e}")
+            return set()
+    
     async def get_file_metadata(self, s3_key: str) -> Optional[Dict[str, Any]]:
         """
         Получает метаданные файла из S3
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк кэша: RedisCache поверх redis-server или in-process fakeredis
+
+Сценарии (каждый для всех сочетаний размера значения, параллельности и кодека):
+    set / get            - по одному ключу на вызов (round trip на операцию)
+    set_many / get_many  - пакеты по --batch ключей одним pipeline / MGET
+    get + l1             - чтение с включенным L1 (in-process уровень, --l1)
+Для каждого сценария считаются пропускная способность (ключей в секунду) и
+задержки вызова p50/p95/p99. Результат - JSON (stdout или --output), чтобы
+прогоны можно было сравнивать между собой; сводка печатается в stderr.
+
+Использование (из корня репозитория):
+    python backend/src/tests/bench_cache.py --redis-url redis://localhost:6379/15
+    python backend/src/tests/bench_cache.py --fake --sizes 256,4096 --output bench.json
+
+Бенчмарк пишет ключи bench:* и удаляет их после каждого сценария - используйте
+отдельную базу Redis. fakeredis (pip install fakeredis) нужен только для --fake.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime
+
+import redis.asyncio as redis
+
+try:
+    import fakeredis
+    FAKEREDIS_AVAILABLE = True
+except ImportError:
+    FAKEREDIS_AVAILABLE = False
+
+# Добавляем корень репозитория в path, чтобы импортировать пакет backend
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
+
+from backend.redis_cache import RedisCache  # noqa: E402
+from backend.cache_codec import CacheCodec, ORJSON_AVAILABLE, MSGPACK_AVAILABLE  # noqa: E402
+
+KEY_PREFIX = "bench"
+DEFAULT_CODECS = ["json"] + (["orjson"] if ORJSON_AVAILABLE else []) + (["msgpack"] if MSGPACK_AVAILABLE else [])
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def make_value(size: int, seed: int) -> dict:
+    """Квиз примерно заданного размера в JSON (с datetime, как настоящие документы)"""
+    rng = random.Random(seed)
+    value = {
+        "title": f"Бенчмарк {seed}",
+        "category": "Программирование",
+        "difficulty": "Medium",
+        "created_at": datetime(2024, 1, 1, 12, 0, seed % 60),
+        "questions": []
+    }
+    while len(json.dumps(value, default=str, ensure_ascii=False).encode("utf-8")) < size:
+        value["questions"].append({
+            "text": "".join(rng.choice("абвгдежзиклмнопрст ") for _ in range(40)),
+            "options": [f"Вариант {i} {rng.randint(0, 10 ** 6)}" for i in range(4)],
+            "correct_answer": rng.randint(0, 3)
+        })
+    return value
+
+
+async def run_workers(calls, concurrency: int):
+    """Выполнить корутины-фабрики calls не более чем по concurrency одновременно; задержки в мс"""
+    latencies = []
+    queue = iter(calls)
+
+    async def worker():
+        for call in queue:
+            start = time.perf_counter()
+            await call()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - start
+
+
+def summarize(scenario: dict, latencies, elapsed: float, keys: int, errors: int) -> dict:
+    return {
+        **scenario,
+        "calls": len(latencies),
+        "keys": keys,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 4),
+        "throughput_keys_s": round(keys / elapsed, 1) if elapsed else None,
+        "p50_ms": round(percentile(latencies, 50), 4),
+        "p95_ms": round(percentile(latencies, 95), 4),
+        "p99_ms": round(percentile(latencies, 99), 4),
+    }
+
+
+async def bench_case(cache: RedisCache, size: int, concurrency: int, serializer: str, args) -> list:
+    cache.codec = CacheCodec(serializer=serializer, compression=args.compression)
+    value = make_value(size, seed=size)
+    keys = [f"{KEY_PREFIX}:{size}:{i}" for i in range(args.ops)]
+    batches = [keys[i:i + args.batch] for i in range(0, len(keys), args.batch)]
+    scenario = {
+        "value_bytes": size,
+        "encoded_bytes": len(cache.codec.encode(value)),
+        "concurrency": concurrency,
+        "codec": serializer,
+        "compression": cache.codec.compression,
+    }
+    results = []
+
+    async def measure(op: str, pipelined: bool, calls, key_count: int):
+        errors_before = cache.stats["redis_errors"]
+        latencies, elapsed = await run_workers(calls, concurrency)
+        errors = cache.stats["redis_errors"] - errors_before
+        results.append(summarize({**scenario, "op": op, "pipelined": pipelined, "l1": False},
+                                 latencies, elapsed, key_count, errors))
+
+    cache.l1_enabled = False
+    await measure("set", False, [lambda k=k: cache.set(k, value, ttl=300) for k in keys], len(keys))
+    await measure("get", False, [lambda k=k: cache.get(k) for k in keys], len(keys))
+    await measure("set_many", True,
+                  [lambda b=b: cache.set_many({k: value for k in b}, ttl=300) for b in batches], len(keys))
+    await measure("get_many", True, [lambda b=b: cache.get_many(b) for b in batches], len(keys))
+
+    if args.l1:
+        cache.l1_enabled = True
+        cache.l1_ttls[KEY_PREFIX] = 300
+        cache.l1.clear()
+        await cache.get_many(keys)  # прогрев L1
+        errors_before = cache.stats["redis_errors"]
+        latencies, elapsed = await run_workers([lambda k=k: cache.get(k) for k in keys], concurrency)
+        results.append(summarize({**scenario, "op": "get", "pipelined": False, "l1": True},
+                                 latencies, elapsed, len(keys), cache.stats["redis_errors"] - errors_before))
+        cache.l1_enabled = False
+        cache.l1.clear()
+
+    await cache.delete_many(keys)
+    return results
+
+
+async def create_client(args):
+    if args.fake:
+        if not FAKEREDIS_AVAILABLE:
+            sys.exit("❌ fakeredis не установлен: pip install fakeredis")
+        return fakeredis.FakeAsyncRedis(), "fakeredis", None
+    # Таймауты щедрее, чем в приложении: бенчмарк меряет Redis, а не выключатель
+    client = redis.Redis.from_url(args.redis_url, decode_responses=False,
+                                  socket_timeout=10, max_connections=max(args.concurrency) + 8)
+    try:
+        info = await client.info("server")
+    except Exception as e:
+        sys.exit(f"❌ Redis {args.redis_url} недоступен ({e}). Запустите redis-server или используйте --fake")
+    return client, "redis", info.get("redis_version")
+
+
+def parse_ints(raw: str):
+    return [int(item) for item in raw.split(",") if item]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк RedisCache: размер, параллельность, pipeline, кодеки")
+    parser.add_argument("--redis-url", default=os.getenv("REDIS_URL", "redis://localhost:6379/15"))
+    parser.add_argument("--fake", action="store_true", help="in-process fakeredis вместо redis-server")
+    parser.add_argument("--sizes", type=parse_ints, default=[256, 4096, 65536], help="Размеры значений (байты JSON)")
+    parser.add_argument("--concurrency", type=parse_ints, default=[1, 16, 64])
+    parser.add_argument("--codecs", default=",".join(DEFAULT_CODECS), help="Сериализаторы через запятую")
+    parser.add_argument("--compression", default="none", help="Сжатие: none, zlib, zstd")
+    parser.add_argument("--ops", type=int, default=2000, help="Ключей на сценарий")
+    parser.add_argument("--batch", type=int, default=50, help="Ключей в одном pipeline")
+    parser.add_argument("--l1", action="store_true", help="Добавить чтение через L1")
+    parser.add_argument("--output", help="Файл для JSON (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    client, backend, server_version = await create_client(args)
+    cache = RedisCache()
+    cache.redis_client = client
+
+    codecs = [codec for codec in args.codecs.split(",") if codec]
+    results = []
+    print(f"🚀 Бенчмарк кэша ({backend}): размеры {args.sizes}, параллельность {args.concurrency}, "
+          f"кодеки {codecs}", file=sys.stderr)
+    for size in args.sizes:
+        for concurrency in args.concurrency:
+            for codec in codecs:
+                case = await bench_case(cache, size, concurrency, codec, args)
+                results.extend(case)
+                for row in case:
+                    print(f"   {row['op']:<8}{' L1' if row['l1'] else '   '} {size:>6} B  c={concurrency:<3} "
+                          f"{codec:<7} {row['throughput_keys_s']:>10} ключей/с  "
+                          f"p50 {row['p50_ms']:.3f}  p99 {row['p99_ms']:.3f} мс", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "started_at": datetime.utcnow().isoformat(),
+            "backend": backend,
+            "redis_version": server_version,
+            "python": platform.python_version(),
+            "ops": args.ops,
+            "batch": args.batch,
+            "compression": args.compression,
+        },
+        "results": results,
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+        print(f"📈 Результаты сохранены в {args.output}", file=sys.stderr)
+    else:
+        print(output)
+    await client.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
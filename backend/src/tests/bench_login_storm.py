@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк "шторма логинов": задержка несвязанных запросов во время bcrypt
+
+Пока идут N одновременных проверок пароля, отдельная корутина имитирует
+легкий эндпоинт (await asyncio.sleep(PROBE_INTERVAL)) и измеряет, насколько
+позже запланированного она просыпается. Сравниваются три режима:
+без логинов, bcrypt прямо в event loop (старое поведение) и PasswordHasher.
+
+Использование (из корня репозитория):
+    python backend/src/tests/bench_login_storm.py --logins 40 --workers 4
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+from passlib.context import CryptContext
+
+# Добавляем корень репозитория в path, чтобы импортировать пакет backend
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
+
+from backend.password_hashing import PasswordHasher  # noqa: E402
+
+PROBE_INTERVAL = 0.005  # 5 мс между "запросами" к несвязанному эндпоинту
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def probe(stop: asyncio.Event, delays: list):
+    """Несвязанный эндпоинт: фиксируем опоздание относительно плана"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        delays.append((time.perf_counter() - start - PROBE_INTERVAL) * 1000)
+
+
+async def run_scenario(name, login, logins):
+    stop = asyncio.Event()
+    delays = []
+    probe_task = asyncio.create_task(probe(stop, delays))
+    await asyncio.sleep(0.05)  # базовая линия до начала логинов
+
+    start = time.perf_counter()
+    if login is not None:
+        await asyncio.gather(*(login() for _ in range(logins)))
+    else:
+        await asyncio.sleep(0.5)
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await probe_task
+
+    print(f"\n📊 {name}")
+    print(f"   Время шторма:          {elapsed * 1000:.0f} мс")
+    print(f"   Замеров probe:         {len(delays)}")
+    print(f"   Опоздание probe p50:   {statistics.median(delays):.2f} мс")
+    print(f"   Опоздание probe p99:   {percentile(delays, 99):.2f} мс")
+    print(f"   Опоздание probe max:   {max(delays):.2f} мс")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Задержка event loop во время массовых логинов")
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    hashed = context.hash("correct horse battery staple")
+    hasher = PasswordHasher(workers=args.workers, max_queue=0)
+
+    async def inline_login():
+        # Старое поведение: bcrypt прямо в обработчике
+        return context.verify("correct horse battery staple", hashed)
+
+    async def offloaded_login():
+        return await hasher.verify("correct horse battery staple", hashed)
+
+    print("🚀 Бенчмарк шторма логинов")
+    print("=" * 50)
+    await run_scenario("Без логинов", None, args.logins)
+    await run_scenario("bcrypt в event loop", inline_login, args.logins)
+    await run_scenario(f"PasswordHasher ({args.workers} потоков)", offloaded_login, args.logins)
+    print(f"\n📈 Метрики пула: {hasher.stats()}")
+    hasher.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк подключения к MongoDB: клиент на каждый вызов vs общий пул
+
+Эмулирует типичный аутентифицированный запрос: middleware.get_current_user
+(get_database + users.find_one) и роутер (get_database + quizzes.find_one).
+Считает команды, ping'и и новые соединения на один запрос.
+
+Использование (из корня репозитория):
+    python backend/src/tests/bench_mongo_pool.py --requests 50
+
+Переменные окружения:
+    MONGODB_URL - URL подключения к MongoDB
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from pymongo import monitoring
+
+# Добавляем корень репозитория в path, чтобы импортировать пакет backend
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
+
+
+class RoundTripCounter(monitoring.CommandListener, monitoring.ConnectionPoolListener):
+    """Считает команды и открытые соединения для всех клиентов процесса"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.commands = 0
+        self.pings = 0
+        self.connections = 0
+
+    def started(self, event):
+        self.commands += 1
+        if event.command_name == "ping":
+            self.pings += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self.connections += 1
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_closed(self, event): pass
+    def connection_check_out_started(self, event): pass
+    def connection_check_out_failed(self, event): pass
+    def connection_checked_out(self, event): pass
+    def connection_checked_in(self, event): pass
+
+
+counter = RoundTripCounter()
+# Регистрируем слушатель до создания любых клиентов
+monitoring.register(counter)
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+from backend.database import MONGODB_URL, get_database, connect_to_mongo, close_mongo_connection  # noqa: E402
+
+
+async def legacy_get_database(opened):
+    """Старое поведение: новый клиент с maxPoolSize=1 и ping на каждый вызов"""
+    client = AsyncIOMotorClient(
+        MONGODB_URL,
+        serverSelectionTimeoutMS=10000,
+        connectTimeoutMS=10000,
+        maxPoolSize=1,
+        retryWrites=True,
+        maxIdleTimeMS=30000
+    )
+    await client.admin.command('ping')
+    opened.append(client)
+    return client.LearnApp
+
+
+async def simulate_request(get_db):
+    """Один запрос: middleware + роутер"""
+    db = await get_db()
+    await db.users.find_one({})
+    db = await get_db()
+    await db.quizzes.find_one({})
+
+
+async def run_scenario(name, get_db, requests):
+    counter.reset()
+    start = time.perf_counter()
+    for _ in range(requests):
+        await simulate_request(get_db)
+    elapsed = time.perf_counter() - start
+    print(f"\n📊 {name}")
+    print(f"   Команд на запрос:      {counter.commands / requests:.2f}")
+    print(f"   Ping на запрос:        {counter.pings / requests:.2f}")
+    print(f"   Новых соединений/запр: {counter.connections / requests:.2f}")
+    print(f"   Среднее время запроса: {elapsed / requests * 1000:.2f} мс")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Сравнение клиента на вызов и общего пула MongoDB")
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    print("🚀 Бенчмарк подключения к MongoDB")
+    print("=" * 50)
+
+    opened = []
+    await run_scenario("Клиент на каждый вызов (старое поведение)", lambda: legacy_get_database(opened), args.requests)
+    for client in opened:
+        client.close()
+
+    await connect_to_mongo()
+    await run_scenario("Общий пул процесса", get_database, args.requests)
+    await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Импорт квизов из файла NDJSON или JSON-массива (см. backend/quiz_import.py)
+
+Файл читается кусками по --chunk байт и разбирается по одной записи, поэтому
+размер файла на память не влияет. Некорректные записи выводятся с номером
+и не останавливают импорт.
+
+Использование (из корня репозитория):
+    python backend/src/tests/import_quizzes.py quizzes.ndjson --dry-run
+    python backend/src/tests/import_quizzes.py quizzes.json --batch 1000
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+# Добавляем корень репозитория в path, чтобы импортировать пакет backend
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
+
+from backend.database import get_database  # noqa: E402
+from backend.quiz_import import import_quizzes, IMPORT_BATCH_SIZE  # noqa: E402
+from backend.redis_cache import cache  # noqa: E402
+
+
+async def read_chunks(path: str, chunk_size: int):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Потоковый импорт квизов из NDJSON или JSON-массива")
+    parser.add_argument("path", help="Файл с квизами")
+    parser.add_argument("--batch", type=int, default=IMPORT_BATCH_SIZE, help="Размер пачки insert_many")
+    parser.add_argument("--chunk", type=int, default=64 * 1024, help="Размер куска чтения файла (байты)")
+    parser.add_argument("--dry-run", action="store_true", help="Только проверить записи, ничего не записывать")
+    args = parser.parse_args()
+
+    await cache.connect()
+    try:
+        db = await get_database()
+        report = await import_quizzes(db, read_chunks(args.path, args.chunk), args.batch, args.dry_run)
+    finally:
+        await cache.disconnect()
+
+    mode = " (dry run)" if args.dry_run else ""
+    print(f"\n📊 Импорт квизов{mode}: {args.path}")
+    print(f"   Получено записей:  {report['received']}")
+    print(f"   Записано:          {report['inserted']}")
+    print(f"   С ошибками:        {report['failed']}")
+    print(f"   Время:             {report['duration_ms']} мс")
+    for error in report["errors"][:20]:
+        print(f"   ⚠️ Запись {error['index']}: {error['error']}")
+    if report["failed"] > 20:
+        print(f"   ... и еще {report['failed'] - 20}")
+    if report.get("aborted"):
+        print(f"❌ Импорт прерван: {report['aborted']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Одноразовая миграция: привести вопросы всех квизов к канонической форме
+
+После нее get_quiz отдает документы как есть, без выравнивания
+"question"/"text" при каждом чтении (см. backend/quiz_schema.py).
+Квизы читаются курсором пачками (в памяти одна пачка), измененные
+записываются bulk_write(ordered=False) с условием на прежние вопросы:
+квиз, отредактированный во время миграции, не перезаписывается.
+Повторный запуск ничего не меняет.
+
+Использование (из корня репозитория):
+    python backend/src/tests/migrate_normalize_questions.py --dry-run
+    python backend/src/tests/migrate_normalize_questions.py --batch 500
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from pymongo import UpdateOne
+
+# Добавляем корень репозитория в path, чтобы импортировать пакет backend
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
+
+from backend.database import get_database  # noqa: E402
+from backend.quiz_schema import normalize_questions, QuestionSchemaError  # noqa: E402
+from backend.redis_cache import cache  # noqa: E402
+
+
+async def flush(db, operations, quiz_ids, stats, dry_run):
+    if not operations:
+        return
+    if not dry_run:
+        result = await db.quizzes.bulk_write(operations, ordered=False)
+        stats["modified"] += result.modified_count
+        # Кэш квизов с прежней формой вопросов
+        await cache.bump(*(f"quiz:{quiz_id}" for quiz_id in quiz_ids))
+    operations.clear()
+    quiz_ids.clear()
+
+
+async def migrate(batch_size: int, dry_run: bool):
+    db = await get_database()
+    stats = {"scanned": 0, "changed": 0, "modified": 0, "invalid": 0}
+    operations, quiz_ids = [], []
+    started = time.perf_counter()
+
+    cursor = db.quizzes.find({}, {"questions": 1}, batch_size=batch_size)
+    async for quiz in cursor:
+        stats["scanned"] += 1
+        questions = quiz.get("questions") or []
+        try:
+            canonical = normalize_questions(questions)
+        except QuestionSchemaError as e:
+            stats["invalid"] += 1
+            print(f"⚠️ Квиз {quiz['_id']} пропущен: {e}")
+            continue
+        if canonical == questions:
+            continue
+        stats["changed"] += 1
+        operations.append(UpdateOne({"_id": quiz["_id"], "questions": questions}, {"$set": {"questions": canonical}}))
+        quiz_ids.append(str(quiz["_id"]))
+        if len(operations) >= batch_size:
+            await flush(db, operations, quiz_ids, stats, dry_run)
+    await flush(db, operations, quiz_ids, stats, dry_run)
+
+    if stats["changed"] and not dry_run:
+        await cache.invalidate_quiz_lists()
+    stats["duration_s"] = round(time.perf_counter() - started, 2)
+    return stats
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Канонизация вопросов квизов (запись при миграции, не при чтении)")
+    parser.add_argument("--batch", type=int, default=500, help="Размер пачки чтения и bulk_write")
+    parser.add_argument("--dry-run", action="store_true", help="Только посчитать, ничего не записывать")
+    args = parser.parse_args()
+
+    await cache.connect()
+    try:
+        stats = await migrate(args.batch, args.dry_run)
+    finally:
+        await cache.disconnect()
+
+    mode = " (dry run)" if args.dry_run else ""
+    print(f"\n📊 Миграция вопросов{mode}")
+    print(f"   Просмотрено квизов:   {stats['scanned']}")
+    print(f"   Требуют изменений:    {stats['changed']}")
+    print(f"   Изменено в MongoDB:   {stats['modified']}")
+    print(f"   Некорректных (пропуск): {stats['invalid']}")
+    print(f"   Время:                {stats['duration_s']} с")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -7,8 +7,14 @@
     
 import asyncio
 import json
+import os
+import sys
 import time
-from redis_cache import RedisCache
+
+# Добавляем корень репозитория в path, чтобы импортировать пакет backend
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
+
+from backend.redis_cache import RedisCache  # noqa: E402
 
 async def test_basic_operations():
     """Тестирование базовых операций Redis"""
@@ -121,13 +127,21 @@ async def test_quiz_operations():
         {"id": quiz_id, "title": quiz_data["title"], "category": quiz_data["category"]}
     ]
     
-    success = await cache.cache_quizzes_list(quizzes_list)
-    print(f"   Кэширование списка квизов: {'✅ OK' if success else '❌ FAILED'}")
+    # Страница списка кэшируется целиком (get_or_load_quizzes_page)
+    loads = 0
+    
+    async def load_page():
+        nonlocal loads
+        loads += 1
+        return {"items": quizzes_list, "next_cursor": None, "etag": "test"}
+    
+    page = await cache.get_or_load_quizzes_page("test", {"limit": 50}, load_page)
+    print(f"   Кэширование списка квизов: {'✅ OK' if page else '❌ FAILED'}")
     
-    # Получение списка квизов
-    retrieved_list = await cache.get_quizzes_list()
-    print(f"   Получение списка квизов: {'✅ OK' if retrieved_list else '❌ FAILED'}")
-    print(f"   Количество квизов: {len(retrieved_list) if retrieved_list else 0}")
+    # Повторное получение - из кэша, без загрузки
+    retrieved_page = await cache.get_or_load_quizzes_page("test", {"limit": 50}, load_page)
+    print(f"   Получение списка квизов: {'✅ OK' if retrieved_page and loads == 1 else '❌ FAILED'}")
+    print(f"   Количество квизов: {len(retrieved_page['items']) if retrieved_page else 0}")
     
     # Инвалидация кэша квиза
     await cache.invalidate_quiz_cache(quiz_id)
@@ -243,38 +257,6 @@ async def test_recommendations():
     
     await cache.disconnect()
 
-async def test_performance():
-    """Тест производительности"""
-    print("\n⚡ Тестирование производительности...")
-    
-    cache = RedisCache()
-    await cache.connect()
-    
-    print("\n6️⃣ Тест производительности")
-    
-    # Тест скорости записи
-    start_time = time.time()
-    for i in range(100):
-        await cache.set(f"perf_test:{i}", {"data": f"test_data_{i}"}, ttl=60)
-    write_time = time.time() - start_time
-    print(f"   Запись 100 ключей: {write_time:.3f} секунд")
-    
-    # Тест скорости чтения
-    start_time = time.time()
-    for i in range(100):
-        await cache.get(f"perf_test:{i}")
-    read_time = time.time() - start_time
-    print(f"   Чтение 100 ключей: {read_time:.3f} секунд")
-    
-    # Очистка тестовых данных
-    for i in range(100):
-        await cache.delete(f"perf_test:{i}")
-    
-    print(f"   Среднее время записи: {write_time/100*1000:.2f} мс/операция")
-    print(f"   Среднее время чтения: {read_time/100*1000:.2f} мс/операция")
-    
-    await cache.disconnect()
-
 async def main():
     """Главная функция тестирования"""
     print("🚀 Начинаем тестирование Redis интеграции")
@@ -286,7 +268,7 @@ async def main():
         await test_quiz_operations()
         await test_user_operations()
         await test_recommendations()
-        await test_performance()
+        # Производительность: bench_cache.py (pipeline, параллельность, кодеки, L1)
         
         print("\n" + "=" * 50)
         print("🎉 Все тесты успешно завершены!")
@@ -120,7 +120,7 @@ const QuizList: React.FC<QuizListProps> = ({ selectedSubject, selectedDifficulty
                                 </div>
                                 <div className="flex items-center mb-2 text-gray-600 dark:text-gray-300">
                                     <FaQuestion className="mr-2" />
-                                    <span>{quiz.questions.length} вопросов</span>
+                                    <span>{quiz.question_count ?? quiz.questions?.length ?? 0} вопросов</span>
                                 </div>
                                 <div className="flex items-center mb-4 text-gray-600 dark:text-gray-300">
                                     <FaClock className="mr-2" />
@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { FaUsers, FaBook, FaEdit, FaTrash, FaPlus, FaEye, FaTimes, FaFilter } from 'react-icons/fa';
-import { getAdminQuizzes, getUsers, deleteUser, deleteQuiz, getRoles, getUsersByRole, UserRole, Role, User } from '../../services/api';
+import { getAdminQuizzes, getAdminQuiz, getUsers, deleteUser, deleteQuiz, getRoles, getUsersByRole, UserRole, Role, User } from '../../services/api';
 import { Quiz } from '../../services/api';
 import { useNavigate } from 'react-router-dom';
 import UserForm from './UserForm';
@@ -123,9 +123,18 @@ const AdminPanel: React.FC = () => {
         }
     };
 
-    const handleViewQuiz = (quiz: Quiz) => {
+    const handleViewQuiz = async (quiz: Quiz) => {
         setSelectedQuiz(quiz);
         setShowQuizModal(true);
+        // Список приходит без вопросов - догружаем полный тест
+        const quizId = quiz.id || quiz._id;
+        if (!quizId) return;
+        try {
+            const fullQuiz = await getAdminQuiz(quizId);
+            setSelectedQuiz(fullQuiz);
+        } catch (err) {
+            console.error('Error fetching quiz details:', err);
+        }
     };
 
     const closeQuizModal = () => {
@@ -300,7 +309,7 @@ const AdminPanel: React.FC = () => {
                                 <p className="text-gray-600 text-sm mb-2">{quiz.description}</p>
                                 <div className="flex justify-between items-center text-xs text-gray-500 mb-4">
                                     <span>Категория: {quiz.category}</span>
-                                    <span>Вопросов: {quiz.questions?.length || 0}</span>
+                                    <span>Вопросов: {quiz.question_count ?? quiz.questions?.length ?? 0}</span>
                                 </div>
                                 <div className="flex justify-end space-x-2">
                                     <button
@@ -17,6 +17,23 @@ api.interceptors.request.use((config) => {
     return config;
 });
 
+// Списки отдаются страницами: курсор следующей страницы - в заголовке X-Next-Cursor
+const NEXT_CURSOR_HEADER = 'x-next-cursor';
+// Максимальный размер страницы на бэкенде (PAGE_SIZE_MAX)
+const PAGE_SIZE_MAX = 200;
+
+// Загружает все страницы списка, следуя за курсором
+const fetchAllPages = async <T>(url: string): Promise<T[]> => {
+    const items: T[] = [];
+    let cursor: string | undefined;
+    do {
+        const response = await api.get(url, { params: { limit: PAGE_SIZE_MAX, cursor } });
+        items.push(...response.data);
+        cursor = response.headers[NEXT_CURSOR_HEADER] || undefined;
+    } while (cursor);
+    return items;
+};
+
 // Role types
 export type UserRole = 'student' | 'teacher' | 'admin';
 
@@ -72,6 +89,7 @@ export interface Quiz {
     category: string;
     level?: string;
     questions: Question[];
+    question_count?: number; // В списках вопросы не передаются, только их количество
     time_limit?: number;
     passing_score?: number;
     created_at?: string;
@@ -184,7 +202,7 @@ export interface QuizResult {
 // Quiz related functions
 export const getQuizzes = async (): Promise<Quiz[]> => {
     try {
-        const response = await api.get('/api/quizzes');
+        const response = await api.get('/api/quizzes/catalog');
         return response.data;
     } catch (error) {
         console.error('Error fetching quizzes:', error);
@@ -296,8 +314,7 @@ export const getAttempt = async (attemptId: string): Promise<QuizAttempt> => {
 // Admin functions
 export const getAdminQuizzes = async (): Promise<Quiz[]> => {
     try {
-        const response = await api.get('/admin/quizzes');
-        return response.data;
+        return await fetchAllPages<Quiz>('/admin/quizzes');
     } catch (error) {
         console.error('Error fetching quizzes as admin:', error);
         throw error;
@@ -349,8 +366,7 @@ export const deleteQuiz = async (quizId: string): Promise<void> => {
 // User functions
 export const getUsers = async (): Promise<User[]> => {
     try {
-        const response = await api.get('/admin/users');
-        return response.data;
+        return await fetchAllPages<User>('/admin/users');
     } catch (error) {
         console.error('Error getting users:', error);
         throw error;
@@ -437,8 +453,7 @@ export const checkIsAdmin = async (): Promise<boolean> => {
 // Quiz results functions
 export const getUserQuizResults = async (): Promise<QuizResult[]> => {
     try {
-        const response = await api.get('/api/quiz-attempts/results/user');
-        return response.data;
+        return await fetchAllPages<QuizResult>('/api/quiz-attempts/results/user');
     } catch (error) {
         console.error('Error fetching user quiz results:', error);
         throw error;
@@ -520,8 +535,17 @@ export const getRoles = async (): Promise<{ roles: Role[] }> => {
 
 export const getUsersByRole = async (role: UserRole): Promise<{ role: UserRole; count: number; users: User[] }> => {
     try {
-        const response = await api.get(`/admin/users/by-role/${role}`);
-        return response.data;
+        // Курсор этого списка - в теле ответа (next_cursor)
+        const users: User[] = [];
+        let cursor: string | undefined;
+        do {
+            const response = await api.get(`/admin/users/by-role/${role}`, {
+                params: { limit: PAGE_SIZE_MAX, cursor },
+            });
+            users.push(...response.data.users);
+            cursor = response.data.next_cursor || undefined;
+        } while (cursor);
+        return { role, count: users.length, users };
     } catch (error) {
         console.error('Error fetching users by role:', error);
         throw error;
@@ -11,6 +11,7 @@ export interface Quiz {
   description: string;
   category: string;
   questions: Question[];
+  question_count?: number; // В списках вопросы не передаются, только их количество
   difficulty: string;
   time_limit: number;
 } 
\ No newline at end of file